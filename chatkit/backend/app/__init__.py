@@ -1 +1,9 @@
 """Minimal ChatKit backend package."""
+
+import os
+
+if os.environ.get("CHATKIT_IMPORT_PROFILE") == "1":
+    # Installed first so every later import is timed; see app/import_profile.py.
+    from .import_profile import start_import_profile
+
+    start_import_profile()
@@ -0,0 +1,195 @@
+"""Per-thread cache of thread items already converted to agent input.
+
+Each turn reloads the same window of recent items, and almost all of them were
+converted on the previous turn. The cache keeps each item's converted form so a
+turn only converts what is new, and forgets items once they slide out of the
+window. A conversion is reused for the very item object it came from, which
+stores in this process keep until they report a rewrite through
+``invalidate``, or for a freshly loaded copy whose content hash matches, so an
+item rewritten by another worker sharing a SQLite store is converted again.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Sequence
+from itertools import count
+from typing import Any, NamedTuple
+
+from agents import TResponseInputItem
+from chatkit.agents import ThreadItemConverter
+from chatkit.types import ThreadItem, UserMessageItem
+
+# The converter renders some items differently when they close the history
+# (quoted text on the latest user message), so that flag is part of the key.
+_EntryKey = tuple[str, bool]
+
+
+class ConvertedItem(NamedTuple):
+    """One thread item's agent input and its token count (0 without a counter)."""
+
+    parts: list[TResponseInputItem]
+    tokens: int
+
+
+class _Conversion(NamedTuple):
+    """A conversion with the item it came from and that item's content hash."""
+
+    item: ThreadItem
+    digest: bytes
+    result: ConvertedItem
+
+
+class _ThreadEntry:
+    __slots__ = ("generation", "converted")
+
+    def __init__(self, generation: int) -> None:
+        self.generation = generation
+        self.converted: dict[_EntryKey, _Conversion] = {}
+
+
+class AgentInputCache:
+    """LRU of converted agent input for the ``max_threads`` most recent threads.
+
+    Callers take ``generation(thread_id)`` before loading items from the store
+    and pass it back to ``to_agent_input``; conversions are only kept if no
+    invalidation for the thread happened in between, so an item rewritten
+    while a turn was loading it is never cached in its stale form.
+
+    When ``count_tokens`` is given, each item's token count is computed once on
+    conversion and cached alongside it.
+    """
+
+    def __init__(
+        self,
+        converter: ThreadItemConverter | None = None,
+        max_threads: int = 256,
+        count_tokens: Callable[[list[TResponseInputItem]], int] | None = None,
+    ) -> None:
+        self.converter = converter or ThreadItemConverter()
+        self.max_threads = max_threads
+        self.count_tokens = count_tokens
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.turns = 0
+        self.total_seconds = 0.0
+        self.last_seconds = 0.0
+        self._threads: OrderedDict[str, _ThreadEntry] = OrderedDict()
+        self._generations = count(1)
+        self._lock = threading.Lock()
+
+    def generation(self, thread_id: str) -> int:
+        with self._lock:
+            entry = self._threads.get(thread_id)
+            return entry.generation if entry is not None else 0
+
+    def invalidate(self, thread_id: str, item_id: str | None = None) -> None:
+        """Forget ``item_id`` in ``thread_id``, or the whole thread when None."""
+        with self._lock:
+            self.invalidations += 1
+            entry = self._threads.get(thread_id)
+            if entry is None or item_id is None:
+                entry = _ThreadEntry(next(self._generations))
+                self._store(thread_id, entry)
+                return
+            entry.generation = next(self._generations)
+            entry.converted.pop((item_id, False), None)
+            entry.converted.pop((item_id, True), None)
+
+    async def to_agent_input(
+        self, thread_id: str, items: Sequence[ThreadItem], generation: int
+    ) -> list[TResponseInputItem]:
+        """Convert ``items`` in order, reusing conversions from earlier turns."""
+        converted = await self.convert(thread_id, items, generation)
+        return [part for item in converted for part in item.parts]
+
+    async def convert(
+        self, thread_id: str, items: Sequence[ThreadItem], generation: int
+    ) -> list[ConvertedItem]:
+        """Like ``to_agent_input`` but keeps each item's parts and token count apart."""
+        start = time.perf_counter()
+        with self._lock:
+            entry = self._threads.get(thread_id)
+            cached = dict(entry.converted) if entry is not None else {}
+
+        converted: dict[_EntryKey, _Conversion] = {}
+        output: list[ConvertedItem] = []
+        hits = 0
+        for position, item in enumerate(items):
+            key = (item.id, position == len(items) - 1)
+            conversion = cached.get(key)
+            digest: bytes | None = None
+            if conversion is not None and conversion.item is not item:
+                # A copy loaded anew; reuse its conversion only if unchanged.
+                digest = _content_hash(item)
+                if digest == conversion.digest:
+                    conversion = conversion._replace(item=item)
+                else:
+                    conversion = None
+            if conversion is None:
+                parts = await self._convert_item(item, is_last=key[1])
+                tokens = self.count_tokens(parts) if self.count_tokens else 0
+                conversion = _Conversion(
+                    item, digest or _content_hash(item), ConvertedItem(parts, tokens)
+                )
+            else:
+                hits += 1
+            converted[key] = conversion
+            output.append(conversion.result)
+
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.hits += hits
+            self.misses += len(items) - hits
+            self.turns += 1
+            self.total_seconds += elapsed
+            self.last_seconds = elapsed
+            entry = self._threads.get(thread_id)
+            current = entry.generation if entry is not None else 0
+            if current == generation:
+                # Only the current window is kept, so the cache slides with it.
+                fresh = _ThreadEntry(current)
+                fresh.converted = converted
+                self._store(thread_id, fresh)
+        return output
+
+    async def _convert_item(
+        self, item: ThreadItem, is_last: bool
+    ) -> list[TResponseInputItem]:
+        # Only user messages render differently as the last item (quoted text);
+        # converting any other item alone gives what it gives inside a history.
+        if isinstance(item, UserMessageItem):
+            out = await self.converter.user_message_to_input(item, is_last) or []
+            return out if isinstance(out, list) else [out]
+        return await self.converter.to_agent_input(item)
+
+    def _store(self, thread_id: str, entry: _ThreadEntry) -> None:
+        self._threads[thread_id] = entry
+        self._threads.move_to_end(thread_id)
+        while len(self._threads) > self.max_threads:
+            self._threads.popitem(last=False)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "threads": len(self._threads),
+                "max_threads": self.max_threads,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else None,
+                "invalidations": self.invalidations,
+                "turns": self.turns,
+                "avg_ms": self.total_seconds / self.turns * 1000
+                if self.turns
+                else None,
+                "last_ms": self.last_seconds * 1000,
+            }
+
+
+def _content_hash(item: ThreadItem) -> bytes:
+    return hashlib.blake2b(item.model_dump_json().encode(), digest_size=16).digest()
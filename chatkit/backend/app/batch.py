@@ -0,0 +1,337 @@
+"""Batch workbook export: many years and portfolios in one request, as one zip.
+
+Each workbook of a batch is built (from local rent data where needed) and
+rendered by a pool worker, so with a process pool a batch uses every core.
+Workbooks are added to the zip in the order they finish, and a batch's progress
+can be followed while the zip is still downloading.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import re
+import time
+import uuid
+import zipfile
+from collections.abc import AsyncIterator, Awaitable, Callable
+from dataclasses import dataclass, field, replace
+from typing import Any
+
+from .cache import LRUCache
+from .rent_data import (
+    RentDataNotFoundError,
+    available_years,
+    build_payload_from_local_tsv,
+)
+from .rent_payload import PAYLOAD_YEAR, PayloadError, check_rent_payload
+from .workbook import generate_rent_workbook, rent_workbook_key
+from .workers import WorkerPool
+from .xlsx_splice import ChunkSink
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+# Workbook names end up in zip member names.
+_NAME_RE = re.compile(r"[A-Za-z0-9_-][A-Za-z0-9 _.-]{0,63}")
+
+
+@dataclass(frozen=True)
+class BatchItem:
+    """One workbook of a batch: local data for ``year``, or a complete payload."""
+
+    filename: str
+    year: int
+    # None for every property in the year's data.
+    property_ids: tuple[str, ...] | None = None
+    payload: dict[str, Any] | None = None
+
+
+def parse_batch(
+    body: Any, max_workbooks: int
+) -> tuple[list[BatchItem], list[PayloadError]]:
+    """Turn a batch request into items, or every problem found with it.
+
+    ``body["workbooks"]`` lists specs of the form ``{"year", "properties",
+    "name"}`` for local data, or ``{"payload", "name"}`` for a payload as
+    accepted by POST /api/rent-workbook.
+    """
+    errors: list[PayloadError] = []
+    specs = body.get("workbooks") if isinstance(body, dict) else None
+    if not isinstance(specs, list) or not specs:
+        return [], [PayloadError("workbooks", "must be a non-empty array")]
+    if len(specs) > max_workbooks:
+        return [], [PayloadError("workbooks", f"must list at most {max_workbooks}")]
+
+    years = set(available_years())
+    items: list[BatchItem] = []
+    filenames: set[str] = set()
+    for index, spec in enumerate(specs):
+        path = f"workbooks[{index}]"
+        if not isinstance(spec, dict):
+            errors.append(PayloadError(path, "must be an object"))
+            continue
+        name = spec.get("name")
+        if name is not None and (
+            not isinstance(name, str) or not _NAME_RE.fullmatch(name)
+        ):
+            errors.append(
+                PayloadError(
+                    f"{path}.name",
+                    "must be 1-64 letters, digits, spaces, '.', '_' or '-'",
+                )
+            )
+            continue
+
+        if "payload" in spec:
+            item = _payload_item(spec["payload"], f"{path}.payload", years, errors)
+        else:
+            item = _local_item(spec, path, years, errors)
+        if item is None:
+            continue
+        stem = f"Rent_Workbook_{item.year}" + (f"_{name}" if name else "")
+        filename = f"{stem}.xlsx"
+        if filename.casefold() in filenames:
+            errors.append(
+                PayloadError(
+                    f"{path}.name", f"duplicate file {filename}; name each workbook"
+                )
+            )
+            continue
+        filenames.add(filename.casefold())
+        items.append(replace(item, filename=filename))
+    return items, errors
+
+
+def _payload_item(
+    payload: Any, path: str, years: set[int], errors: list[PayloadError]
+) -> BatchItem | None:
+    check = check_rent_payload(payload)
+    if check.needs_local_data:
+        # Rebuilt from local data, as POST /api/rent-workbook does.
+        year = payload.get("year") if isinstance(payload, dict) else None
+        if type(year) is not int:
+            year = PAYLOAD_YEAR
+        return _local_item({"year": year}, path, years, errors)
+    if check.errors:
+        errors.extend(
+            PayloadError(f"{path}.{error.path}", error.message)
+            for error in check.errors
+        )
+        return None
+    return BatchItem("", payload["year"], payload=payload)
+
+
+def _local_item(
+    spec: dict[str, Any], path: str, years: set[int], errors: list[PayloadError]
+) -> BatchItem | None:
+    year = spec.get("year")
+    if type(year) is not int:
+        errors.append(PayloadError(f"{path}.year", "must be an integer"))
+        return None
+    if year not in years:
+        errors.append(PayloadError(f"{path}.year", f"no local rent data for {year}"))
+        return None
+    properties = spec.get("properties")
+    if properties is None:
+        return BatchItem("", year)
+    if (
+        not isinstance(properties, list)
+        or not properties
+        or not all(isinstance(property_id, str) for property_id in properties)
+    ):
+        errors.append(
+            PayloadError(
+                f"{path}.properties", "must be a non-empty array of property ids"
+            )
+        )
+        return None
+    return BatchItem("", year, tuple(properties))
+
+
+def render_batch_item(item: BatchItem) -> tuple[str, bytes]:
+    """Build and render one workbook; runs in a pool worker.
+
+    Returns the workbook's cache key with its bytes, so the caller can cache it.
+    """
+    payload = item.payload
+    if payload is None:
+        payload = build_payload_from_local_tsv(item.year, item.property_ids)
+    return rent_workbook_key(payload), generate_rent_workbook(payload)
+
+
+@dataclass
+class BatchProgress:
+    """Completion of one batch, for the progress endpoint to report."""
+
+    batch_id: str
+    filenames: tuple[str, ...]
+    started: float = field(default_factory=time.monotonic)
+    # filename -> {"status", "seconds", "error"} once the workbook is done.
+    files: dict[str, dict[str, Any]] = field(default_factory=dict)
+    finished: bool = False
+    ended: float | None = None
+    _changed: asyncio.Condition = field(default_factory=asyncio.Condition)
+    _version: int = 0
+
+    @property
+    def failed(self) -> int:
+        return sum(1 for entry in self.files.values() if entry["status"] == "failed")
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "batch_id": self.batch_id,
+            "total": len(self.filenames),
+            "done": len(self.files),
+            "failed": self.failed,
+            "finished": self.finished,
+            "seconds": round((self.ended or time.monotonic()) - self.started, 3),
+            "files": [
+                {"file": filename, **self.files.get(filename, {"status": "pending"})}
+                for filename in self.filenames
+            ],
+        }
+
+    async def record(self, filename: str, seconds: float, error: str | None) -> None:
+        entry: dict[str, Any] = {
+            "status": "failed" if error else "done",
+            "seconds": round(seconds, 3),
+        }
+        if error:
+            entry["error"] = error
+        self.files[filename] = entry
+        await self._notify()
+
+    async def finish(self) -> None:
+        self.finished = True
+        self.ended = time.monotonic()
+        await self._notify()
+
+    async def _notify(self) -> None:
+        async with self._changed:
+            self._version += 1
+            self._changed.notify_all()
+
+    async def updates(self) -> AsyncIterator[dict[str, Any]]:
+        """Yield a snapshot now and after every change, until the batch finishes."""
+        seen = -1
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: self._version != seen)
+                seen = self._version
+            snapshot = self.snapshot()
+            yield snapshot
+            if snapshot["finished"]:
+                return
+
+
+class BatchExporter:
+    """Runs batches on ``pool`` and keeps the progress of the most recent ones.
+
+    At most ``max_workers + max_queue`` workbooks are handed to the pool at once,
+    across all batches, so a batch waits for a free slot instead of being
+    rejected when the pool is busy.
+    """
+
+    def __init__(
+        self, pool: WorkerPool, max_workbooks: int = 50, keep: int = 64
+    ) -> None:
+        self.pool = pool
+        self.max_workbooks = max_workbooks
+        self._slots = asyncio.Semaphore(pool.max_workers + pool.max_queue)
+        self._batches: LRUCache[str, BatchProgress] = LRUCache(maxsize=keep)
+        self.batches = 0
+        self.workbooks = 0
+        self.failed = 0
+
+    def start(self, items: list[BatchItem]) -> BatchProgress:
+        """Register a new batch under a fresh id."""
+        batch_id = uuid.uuid4().hex
+        progress = BatchProgress(batch_id, tuple(item.filename for item in items))
+        self._batches.put(batch_id, progress)
+        self.batches += 1
+        return progress
+
+    def get(self, batch_id: str) -> BatchProgress | None:
+        return self._batches.get(batch_id)
+
+    async def _render(
+        self, item: BatchItem
+    ) -> tuple[BatchItem, float, tuple[str, bytes] | None, str | None]:
+        async with self._slots:
+            started = time.perf_counter()
+            try:
+                result = await self.pool.run(render_batch_item, item)
+            except (RentDataNotFoundError, ValueError, FileNotFoundError) as exc:
+                return item, time.perf_counter() - started, None, str(exc)
+            except Exception:
+                logger.exception("Batch workbook %s failed", item.filename)
+                return (
+                    item,
+                    time.perf_counter() - started,
+                    None,
+                    "workbook generation failed",
+                )
+        return item, time.perf_counter() - started, result, None
+
+    async def stream(
+        self,
+        items: list[BatchItem],
+        progress: BatchProgress,
+        on_workbook: Callable[[str, bytes], Awaitable[None]] | None = None,
+    ) -> AsyncIterator[bytes]:
+        """Yield a zip of the batch's workbooks as they finish, then its manifest.
+
+        ``on_workbook(cache_key, data)`` is called for each finished workbook.
+        Workbooks not yet started are cancelled if the client goes away.
+        """
+        sink = ChunkSink()
+        # Workbooks are already deflated; compressing them again gains nothing.
+        archive = zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED)
+        tasks = [asyncio.ensure_future(self._render(item)) for item in items]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                item, seconds, result, error = await next_done
+                if result is not None:
+                    cache_key, data = result
+                    if on_workbook is not None:
+                        await on_workbook(cache_key, data)
+                    archive.writestr(item.filename, data)
+                    self.workbooks += 1
+                else:
+                    logger.warning(
+                        "Batch %s: %s failed: %s",
+                        progress.batch_id,
+                        item.filename,
+                        error,
+                    )
+                    self.failed += 1
+                await progress.record(item.filename, seconds, error)
+                if sink.size:
+                    yield sink.take()
+            await progress.finish()
+            manifest = progress.snapshot()
+            archive.writestr(MANIFEST_NAME, json.dumps(manifest, indent=2))
+            archive.close()
+            logger.info(
+                "Batch %s: %d workbooks, %d failed, in %.2fs",
+                progress.batch_id,
+                len(items) - manifest["failed"],
+                manifest["failed"],
+                manifest["seconds"],
+            )
+            yield sink.take()
+        finally:
+            for task in tasks:
+                task.cancel()
+            if not progress.finished:
+                await progress.finish()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "workbooks": self.workbooks,
+            "failed": self.failed,
+            "pool": self.pool.stats(),
+        }
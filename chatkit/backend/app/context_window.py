@@ -0,0 +1,226 @@
+"""Token-budgeted selection of thread history for the agent.
+
+Instead of a fixed number of recent items, each turn sends as many of the
+newest items as fit in a token budget. Counting uses ``tiktoken`` when it is
+installed and falls back to a characters-per-token estimate otherwise. Items
+that do not fit can optionally be folded into a short extractive summary so the
+model keeps some memory of older turns.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+from typing import Any
+
+from agents import TResponseInputItem
+from chatkit.types import AssistantMessageItem, ThreadItem, UserMessageItem
+
+from .agent_input import ConvertedItem
+from .cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Roughly what the chat format adds around every message.
+MESSAGE_OVERHEAD_TOKENS = 4
+# Flat charge for non-text content such as images and files.
+ATTACHMENT_TOKENS = 85
+CHARS_PER_TOKEN = 4
+SUMMARY_LINE_CHARS = 160
+
+_TEXT_KEYS = ("text", "content", "arguments", "output")
+
+
+def _load_encoder() -> Callable[[str], int] | None:
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        encoding = tiktoken.get_encoding("o200k_base")
+    except Exception:
+        # The encoding is downloaded on first use; offline hosts estimate instead.
+        logger.warning("tiktoken encoding unavailable, estimating token counts")
+        return None
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+_encode = _load_encoder()
+TOKENIZER = "tiktoken" if _encode is not None else "estimate"
+
+
+def count_text_tokens(text: str) -> int:
+    if _encode is not None:
+        return _encode(text)
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _count_value(value: Any) -> int:
+    if isinstance(value, str):
+        return count_text_tokens(value)
+    if isinstance(value, list):
+        return sum(_count_value(entry) for entry in value)
+    if isinstance(value, dict):
+        if value.get("type") in ("input_image", "input_file"):
+            return ATTACHMENT_TOKENS
+        return sum(_count_value(value[key]) for key in _TEXT_KEYS if key in value)
+    return 0
+
+
+def count_input_tokens(parts: list[TResponseInputItem]) -> int:
+    """Approximate the prompt tokens the given agent input items cost."""
+    return sum(MESSAGE_OVERHEAD_TOKENS + _count_value(part) for part in parts)
+
+
+@dataclass
+class ContextResult:
+    input: list[TResponseInputItem]
+    tokens: int
+    items: int
+    dropped: int
+    summarized: int
+    seconds: float
+
+
+class ContextWindow:
+    """Chooses the newest items that fit ``budget_tokens``.
+
+    The newest item is always sent, even on its own over budget. With
+    ``summary_tokens`` set, up to that many tokens of the budget go to a
+    summary of the items that were left out; summaries are cached by the ids
+    of the items they cover.
+    """
+
+    def __init__(
+        self,
+        budget_tokens: int,
+        summary_tokens: int = 0,
+        summary_cache_size: int = 256,
+    ) -> None:
+        self.budget_tokens = budget_tokens
+        self.summary_tokens = summary_tokens
+        self._summaries: LRUCache[tuple[str, ...], tuple[str, int]] = LRUCache(
+            maxsize=summary_cache_size
+        )
+        self.turns = 0
+        self.tokens_sent = 0
+        self.items_dropped = 0
+        self.total_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def build(
+        self,
+        items: Sequence[ThreadItem],
+        converted: Sequence[ConvertedItem],
+    ) -> ContextResult:
+        """Select from ``items`` (oldest first) and their matching ``converted`` input."""
+        start = time.perf_counter()
+        first, tokens = _select(converted, self.budget_tokens)
+        if first and self.summary_tokens:
+            # Make room for the summary only when something is left out.
+            first, tokens = _select(
+                converted, max(self.budget_tokens - self.summary_tokens, 0)
+            )
+
+        output = [part for item in converted[first:] for part in item.parts]
+        summarized = 0
+        if first and self.summary_tokens:
+            summary = self._summary(items[:first])
+            if summary is not None:
+                text, summary_cost = summary
+                output.insert(0, {"role": "system", "content": text})
+                tokens += summary_cost
+                summarized = first
+
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.turns += 1
+            self.tokens_sent += tokens
+            self.items_dropped += first
+            self.total_seconds += elapsed
+        return ContextResult(
+            input=output,
+            tokens=tokens,
+            items=len(items) - first,
+            dropped=first,
+            summarized=summarized,
+            seconds=elapsed,
+        )
+
+    def _summary(self, dropped: Sequence[ThreadItem]) -> tuple[str, int] | None:
+        key = tuple(item.id for item in dropped)
+        cached = self._summaries.get(key)
+        if cached is not None:
+            return cached
+
+        header = "Summary of earlier conversation (oldest first):"
+        remaining = self.summary_tokens - count_text_tokens(header)
+        lines: list[str] = []
+        for item in reversed(dropped):
+            line = _summary_line(item)
+            if line is None:
+                continue
+            cost = count_text_tokens(line) + 1
+            if cost > remaining:
+                break
+            remaining -= cost
+            lines.append(line)
+        if not lines:
+            return None
+
+        text = "\n".join([header, *reversed(lines)])
+        summary = (text, MESSAGE_OVERHEAD_TOKENS + count_text_tokens(text))
+        self._summaries.put(key, summary)
+        return summary
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "tokenizer": TOKENIZER,
+                "budget_tokens": self.budget_tokens,
+                "summary_tokens": self.summary_tokens,
+                "turns": self.turns,
+                "avg_tokens": self.tokens_sent / self.turns if self.turns else None,
+                "items_dropped": self.items_dropped,
+                "avg_build_ms": (
+                    self.total_seconds / self.turns * 1000 if self.turns else None
+                ),
+                "summaries": self._summaries.stats(),
+            }
+
+
+def _select(converted: Sequence[ConvertedItem], budget: int) -> tuple[int, int]:
+    """Index of the oldest item that fits, walking back from the newest."""
+    first = len(converted)
+    tokens = 0
+    while first > 0:
+        cost = converted[first - 1].tokens
+        if first < len(converted) and tokens + cost > budget:
+            break
+        tokens += cost
+        first -= 1
+    return first, tokens
+
+
+def _summary_line(item: ThreadItem) -> str | None:
+    """First sentence of a user or assistant message, clipped."""
+    if isinstance(item, UserMessageItem):
+        role = "User"
+        text = "".join(getattr(part, "text", "") for part in item.content)
+    elif isinstance(item, AssistantMessageItem):
+        role = "Assistant"
+        text = " ".join(part.text for part in item.content)
+    else:
+        return None
+    text = " ".join(text.split())
+    if not text:
+        return None
+    ends = [end for end in map(text.find, (". ", "? ", "! ")) if end > 0]
+    if ends and min(ends) < SUMMARY_LINE_CHARS:
+        text = text[: min(ends) + 1]
+    if len(text) > SUMMARY_LINE_CHARS:
+        text = text[: SUMMARY_LINE_CHARS - 3].rstrip() + "..."
+    return f"- {role}: {text}"
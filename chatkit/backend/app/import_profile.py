@@ -0,0 +1,116 @@
+"""Opt-in import-time profiler, summarized in the logs.
+
+Set ``CHATKIT_IMPORT_PROFILE=1`` and ``app/__init__.py`` wraps
+``builtins.__import__`` before anything else is imported. Every import
+statement that loads new modules is timed, like ``python -X importtime``, and
+``log_import_profile`` logs the slowest modules and packages instead of one
+stderr line per module.
+"""
+
+from __future__ import annotations
+
+import builtins
+import logging
+import sys
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Mapping, Sequence
+from importlib.util import resolve_name
+from types import ModuleType
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+_original_import = builtins.__import__
+_local = threading.local()
+# module -> seconds spent importing it, with and without the imports it made.
+_cumulative: defaultdict[str, float] = defaultdict(float)
+_self: defaultdict[str, float] = defaultdict(float)
+_started: float | None = None
+
+
+def _timed_import(
+    name: str,
+    globals: Mapping[str, object] | None = None,
+    locals: Mapping[str, object] | None = None,
+    fromlist: Sequence[str] | None = (),
+    level: int = 0,
+) -> ModuleType:
+    package = (globals or {}).get("__package__")
+    try:
+        module = resolve_name(
+            "." * level + name, package if isinstance(package, str) else None
+        )
+    except (ImportError, ValueError):
+        module = name
+    if module in sys.modules and not fromlist:
+        return _original_import(name, globals, locals, fromlist, level)
+
+    # [module, time spent in imports nested inside it] per import in progress,
+    # per thread.
+    stack: list[list[Any]] = _local.__dict__.setdefault("stack", [])
+    stack.append([module, 0.0])
+    started = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        elapsed = time.perf_counter() - started
+        _, nested = stack.pop()
+        if stack:
+            stack[-1][1] += elapsed
+        # A package importing its own submodules is already being timed.
+        if all(outer != module for outer, _ in stack):
+            _cumulative[module] += elapsed
+        _self[module] += elapsed - nested
+
+
+def start_import_profile() -> None:
+    global _started
+    if builtins.__import__ is not _timed_import:
+        _started = time.perf_counter()
+        builtins.__import__ = _timed_import
+
+
+def import_profile_active() -> bool:
+    return builtins.__import__ is _timed_import
+
+
+def import_profile(limit: int = 15) -> dict[str, Any]:
+    """The slowest imports by cumulative time, and self time per top-level package."""
+    packages: defaultdict[str, float] = defaultdict(float)
+    for module, seconds in list(_self.items()):
+        packages[module.partition(".")[0]] += seconds
+    return {
+        "seconds": (
+            round(time.perf_counter() - _started, 3) if _started is not None else None
+        ),
+        "import_seconds": round(sum(packages.values()), 3),
+        "modules": _top(_cumulative, limit),
+        "packages": _top(packages, limit),
+    }
+
+
+def log_import_profile(label: str, limit: int = 15) -> None:
+    if not import_profile_active():
+        return
+    profile = import_profile(limit)
+    logger.info(
+        "Import profile (%s): %.2fs importing; slowest modules (cumulative): %s; "
+        "by package (self): %s",
+        label,
+        profile["import_seconds"],
+        _format(profile["modules"]),
+        _format(profile["packages"]),
+    )
+
+
+def _top(times: Mapping[str, float], limit: int) -> dict[str, float]:
+    ranked = sorted(times.items(), key=lambda entry: entry[1], reverse=True)
+    return {name: round(seconds, 3) for name, seconds in ranked[:limit]}
+
+
+def _format(times: Mapping[str, float]) -> str:
+    return ", ".join(
+        f"{name} {seconds * 1000:.0f}ms" for name, seconds in times.items()
+    )
@@ -2,33 +2,116 @@
 
 from __future__ import annotations
 
-from typing import Any
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable
 
+import asyncio
+import importlib
+import json
 import logging
 import os
-from calendar import month_abbr
-from csv import DictReader
+from contextlib import asynccontextmanager
 from pathlib import Path
 
-from fastapi import Body, FastAPI, HTTPException, Request, Response
+from fastapi import Body, FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
-from fastapi.staticfiles import StaticFiles
-
-from chatkit.server import StreamingResult
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from . import metrics
+from .batch import BatchExporter, parse_batch
+from .import_profile import log_import_profile
+from .metrics import WORKBOOK_STAGE_SECONDS, Counter, Gauge, MetricsMiddleware, stage
+from .rent_data import (
+    RentDataNotFoundError,
+    available_years,
+    build_payload_from_local_tsv,
+    load_year,
+    rent_data_stats,
+)
+from .rent_payload import PAYLOAD_YEAR, PayloadError, check_rent_payload
+from .sse import coalesce_sse
+from .static_index import StaticIndex
+from .warmup import Warmup
+from .workbook import (
+    WORKBOOK_ENGINE,
+    generate_rent_workbook,
+    load_spliced_template,
+    load_template_workbook,
+    rent_workbook_key,
+)
+from .workbook_cache import WorkbookCache
+from .workers import PoolSaturatedError, WorkerPool
 
-from .server import StarterChatServer
-from .workbook import generate_rent_workbook
+if TYPE_CHECKING:
+    # ChatKit and the Agents SDK take most of the import time, so app.server is
+    # only imported on first use (or by the warm-up); see get_chatkit_server.
+    from .server import StarterChatServer
 
 logger = logging.getLogger(__name__)
 
-REQUIRED_PROPERTY_IDS = [f"KN{index:02d}" for index in range(1, 11)]
-DATA_DIR = Path(__file__).resolve().parents[1] / "data"
-RENT_PAYMENTS_FILE_TEMPLATE = "RENT_Payments_{year}.txt"
-MONTH_NAMES = {index: month_abbr[index] for index in range(1, 13)}
-MISSING_DATA_REMARKS = "Missing data"
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# openpyxl load/save is CPU-bound; keep it off the event loop so /chatkit streams
+# on the same worker keep flowing while a workbook is being built.
+workbook_pool = WorkerPool(
+    max_workers=int(os.environ.get("RENT_WORKBOOK_WORKERS", "2")),
+    max_queue=int(os.environ.get("RENT_WORKBOOK_MAX_QUEUE", "8")),
+    kind=os.environ.get("RENT_WORKBOOK_POOL", "thread"),
+)
+
+# Batches render many workbooks at once; a process pool spreads them over every
+# core, and a pool of their own keeps them from queueing ahead of single downloads.
+batch_pool = WorkerPool(
+    max_workers=int(
+        os.environ.get("RENT_WORKBOOK_BATCH_WORKERS") or os.cpu_count() or 1
+    ),
+    max_queue=int(os.environ.get("RENT_WORKBOOK_BATCH_MAX_QUEUE", "4")),
+    kind=os.environ.get("RENT_WORKBOOK_BATCH_POOL", "process"),
+)
+batch_exporter = BatchExporter(
+    batch_pool, max_workbooks=int(os.environ.get("RENT_WORKBOOK_BATCH_MAX", "50"))
+)
+
+workbook_cache = WorkbookCache(
+    max_bytes=int(os.environ.get("RENT_WORKBOOK_CACHE_BYTES", str(32 * 1024 * 1024))),
+    spill_dir=(
+        Path(os.environ["RENT_WORKBOOK_CACHE_DIR"])
+        if os.environ.get("RENT_WORKBOOK_CACHE_DIR")
+        else None
+    ),
+    max_disk_bytes=int(
+        os.environ.get("RENT_WORKBOOK_CACHE_DIR_BYTES", str(256 * 1024 * 1024))
+    ),
+)
+
+
+# Caches filled in the background after a start; see app/warmup.py.
+WARMUP_ENABLED = os.environ.get("CHATKIT_WARMUP", "1") != "0"
+WARMUP_PRERENDER = os.environ.get("RENT_WORKBOOK_PRERENDER", "0") == "1"
+warmup = Warmup()
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    log_import_profile("startup")
+    warmup.start(_warmup_steps() if WARMUP_ENABLED else [])
+    yield
+    await warmup.stop()
+    workbook_pool.shutdown()
+    batch_pool.shutdown()
+    if _chatkit_server is not None:
+        from chatkit.store import Store
+
+        from .memory_store import MemoryStore
+        from .sqlite_store import SqliteStore
 
-app = FastAPI(title="ChatKit Starter API")
+        store: Store[dict] | None = _chatkit_server.store
+        if isinstance(store, MemoryStore):
+            store = store.spill
+        if isinstance(store, SqliteStore):
+            store.close()
+
+
+app = FastAPI(title="ChatKit Starter API", lifespan=lifespan)
 
 
 app.add_middleware(
@@ -37,261 +120,59 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Batch-Id"],
 )
+app.add_middleware(MetricsMiddleware)
 
 WORKFLOW_ID = os.environ.get("OPENAI_WORKFLOW_ID")
 WORKFLOW_VERSION = os.environ.get("OPENAI_WORKFLOW_VERSION", "draft")
 
-chatkit_server = StarterChatServer()
-
-
-def _payload_needs_local_data(payload: dict[str, Any]) -> bool:
-    properties = payload.get("properties")
-    if not isinstance(properties, list):
-        return True
-    if len(properties) < len(REQUIRED_PROPERTY_IDS):
-        return True
-    for prop in properties:
-        if not isinstance(prop, dict):
-            return True
-        rows = prop.get("rows")
-        if not isinstance(rows, list) or len(rows) < 12:
-            return True
-        for row in rows:
-            remarks = row.get("remarks")
-            if isinstance(remarks, str) and remarks.strip().lower() == "missing data":
-                return True
-    return False
-
-
-def _validate_rent_payload(payload: dict[str, Any], context: str) -> None:
-    try:
-        if payload.get("template_version") != "property_rents_received_v1":
-            raise ValueError("template_version must be property_rents_received_v1")
-        if payload.get("year") != 2025:
-            raise ValueError("year must be 2025")
-        properties = payload.get("properties")
-        if not isinstance(properties, list):
-            raise ValueError("properties must be an array")
-        if len(properties) != len(REQUIRED_PROPERTY_IDS):
-            raise ValueError("properties must include KN01-KN10")
-
-        seen_ids: set[str] = set()
-        for prop in properties:
-            if not isinstance(prop, dict):
-                raise ValueError("each property must be an object")
-            property_id = prop.get("property_id")
-            if property_id not in REQUIRED_PROPERTY_IDS:
-                raise ValueError("invalid or missing property_id")
-            if property_id in seen_ids:
-                raise ValueError("duplicate property_id found")
-            seen_ids.add(property_id)
-
-            if prop.get("period_months") != 12:
-                raise ValueError(f"{property_id} must have period_months 12")
-            for field in ("property_address", "tenant_name"):
-                value = prop.get(field)
-                if value is not None and not isinstance(value, str):
-                    raise ValueError(f"{field} must be a string or null for {property_id}")
-
-            rows = prop.get("rows")
-            if not isinstance(rows, list):
-                raise ValueError(f"{property_id} rows must be a list")
-            if len(rows) != 12:
-                raise ValueError(f"{property_id} must have exactly 12 rows")
-
-            seen_months: set[int] = set()
-            for row in rows:
-                if not isinstance(row, dict):
-                    raise ValueError("each row must be an object")
-                month_number = row.get("month_number")
-                if not isinstance(month_number, int) or not 1 <= month_number <= 12:
-                    raise ValueError("month_number must be an integer between 1 and 12")
-                if month_number in seen_months:
-                    raise ValueError("duplicate month_number detected")
-                seen_months.add(month_number)
-
-                if not isinstance(row.get("month"), str):
-                    raise ValueError("month must be a string")
-                housing_dept = row.get("housing_dept")
-                if housing_dept is not None and not isinstance(housing_dept, str):
-                    raise ValueError("housing_dept must be a string or null")
-
-                numeric_fields = (
-                    "rent_due",
-                    "housing_paid",
-                    "tenant_paid",
-                    "total_received",
-                    "month_balance_due",
-                    "year_balance_due",
-                )
-                for numeric_field in numeric_fields:
-                    value = row.get(numeric_field)
-                    if not isinstance(value, (int, float)):
-                        raise ValueError(f"{numeric_field} must be a number")
-
-                if not isinstance(row.get("remarks"), str):
-                    raise ValueError("remarks must be a string")
-
-            if seen_months != set(range(1, 13)):
-                raise ValueError("rows must cover months 1 through 12")
-    except ValueError as exc:
-        logger.error("Payload validation failed (%s): %s", context, exc)
-        raise
-    logger.info("Payload validation succeeded (%s)", context)
+WORKBOOK_FAST_PATH = os.environ.get("CHATKIT_WORKBOOK_FAST_PATH", "1") != "0"
 
+# /chatkit streams go through app/sse.py unless CHATKIT_SSE_COALESCE=0: text
+# deltas within the window are merged and idle streams get heartbeats.
+SSE_COALESCE = os.environ.get("CHATKIT_SSE_COALESCE", "1") != "0"
+SSE_COALESCE_MS = float(os.environ.get("CHATKIT_SSE_COALESCE_MS", "15"))
+SSE_HEARTBEAT_SECONDS = float(os.environ.get("CHATKIT_SSE_HEARTBEAT_SECONDS", "15"))
 
-def _parse_numeric_value(value: str | None, *, field: str, context: str) -> float:
-    raw = value or ""
-    cleaned = raw.strip().replace("$", "").replace(",", "")
-    if not cleaned:
-        return 0.0
-    try:
-        return float(cleaned)
-    except ValueError as exc:
-        raise ValueError(f"{context}: {field} is not a number ({value})") from exc
+_chatkit_server: StarterChatServer | None = None
+# Agent-written payloads that were replaced by local data, and fire-and-forget tasks.
+llm_payloads_discarded = 0
+_background_tasks: set[asyncio.Task[None]] = set()
 
 
-def build_payload_from_local_tsv(year: int = 2025) -> dict[str, Any]:
-    file_path = DATA_DIR / RENT_PAYMENTS_FILE_TEMPLATE.format(year=year)
-    if not file_path.is_file():
-        raise FileNotFoundError(f"Missing data file: {file_path}")
+# Payloads reach the renderers already validated: client payloads by the endpoint,
+# local ones when the TSV is indexed.
+def _render_rent_workbook(payload: dict[str, Any]) -> bytes:
+    return generate_rent_workbook(payload)
 
-    property_rows: dict[str, dict] = {
-        prop_id: {
-            "property_address": None,
-            "tenant_name": None,
-            "rows": {},
-        }
-        for prop_id in REQUIRED_PROPERTY_IDS
-    }
 
-    with file_path.open(encoding="utf-8") as source:
-        reader = DictReader(source, delimiter="\t")
-        for row in reader:
-            property_id = (row.get("property_id") or "").strip()
-            if not property_id or property_id not in property_rows:
-                logger.debug("Skipping unsupported property_id=%s", property_id)
-                continue
-            month_number_raw = row.get("month_number")
-            try:
-                month_number = int(month_number_raw or "")
-            except ValueError:
-                logger.warning(
-                    "Skipping %s row with invalid month_number=%r",
-                    property_id,
-                    month_number_raw,
-                )
-                continue
-            if not 1 <= month_number <= 12:
-                logger.warning(
-                    "Skipping %s row with out-of-range month_number=%d",
-                    property_id,
-                    month_number,
-                )
-                continue
-
-            entry = property_rows[property_id]
-            address = (row.get("property_address") or "").strip()
-            if address:
-                entry["property_address"] = address
-            tenant = (row.get("tenant_name") or "").strip()
-            if tenant:
-                entry["tenant_name"] = tenant
-
-            month_rows = entry["rows"]
-            if month_number in month_rows:
-                logger.warning(
-                    "Duplicate data for %s month %d; keeping first row",
-                    property_id,
-                    month_number,
-                )
-                continue
-
-            month_name = (row.get("month_name") or MONTH_NAMES.get(month_number, "")).strip()
-            month_rows[month_number] = {
-                "month_number": month_number,
-                "month": month_name or MONTH_NAMES[month_number],
-                "rent_due": _parse_numeric_value(
-                    row.get("scheduled_rent_amount"),
-                    field="scheduled_rent_amount",
-                    context=f"{property_id} month {month_number}",
-                ),
-                "housing_dept": (
-                    (row.get("housing_dept_name") or row.get("housing_dept") or "").strip()
-                    or MISSING_DATA_REMARKS
-                ),
-                "housing_paid": _parse_numeric_value(
-                    row.get("housing_amount_paid"),
-                    field="housing_amount_paid",
-                    context=f"{property_id} month {month_number}",
-                ),
-                "tenant_paid": _parse_numeric_value(
-                    row.get("tenant_amount_paid"),
-                    field="tenant_amount_paid",
-                    context=f"{property_id} month {month_number}",
-                ),
-                "total_received": _parse_numeric_value(
-                    row.get("total_amount_received"),
-                    field="total_amount_received",
-                    context=f"{property_id} month {month_number}",
-                ),
-                "month_balance_due": _parse_numeric_value(
-                    row.get("month_balance_due"),
-                    field="month_balance_due",
-                    context=f"{property_id} month {month_number}",
-                ),
-                "year_balance_due": _parse_numeric_value(
-                    row.get("year_balance_due"),
-                    field="year_balance_due",
-                    context=f"{property_id} month {month_number}",
-                ),
-                "remarks": (row.get("notes") or "").strip(),
-            }
+async def get_chatkit_server() -> StarterChatServer:
+    """Return the chat server, importing and building it on first use.
 
-    properties: list[dict[str, Any]] = []
-    for property_id in REQUIRED_PROPERTY_IDS:
-        entry = property_rows[property_id]
-        rows = []
-        for month_number in range(1, 13):
-            month_entry = entry["rows"].get(month_number)
-            if month_entry is None:
-                month_entry = {
-                    "month_number": month_number,
-                    "month": MONTH_NAMES[month_number],
-                    "rent_due": 0.0,
-                    "housing_dept": MISSING_DATA_REMARKS,
-                    "housing_paid": 0.0,
-                    "tenant_paid": 0.0,
-                    "total_received": 0.0,
-                    "month_balance_due": 0.0,
-                    "year_balance_due": 0.0,
-                    "remarks": MISSING_DATA_REMARKS,
-                }
-            rows.append(month_entry)
-
-        properties.append(
-            {
-                "property_id": property_id,
-                "property_address": entry["property_address"] or MISSING_DATA_REMARKS,
-                "tenant_name": entry["tenant_name"] or MISSING_DATA_REMARKS,
-                "period_months": 12,
-                "rows": rows,
-            }
+    The import runs on a thread so requests already being served keep flowing.
+    """
+    global _chatkit_server
+    if _chatkit_server is None:
+        server_module = await asyncio.to_thread(
+            importlib.import_module, ".server", __package__
         )
-
-    logger.info("Rebuilt rent payload from %s", file_path)
-    return {
-        "template_version": "property_rents_received_v1",
-        "year": year,
-        "properties": properties,
-    }
+        if _chatkit_server is None:
+            server = server_module.StarterChatServer()
+            if WORKBOOK_FAST_PATH:
+                server.workbook_reply = rent_workbook_reply
+            _chatkit_server = server
+            log_import_profile("chat server")
+    return _chatkit_server
 
 
 @app.post("/chatkit")
 async def chatkit_endpoint(request: Request) -> Response:
     """Proxy the ChatKit web component payload to the server implementation."""
+    from chatkit.server import StreamingResult
+
     payload = await request.body()
+    chatkit_server = await get_chatkit_server()
     result = await chatkit_server.process(
         payload,
         {
@@ -302,77 +183,590 @@ async def chatkit_endpoint(request: Request) -> Response:
     )
 
     if isinstance(result, StreamingResult):
-        return StreamingResponse(result, media_type="text/event-stream")
+        if not SSE_COALESCE:
+            return StreamingResponse(result, media_type="text/event-stream")
+        return StreamingResponse(
+            coalesce_sse(
+                result,
+                window=SSE_COALESCE_MS / 1000,
+                heartbeat=SSE_HEARTBEAT_SECONDS,
+            ),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
     if hasattr(result, "json"):
         return Response(content=result.json, media_type="application/json")
     return JSONResponse(result)
 
 
+def _pool_saturated(exc: PoolSaturatedError) -> HTTPException:
+    logger.warning("Workbook pool saturated: %s", workbook_pool.stats())
+    return HTTPException(
+        status_code=503,
+        detail="Workbook generation is busy; retry shortly",
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+def _invalid_payload(source: str, errors: list[PayloadError]) -> HTTPException:
+    logger.error(
+        "Payload validation failed (%s): %s",
+        source,
+        "; ".join(str(error) for error in errors),
+    )
+    return HTTPException(
+        status_code=400,
+        detail=[{"path": error.path, "message": error.message} for error in errors],
+    )
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag in candidates or "*" in candidates
+
+
 @app.post("/api/rent-workbook")
-async def rent_workbook_endpoint(payload: dict = Body(...)) -> Response:
+async def rent_workbook_endpoint(
+    request: Request, payload: dict = Body(...)
+) -> Response:
     """Generate a rent workbook and return it as a binary download."""
 
-    final_payload = payload
-    rebuilt_from_local = False
-    if _payload_needs_local_data(payload):
-        logger.info("Payload missing data; rebuilding from local TSV")
+    global llm_payloads_discarded
+    with stage(WORKBOOK_STAGE_SECONDS, "validation"):
+        check = check_rent_payload(payload)
+    if not check.needs_local_data:
+        if check.errors:
+            raise _invalid_payload("client payload", list(check.errors))
+        logger.info("Payload validation succeeded (client payload)")
+        return await _workbook_response(request, payload)
+    if payload.get("properties"):
+        # An agent-written skeleton that the local data replaces wholesale.
+        llm_payloads_discarded += 1
+    year = payload.get("year")
+    if type(year) is not int:
+        year = PAYLOAD_YEAR
+    logger.info("Payload missing data; rebuilding %d from local TSV", year)
+    return await _workbook_response(request, await _local_payload(year))
+
+
+@app.get("/api/rent-workbook")
+async def rent_workbook_download(
+    request: Request,
+    year: int = PAYLOAD_YEAR,
+    properties: str | None = Query(
+        None, description="Comma-separated property ids; all properties when omitted"
+    ),
+) -> Response:
+    """Download the workbook built from local rent data, as linked from chat."""
+    property_ids = (
+        [part.strip() for part in properties.split(",") if part.strip()]
+        if properties
+        else None
+    )
+    return await _workbook_response(request, await _local_payload(year, property_ids))
+
+
+@app.post("/api/rent-workbook/batch")
+async def rent_workbook_batch(body: dict = Body(...)) -> Response:
+    """Render several workbooks in parallel and stream them back as one zip."""
+    items, errors = parse_batch(body, batch_exporter.max_workbooks)
+    if errors:
+        raise _invalid_payload("batch", errors)
+    progress = batch_exporter.start(items)
+    logger.info("Batch %s: %d workbooks", progress.batch_id, len(items))
+    return StreamingResponse(
+        batch_exporter.stream(items, progress, on_workbook=workbook_cache.put),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": 'attachment; filename="Rent_Workbooks.zip"',
+            "X-Batch-Id": progress.batch_id,
+        },
+    )
+
+
+@app.get("/api/rent-workbook/batch/{batch_id}")
+async def rent_workbook_batch_status(batch_id: str) -> dict[str, Any]:
+    """Report which workbooks of a batch are done."""
+    progress = batch_exporter.get(batch_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail=f"Unknown batch {batch_id}")
+    return progress.snapshot()
+
+
+@app.get("/api/rent-workbook/batch/{batch_id}/events")
+async def rent_workbook_batch_events(batch_id: str) -> StreamingResponse:
+    """Stream a batch's progress as server-sent events until it finishes."""
+    progress = batch_exporter.get(batch_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail=f"Unknown batch {batch_id}")
+
+    async def events() -> AsyncIterator[str]:
+        async for snapshot in progress.updates():
+            event = "complete" if snapshot["finished"] else "progress"
+            yield f"event: {event}\ndata: {json.dumps(snapshot)}\n\n"
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"}
+    )
+
+
+@app.get("/api/rent-data")
+async def rent_data_index() -> dict[str, Any]:
+    """List the years with local rent data and the properties in each."""
+    years = []
+    for year in available_years():
         try:
-            final_payload = build_payload_from_local_tsv()
-        except FileNotFoundError as exc:
-            logger.exception("Local rent data file missing")
-            raise HTTPException(status_code=500, detail=str(exc)) from exc
-        except ValueError as exc:
-            logger.exception("Local rent data parsing failed")
-            raise HTTPException(status_code=500, detail=f"Local data error: {exc}") from exc
-        rebuilt_from_local = True
-
-    context = "local TSV" if rebuilt_from_local else "client payload"
+            rent_year = await workbook_pool.run(load_year, year)
+        except PoolSaturatedError as exc:
+            raise _pool_saturated(exc) from exc
+        years.append(
+            {
+                "year": year,
+                "properties": list(rent_year.property_ids),
+                "summary": rent_year.summary(),
+            }
+        )
+    return {"years": years}
+
+
+@app.get("/api/rent-data/{year}/reconciliation")
+async def rent_data_reconciliation(year: int) -> dict[str, Any]:
+    """List the months whose amounts do not follow the rent rules, or are missing."""
     try:
-        _validate_rent_payload(final_payload, context)
-        excel_bytes = generate_rent_workbook(final_payload)
-    except FileNotFoundError as exc:
-        raise HTTPException(status_code=500, detail=str(exc))
+        return await workbook_pool.run(_reconciliation_report, year)
+    except PoolSaturatedError as exc:
+        raise _pool_saturated(exc) from exc
+    except RentDataNotFoundError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+
+
+def _reconciliation_report(year: int) -> dict[str, Any]:
+    rent_year = load_year(year)
+    return {
+        "year": year,
+        "summary": rent_year.summary(),
+        "anomalies": rent_year.reconciliation.anomalies(rent_year.table),
+    }
+
+
+async def _local_payload(
+    year: int, property_ids: list[str] | None = None
+) -> dict[str, Any]:
+    try:
+        return await workbook_pool.run(build_payload_from_local_tsv, year, property_ids)
+    except PoolSaturatedError as exc:
+        raise _pool_saturated(exc) from exc
+    except RentDataNotFoundError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
     except ValueError as exc:
-        raise HTTPException(status_code=400, detail=str(exc))
-    except Exception as exc:  # pragma: no cover - fail-safe
-        raise HTTPException(status_code=500, detail=f"Workbook generation failed: {exc}")
+        logger.exception("Local rent data parsing failed")
+        raise HTTPException(status_code=500, detail=f"Local data error: {exc}") from exc
+
 
+async def _workbook_response(
+    request: Request, final_payload: dict[str, Any]
+) -> Response:
     year = final_payload.get("year", 2025)
     filename = f"Rent_Workbook_{year}.xlsx"
+
+    try:
+        cache_key = rent_workbook_key(final_payload)
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+    etag = f'"{cache_key}"'
     headers = {
         "Content-Disposition": f'attachment; filename="{filename}"',
+        "ETag": etag,
     }
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    cached = await workbook_cache.get(cache_key)
+    if cached is not None:
+        warmup.workbook_served()
+        return Response(content=cached, media_type=XLSX_MEDIA_TYPE, headers=headers)
+
+    try:
+        # Both engines deflate the zip inside the job, so the save stage counts
+        # against the pool's limit like the rest of the render.
+        excel_bytes = await workbook_pool.run(_render_rent_workbook, final_payload)
+    except PoolSaturatedError as exc:
+        raise _pool_saturated(exc) from exc
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except Exception as exc:  # pragma: no cover - fail-safe
+        raise HTTPException(
+            status_code=500, detail=f"Workbook generation failed: {exc}"
+        )
+    warmup.workbook_served()
 
+    await workbook_cache.put(cache_key, excel_bytes)
     return Response(
         content=excel_bytes,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        media_type=XLSX_MEDIA_TYPE,
         headers=headers,
     )
 
 
+async def _prerender_workbook(payload: dict[str, Any]) -> None:
+    """Render ``payload`` into the workbook cache so the chat link downloads at once."""
+    try:
+        cache_key = rent_workbook_key(payload)
+        if await workbook_cache.get(cache_key) is None:
+            await workbook_cache.put(
+                cache_key,
+                await workbook_pool.run(_render_rent_workbook, payload),
+            )
+    except PoolSaturatedError:
+        logger.info("Skipped workbook pre-render; pool is busy")
+    except Exception:
+        logger.exception("Workbook pre-render failed")
+
+
+async def rent_workbook_reply(year: int) -> str:
+    """Chat reply for a workbook request, answered from local data without the LLM."""
+    try:
+        payload, totals = await workbook_pool.run(_payload_and_summary, year)
+    except RentDataNotFoundError:
+        years = ", ".join(str(known) for known in available_years()) or "none"
+        return f"There is no local rent data for {year}. Years available: {years}."
+    task = asyncio.create_task(_prerender_workbook(payload))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+    summary = (
+        f"Built from local rent data: {totals['properties']} properties, "
+        f"{totals['months']} monthly rows, "
+        f"${totals['total_received']:,.2f} received in total"
+    )
+    if totals["months_marked_missing"]:
+        summary += f", {totals['months_marked_missing']} months marked missing"
+    unreconciled = totals["reconciliation"]["unreconciled"]
+    if unreconciled:
+        summary += (
+            f". {unreconciled} months do not reconcile; see "
+            f"[the reconciliation report](/api/rent-data/{year}/reconciliation)"
+        )
+    return (
+        f"Your {year} rent workbook is ready: "
+        f"[Download Rent_Workbook_{year}.xlsx](/api/rent-workbook?year={year})\n\n"
+        f"{summary}."
+    )
+
+
+def _payload_and_summary(year: int) -> tuple[dict[str, Any], dict[str, Any]]:
+    rent_year = load_year(year)
+    return rent_year.payload(), rent_year.summary()
+
+
+def _warm_template() -> None:
+    # Both engines fill sheets from the split template; openpyxl also copies
+    # the parsed workbook.
+    load_spliced_template()
+    if WORKBOOK_ENGINE != "splice":
+        load_template_workbook()
+
+
+def _warm_rent_data() -> None:
+    for year in available_years():
+        load_year(year)
+
+
+async def _warm_workbook() -> None:
+    await _prerender_workbook(
+        await asyncio.to_thread(build_payload_from_local_tsv, PAYLOAD_YEAR)
+    )
+
+
+def _warmup_steps() -> list[tuple[str, Callable[[], Awaitable[Any]]]]:
+    # Runs on a thread of its own rather than the workbook pool, so it never
+    # takes a slot from a request; process pool workers still warm up on their
+    # first job.
+    steps: list[tuple[str, Callable[[], Awaitable[Any]]]] = [
+        # The page itself is what a visitor asks for first.
+        ("static", lambda: asyncio.to_thread(static_index)),
+        ("template", lambda: asyncio.to_thread(_warm_template)),
+        ("rent_data", lambda: asyncio.to_thread(_warm_rent_data)),
+    ]
+    if WARMUP_PRERENDER:
+        steps.append(("workbook", _warm_workbook))
+    # Imports ChatKit and the Agents SDK, the bulk of a cold start.
+    steps.append(("chat_server", get_chatkit_server))
+    return steps
+
+
+@app.get("/health")
+async def health() -> dict[str, Any]:
+    """Liveness, plus whether the background warm-up has finished."""
+    return {"status": "ok", "warmup": warmup.stats()}
+
+
+@app.get("/api/rent-workbook/stats")
+async def rent_workbook_stats() -> dict[str, Any]:
+    """Report cache and worker pool counters for the workbook pipeline."""
+    return {
+        "rent_data": rent_data_stats(),
+        "worker_pool": workbook_pool.stats(),
+        "workbook_cache": workbook_cache.stats(),
+        "batch": batch_exporter.stats(),
+        "llm_payloads_discarded": llm_payloads_discarded,
+    }
+
+
+@app.get("/metrics")
+async def metrics_endpoint() -> Response:
+    """Prometheus metrics: request and stage latencies, gauges and counters."""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+def _pool_stats(*fields: str) -> dict[tuple[str, ...], float]:
+    pools = {"workbook": workbook_pool.stats(), "batch": batch_pool.stats()}
+    return {
+        (name, *((field,) if len(fields) > 1 else ())): stats[field]
+        for name, stats in pools.items()
+        for field in fields
+    }
+
+
+def _store_stats() -> dict[str, Any] | None:
+    from .memory_store import MemoryStore
+
+    if _chatkit_server is None or not isinstance(_chatkit_server.store, MemoryStore):
+        return None
+    return _chatkit_server.store.stats()
+
+
+def _store_gauge(field: str) -> Callable[[], float | None]:
+    def collect() -> float | None:
+        stats = _store_stats()
+        return None if stats is None else stats[field]
+
+    return collect
+
+
+def _response_cache_stats(read: Callable[[dict[str, Any]], Any]) -> Any:
+    if _chatkit_server is None or _chatkit_server.response_cache is None:
+        return None
+    return read(_chatkit_server.response_cache.stats())
+
+
+def _turn_counter(field: str) -> Callable[[], dict[tuple[str, ...], float] | None]:
+    def collect() -> dict[tuple[str, ...], float] | None:
+        if _chatkit_server is None:
+            return None
+        return {
+            (route,): stats[field] or 0
+            for route, stats in _chatkit_server.turn_stats().items()
+        }
+
+    return collect
+
+
+# Existing stats, read when /metrics is scraped.
+Gauge(
+    "worker_pool_in_flight",
+    "Jobs running or waiting per worker pool.",
+    ["pool"],
+    collect=lambda: _pool_stats("in_flight"),
+)
+Gauge(
+    "worker_pool_queue_depth",
+    "Jobs waiting for a worker per pool.",
+    ["pool"],
+    collect=lambda: _pool_stats("queue_depth"),
+)
+Counter(
+    "worker_pool_jobs",
+    "Jobs per worker pool by outcome.",
+    ["pool", "outcome"],
+    collect=lambda: _pool_stats("completed", "failed", "rejected"),
+)
+Gauge(
+    "rent_workbook_cache_bytes",
+    "Bytes of finished workbooks kept in memory.",
+    collect=lambda: workbook_cache.stats()["bytes"],
+)
+Gauge(
+    "rent_workbook_cache_entries",
+    "Finished workbooks kept in memory.",
+    collect=lambda: workbook_cache.stats()["size"],
+)
+Counter(
+    "rent_workbook_cache_lookups",
+    "Workbook cache lookups by result.",
+    ["result"],
+    collect=lambda: {
+        ("hit",): workbook_cache.stats()["hits"],
+        ("miss",): workbook_cache.stats()["misses"],
+    },
+)
+Gauge(
+    "rent_data_years_loaded",
+    "Years of rent data parsed and kept in memory.",
+    collect=lambda: rent_data_stats()["size"],
+)
+Counter(
+    "rent_workbook_batch_workbooks",
+    "Workbooks rendered for batches by outcome.",
+    ["outcome"],
+    collect=lambda: {
+        ("done",): batch_exporter.workbooks,
+        ("failed",): batch_exporter.failed,
+    },
+)
+Counter(
+    "rent_workbook_llm_payloads_discarded",
+    "Agent-written payloads replaced by local data.",
+    collect=lambda: llm_payloads_discarded,
+)
+Gauge(
+    "warmup_ready",
+    "1 once the background warm-up has finished.",
+    collect=lambda: float(warmup.ready),
+)
+Gauge(
+    "chatkit_store_threads",
+    "Threads in the in-memory conversation store.",
+    collect=_store_gauge("threads"),
+)
+Gauge(
+    "chatkit_store_items",
+    "Thread items in the in-memory conversation store.",
+    collect=_store_gauge("items"),
+)
+Gauge(
+    "chatkit_store_bytes",
+    "Estimated bytes held by the in-memory conversation store.",
+    collect=_store_gauge("bytes"),
+)
+Counter(
+    "chatkit_turns",
+    "Chat turns answered per route.",
+    ["route"],
+    collect=_turn_counter("turns"),
+)
+Counter(
+    "chatkit_tokens_streamed",
+    "Output tokens streamed per route.",
+    ["route"],
+    collect=_turn_counter("tokens_streamed"),
+)
+Counter(
+    "chatkit_runs_cancelled",
+    "Agent runs cancelled, superseded by a newer turn or disconnected.",
+    ["reason"],
+    collect=lambda: (
+        {(reason,): count for reason, count in _chatkit_server.runs.cancelled.items()}
+        if _chatkit_server is not None
+        else None
+    ),
+)
+Counter(
+    "chatkit_response_cache_lookups",
+    "Response cache lookups by result: hit, miss or bypass.",
+    ["result"],
+    collect=lambda: _response_cache_stats(
+        lambda stats: {
+            ("hit",): stats["hits"],
+            ("miss",): stats["misses"],
+            ("bypass",): stats["bypassed"],
+        }
+    ),
+)
+Counter(
+    "chatkit_response_cache_seconds_saved",
+    "Model time saved by replies replayed from the response cache.",
+    collect=lambda: _response_cache_stats(lambda stats: stats["seconds_saved"]),
+)
+Counter(
+    "chatkit_wasted_tokens",
+    "Output tokens generated for runs that were then cancelled.",
+    collect=lambda: (
+        _chatkit_server.runs.wasted_tokens if _chatkit_server is not None else None
+    ),
+)
+
+
+@app.get("/api/store/stats")
+async def store_stats() -> dict[str, Any]:
+    """Report the conversation store's footprint and per-turn context building."""
+    from .memory_store import MemoryStore
+
+    chatkit_server = await get_chatkit_server()
+    store = chatkit_server.store
+    return {
+        "store": (
+            store.stats()
+            if isinstance(store, MemoryStore)
+            else {"backend": type(store).__name__}
+        ),
+        "agent_input": chatkit_server.input_cache.stats(),
+        "context": chatkit_server.context_window.stats(),
+        "turns": chatkit_server.turn_stats(),
+        "runs": chatkit_server.runs.stats(),
+        "response_cache": (
+            chatkit_server.response_cache.stats()
+            if chatkit_server.response_cache is not None
+            else None
+        ),
+    }
+
+
 # ---- Serve built frontend (SPA) without intercepting POST /api/* ----
 STATIC_DIR = Path(__file__).parent / "static"
-ASSETS_DIR = STATIC_DIR / "assets"
-INDEX_FILE = STATIC_DIR / "index.html"
+INDEX_NAME = "index.html"
+_static_index: StaticIndex | None = None
 
-# Vite build references /assets/* by default
-if ASSETS_DIR.is_dir():
-    app.mount("/assets", StaticFiles(directory=str(ASSETS_DIR)), name="assets")
+
+def static_index() -> StaticIndex:
+    """The built frontend, read into memory by the warm-up or on first use."""
+    global _static_index
+    if _static_index is None:
+        _static_index = StaticIndex.load(STATIC_DIR)
+    return _static_index
+
+
+# Vite build references /assets/* by default; their names carry a content hash.
+@app.api_route("/assets/{path:path}", methods=["GET", "HEAD"])
+def spa_asset(path: str, request: Request) -> Response:
+    index = static_index()
+    file = index.get(f"assets/{path}")
+    if file is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return index.response(file, request.headers, request.method)
 
 
 @app.api_route("/", methods=["GET", "HEAD"])
-def spa_root() -> Response:
-    if INDEX_FILE.is_file():
-        return FileResponse(str(INDEX_FILE))
-    raise HTTPException(status_code=404, detail="Frontend not built")
+def spa_root(request: Request) -> Response:
+    return _spa_index(request)
 
 
 @app.api_route("/{full_path:path}", methods=["GET", "HEAD"])
-def spa_fallback(full_path: str) -> Response:
+def spa_fallback(full_path: str, request: Request) -> Response:
     # Never hijack API/docs routes
-    if full_path.startswith("api/") or full_path.startswith("chatkit") or full_path.startswith("docs") or full_path.startswith("openapi") or full_path.startswith("redoc"):
+    if (
+        full_path.startswith("api/")
+        or full_path.startswith("chatkit")
+        or full_path.startswith("docs")
+        or full_path.startswith("openapi")
+        or full_path.startswith("redoc")
+    ):
         raise HTTPException(status_code=404, detail="Not found")
 
-    if INDEX_FILE.is_file():
-        return FileResponse(str(INDEX_FILE))
-    raise HTTPException(status_code=404, detail="Frontend not built")
+    # Files at the top of the build, such as favicon.ico.
+    index = static_index()
+    file = index.get(full_path)
+    if file is not None:
+        return index.response(file, request.headers, request.method)
+    return _spa_index(request)
+
+
+def _spa_index(request: Request) -> Response:
+    index = static_index()
+    file = index.get(INDEX_NAME)
+    if file is None:
+        raise HTTPException(status_code=404, detail="Frontend not built")
+    return index.response(file, request.headers, request.method)
@@ -5,103 +5,330 @@ A production app would implement this using a persistant database.
 
 from __future__ import annotations
 
-from collections import defaultdict
+import asyncio
+import logging
+import sys
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from collections.abc import Iterator
+from datetime import datetime
+from itertools import count
+from typing import Generic, TypeVar
 
 from chatkit.store import NotFoundError, Store
 from chatkit.types import Attachment, Page, ThreadItem, ThreadMetadata
 
+from .store_events import ItemChangeNotifier
 
-class MemoryStore(Store[dict]):
-    def __init__(self):
-        self.threads: dict[str, ThreadMetadata] = {}
-        self.items: dict[str, list[ThreadItem]] = defaultdict(list)
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T", ThreadItem, ThreadMetadata)
+
+# created_at plus an insertion sequence number, so keys are unique and rows that
+# share a timestamp keep the order in which they were first stored.
+_SortKey = tuple[datetime, int]
+
+
+class _OrderedIndex(Generic[T]):
+    """Rows kept sorted by created_at with O(1) id lookup.
+
+    Pagination matches sorting the rows by ``created_at`` with a stable sort
+    (``reverse=True`` for ``desc``) and scanning for the ``after`` cursor, but a
+    page costs O(log n + limit) instead of O(n log n).
+    """
+
+    def __init__(self) -> None:
+        self._keys: list[_SortKey] = []
+        self._rows: list[T] = []
+        self._by_id: dict[str, tuple[_SortKey, T]] = {}
+        self._seq = count()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __iter__(self) -> Iterator[T]:
+        return iter(self._rows)
+
+    def get(self, row_id: str) -> T | None:
+        entry = self._by_id.get(row_id)
+        return entry[1] if entry else None
+
+    def upsert(self, row: T) -> None:
+        existing = self._by_id.get(row.id)
+        if existing is None:
+            key = (row.created_at, next(self._seq))
+        else:
+            old_key = existing[0]
+            position = bisect_left(self._keys, old_key)
+            if old_key[0] == row.created_at:
+                self._rows[position] = row
+                self._by_id[row.id] = (old_key, row)
+                return
+            del self._keys[position]
+            del self._rows[position]
+            key = (row.created_at, old_key[1])
+        position = bisect_right(self._keys, key)
+        self._keys.insert(position, key)
+        self._rows.insert(position, row)
+        self._by_id[row.id] = (key, row)
+
+    def remove(self, row_id: str) -> None:
+        entry = self._by_id.pop(row_id, None)
+        if entry is None:
+            return
+        position = bisect_left(self._keys, entry[0])
+        del self._keys[position]
+        del self._rows[position]
+
+    def page(self, after: str | None, limit: int, order: str) -> Page[T]:
+        total = len(self._rows)
+        entry = self._by_id.get(after) if after else None
+        cursor = entry[0] if entry else None
+
+        if order == "desc":
+            # Stable descending sort: newest timestamp first, ties in insertion order.
+            if cursor is None:
+                start = 0
+                data = self._take_desc([], total, limit)
+            else:
+                position = bisect_left(self._keys, cursor)
+                group_start, group_end = self._group_bounds(cursor[0])
+                start = (total - group_end) + (position - group_start) + 1
+                tail = self._rows[position + 1 : group_end][:limit]
+                data = self._take_desc(tail, group_start, limit)
+        else:
+            start = bisect_left(self._keys, cursor) + 1 if cursor else 0
+            data = self._rows[start : start + limit]
+
+        has_more = start + limit < total
+        next_after = data[-1].id if has_more and data else None
+        return Page(data=data, has_more=has_more, after=next_after)
+
+    def _group_bounds(self, created_at: datetime) -> tuple[int, int]:
+        return (
+            bisect_left(self._keys, (created_at, -1)),
+            bisect_right(self._keys, (created_at, sys.maxsize)),
+        )
+
+    def _take_desc(self, data: list[T], end: int, limit: int) -> list[T]:
+        # Extend ``data`` with the groups ending before ``end``, newest timestamp
+        # first, each group in ascending position.
+        while end > 0 and len(data) < limit:
+            group_start = self._group_bounds(self._keys[end - 1][0])[0]
+            data.extend(self._rows[group_start:end][: limit - len(data)])
+            end = group_start
+        return data
+
+
+class MemoryStore(ItemChangeNotifier, Store[dict]):
+    """In-memory store with optional limits on how much it may hold.
+
+    ``max_threads`` and ``max_bytes`` bound the threads whose items are resident;
+    when either is exceeded the least recently used thread is evicted. With a
+    ``spill`` store, an evicted thread's items are moved there and transparently
+    restored on next access (thread metadata stays resident so listings remain
+    complete); without one the thread is dropped. ``max_items_per_thread``
+    trims the oldest items of a thread that grows past it. Byte counts are
+    approximated by the JSON size of each item.
+    """
+
+    def __init__(
+        self,
+        max_threads: int | None = None,
+        max_items_per_thread: int | None = None,
+        max_bytes: int | None = None,
+        spill: Store[dict] | None = None,
+    ):
+        super().__init__()
+        self.threads: _OrderedIndex[ThreadMetadata] = _OrderedIndex()
+        self.items: dict[str, _OrderedIndex[ThreadItem]] = {}
+        self.max_threads = max_threads
+        self.max_items_per_thread = max_items_per_thread
+        self.max_bytes = max_bytes
+        self.spill = spill
+
+        self.bytes = 0
+        self.evicted_threads = 0
+        self.restored_threads = 0
+        self.trimmed_items = 0
+        self._item_bytes: dict[str, dict[str, int]] = {}
+        # Threads with resident items, least recently used first.
+        self._recent: OrderedDict[str, None] = OrderedDict()
+        self._spilled: set[str] = set()
+        # Held while items move to or from the spill store.
+        self._spill_lock = asyncio.Lock()
 
     async def load_thread(self, thread_id: str, context: dict) -> ThreadMetadata:
-        if thread_id not in self.threads:
+        thread = self.threads.get(thread_id)
+        if thread is None:
             raise NotFoundError(f"Thread {thread_id} not found")
-        return self.threads[thread_id]
+        return thread
 
     async def save_thread(self, thread: ThreadMetadata, context: dict) -> None:
-        self.threads[thread.id] = thread
+        self.threads.upsert(thread)
 
     async def load_threads(
         self, limit: int, after: str | None, order: str, context: dict
     ) -> Page[ThreadMetadata]:
-        threads = list(self.threads.values())
-        return self._paginate(
-            threads,
-            after,
-            limit,
-            order,
-            sort_key=lambda t: t.created_at,
-            cursor_key=lambda t: t.id,
-        )
+        return self.threads.page(after, limit, order)
 
     async def load_thread_items(
         self, thread_id: str, after: str | None, limit: int, order: str, context: dict
     ) -> Page[ThreadItem]:
-        items = self.items.get(thread_id, [])
-        return self._paginate(
-            items,
-            after,
-            limit,
-            order,
-            sort_key=lambda i: i.created_at,
-            cursor_key=lambda i: i.id,
-        )
+        items = await self._resident_items(thread_id, context)
+        if items is None:
+            return Page(data=[], has_more=False, after=None)
+        return items.page(after, limit, order)
 
     async def add_thread_item(
         self, thread_id: str, item: ThreadItem, context: dict
     ) -> None:
-        self.items[thread_id].append(item)
+        await self.save_item(thread_id, item, context)
 
     async def save_item(self, thread_id: str, item: ThreadItem, context: dict) -> None:
-        items = self.items[thread_id]
-        for idx, existing in enumerate(items):
-            if existing.id == item.id:
-                items[idx] = item
-                return
-        items.append(item)
+        items = await self._resident_items(thread_id, context)
+        if items is None:
+            items = self.items[thread_id] = _OrderedIndex()
+            self._item_bytes[thread_id] = {}
+            self._recent[thread_id] = None
+        items.upsert(item)
+        self._account(thread_id, item.id, len(item.model_dump_json()))
+
+        if self.max_items_per_thread and len(items) > self.max_items_per_thread:
+            for oldest in list(items)[: len(items) - self.max_items_per_thread]:
+                items.remove(oldest.id)
+                self._account(thread_id, oldest.id, None)
+                self.trimmed_items += 1
+        self._notify_item_change(thread_id, item.id)
+        await self._enforce_limits(keep=thread_id, context=context)
 
     async def load_item(
         self, thread_id: str, item_id: str, context: dict
     ) -> ThreadItem:
-        for item in self.items.get(thread_id, []):
-            if item.id == item_id:
-                return item
-        raise NotFoundError(f"Item {item_id} not found in thread {thread_id}")
+        items = await self._resident_items(thread_id, context)
+        item = items.get(item_id) if items is not None else None
+        if item is None:
+            raise NotFoundError(f"Item {item_id} not found in thread {thread_id}")
+        return item
 
     async def delete_thread(self, thread_id: str, context: dict) -> None:
-        self.threads.pop(thread_id, None)
-        self.items.pop(thread_id, None)
+        self.threads.remove(thread_id)
+        self._drop_items(thread_id)
+        self._notify_item_change(thread_id, None)
+        if thread_id in self._spilled and self.spill is not None:
+            async with self._spill_lock:
+                self._spilled.discard(thread_id)
+                await self.spill.delete_thread(thread_id, context)
 
     async def delete_thread_item(
         self, thread_id: str, item_id: str, context: dict
     ) -> None:
-        self.items[thread_id] = [
-            item for item in self.items.get(thread_id, []) if item.id != item_id
-        ]
+        items = await self._resident_items(thread_id, context)
+        if items is not None:
+            items.remove(item_id)
+            self._account(thread_id, item_id, None)
+        self._notify_item_change(thread_id, item_id)
 
-    def _paginate(
-        self,
-        rows: list,
-        after: str | None,
-        limit: int,
-        order: str,
-        sort_key,
-        cursor_key,
-    ):
-        sorted_rows = sorted(rows, key=sort_key, reverse=order == "desc")
-        start = 0
-        if after:
-            for idx, row in enumerate(sorted_rows):
-                if cursor_key(row) == after:
-                    start = idx + 1
+    def stats(self) -> dict[str, int | None]:
+        return {
+            "threads": len(self.threads),
+            "resident_threads": len(self._recent),
+            "spilled_threads": len(self._spilled),
+            "items": sum(len(items) for items in self.items.values()),
+            "bytes": self.bytes,
+            "max_threads": self.max_threads,
+            "max_items_per_thread": self.max_items_per_thread,
+            "max_bytes": self.max_bytes,
+            "evicted_threads": self.evicted_threads,
+            "restored_threads": self.restored_threads,
+            "trimmed_items": self.trimmed_items,
+        }
+
+    async def _resident_items(
+        self, thread_id: str, context: dict
+    ) -> _OrderedIndex[ThreadItem] | None:
+        """Return the thread's items, restoring them from the spill store if needed.
+
+        Unknown threads return None without creating an entry.
+        """
+        if thread_id in self._spilled:
+            await self._restore(thread_id, context)
+        items = self.items.get(thread_id)
+        if items is not None:
+            self._recent.move_to_end(thread_id)
+        return items
+
+    def _account(self, thread_id: str, item_id: str, size: int | None) -> None:
+        sizes = self._item_bytes[thread_id]
+        self.bytes -= sizes.pop(item_id, 0)
+        if size is not None:
+            sizes[item_id] = size
+            self.bytes += size
+
+    def _drop_items(self, thread_id: str) -> _OrderedIndex[ThreadItem] | None:
+        self._recent.pop(thread_id, None)
+        self.bytes -= sum(self._item_bytes.pop(thread_id, {}).values())
+        return self.items.pop(thread_id, None)
+
+    async def _enforce_limits(self, keep: str, context: dict) -> None:
+        while (self.max_threads and len(self._recent) > self.max_threads) or (
+            self.max_bytes and self.bytes > self.max_bytes
+        ):
+            victim = next((tid for tid in self._recent if tid != keep), None)
+            if victim is None:
+                return
+            await self._evict(victim, context)
+
+    async def _evict(self, thread_id: str, context: dict) -> None:
+        if self.spill is None:
+            items = self._drop_items(thread_id)
+            self.threads.remove(thread_id)
+            logger.warning(
+                "Deleted thread %s (%d items) to stay within the memory store "
+                "limits; set a spill store to keep evicted threads",
+                thread_id,
+                len(items) if items is not None else 0,
+            )
+        else:
+            async with self._spill_lock:
+                if thread_id not in self.items:
+                    # Deleted while this eviction waited for the lock.
+                    return
+                # Marked spilled in the same step as the items leave memory, so
+                # a reader in between waits in _restore for the copy below.
+                self._spilled.add(thread_id)
+                items = self._drop_items(thread_id)
+                for item in items or ():
+                    await self.spill.add_thread_item(thread_id, item, context)
+        self.evicted_threads += 1
+        self._notify_item_change(thread_id, None)
+
+    async def _restore(self, thread_id: str, context: dict) -> None:
+        assert self.spill is not None
+        async with self._spill_lock:
+            if thread_id not in self._spilled:
+                return
+            items: _OrderedIndex[ThreadItem] = _OrderedIndex()
+            sizes: dict[str, int] = {}
+            after: str | None = None
+            while True:
+                page = await self.spill.load_thread_items(
+                    thread_id, after, 500, "asc", context
+                )
+                for item in page.data:
+                    items.upsert(item)
+                    sizes[item.id] = len(item.model_dump_json())
+                if not page.has_more:
                     break
-        data = sorted_rows[start : start + limit]
-        has_more = start + limit < len(sorted_rows)
-        next_after = cursor_key(data[-1]) if has_more and data else None
-        return Page(data=data, has_more=has_more, after=next_after)
+                after = page.after
+            await self.spill.delete_thread(thread_id, context)
+            self._spilled.discard(thread_id)
+            self.items[thread_id] = items
+            self._item_bytes[thread_id] = sizes
+            self.bytes += sum(sizes.values())
+            self._recent[thread_id] = None
+            self.restored_threads += 1
+        await self._enforce_limits(keep=thread_id, context=context)
 
     # Attachments are not implemented in the quickstart store
 
@@ -0,0 +1,336 @@
+"""Prometheus-style metrics: counters, gauges and histograms in process.
+
+Metrics register themselves in ``REGISTRY`` and ``render()`` writes them in the
+Prometheus text format for GET /metrics. Gauges can also read their value from
+a callback when scraped, which is how existing stats (pools, caches, the
+conversation store) are exported without counting twice.
+
+Stage timings taken inside pool workers (see ``stage``) are captured by
+``capture_stages`` and replayed in the parent with ``replay_stages``, so they
+are recorded the same way with thread and process pools.
+"""
+
+from __future__ import annotations
+
+import bisect
+import math
+import threading
+import time
+from collections.abc import Callable, Iterator, Mapping, Sequence
+from contextlib import contextmanager
+from typing import Any
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds, from a fast cache hit to a slow agent turn.
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+LabelValues = tuple[str, ...]
+# The value, or a mapping of label values to values; None reports nothing
+# (say, before the component it reads exists).
+Collect = Callable[[], float | Mapping[LabelValues, float] | None]
+
+
+class Metric:
+    kind = "untyped"
+    suffix = ""
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        collect: Collect | None = None,
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: dict[LabelValues, float] = {}
+        self._collect = collect
+        REGISTRY.register(self)
+
+    def _key(self, labels: Mapping[str, str]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> Iterator[tuple[str, LabelValues, float]]:
+        """(name suffix, label values, value) for each sample."""
+        if self._collect is not None:
+            collected = self._collect()
+            if isinstance(collected, Mapping):
+                for key, value in collected.items():
+                    yield self.suffix, key, value
+            elif collected is not None:
+                yield self.suffix, (), collected
+            return
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield self.suffix, key, value
+
+    def render(self) -> list[str]:
+        lines = _header(self)
+        for suffix, values, value in self.samples():
+            lines.append(
+                f"{self.name}{suffix}{_labels(self.labelnames, values)} {_number(value)}"
+            )
+        return lines
+
+
+class Counter(Metric):
+    """A count that only goes up, or is read from ``collect`` on every scrape."""
+
+    kind = "counter"
+    suffix = "_total"
+
+
+class Gauge(Metric):
+    """A value set directly, or read from ``collect`` on every scrape."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [count per bucket (not cumulative) + overflow, sum]
+        self._series: dict[LabelValues, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> Iterator[tuple[str, LabelValues, float]]:
+        with self._lock:
+            series = [
+                (key, list(counts), total[0])
+                for key, (counts, total) in self._series.items()
+            ]
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                yield "_bucket", (*key, _number(bound)), cumulative
+            yield "_sum", key, total
+            yield "_count", key, cumulative
+
+    def render(self) -> list[str]:
+        lines = _header(self)
+        bucket_names = (*self.labelnames, "le")
+        for suffix, values, value in self.samples():
+            names = bucket_names if suffix == "_bucket" else self.labelnames
+            lines.append(
+                f"{self.name}{suffix}{_labels(names, values)} {_number(value)}"
+            )
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+
+    def get(self, name: str) -> Metric | None:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Time to handle a request, to the end of the response body.",
+    ["method", "route", "status"],
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "Requests being handled, including open streams."
+)
+WORKBOOK_STAGE_SECONDS = Histogram(
+    "rent_workbook_stage_seconds",
+    "Time per workbook stage: tsv_build, validation, template_load, fill, save.",
+    ["stage"],
+)
+CHATKIT_STAGE_SECONDS = Histogram(
+    "chatkit_stage_seconds",
+    "Time per chat turn stage: store_load, input_conversion, first_token "
+    "(from the start of the turn), stream (the whole turn), "
+    "workbook_fast_path (a workbook reply without the LLM) and response_cache "
+    "(a reply replayed from the response cache).",
+    ["stage"],
+)
+
+CHATKIT_STREAMS_IN_FLIGHT = Gauge(
+    "chatkit_streams_in_flight", "Chat turns being streamed."
+)
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request by method, route and status.
+
+    The route is the matched path template (``/api/rent-data/{year}``), so
+    ids in URLs do not create new series.
+    """
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Any, receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_with_status(message: Any) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=route,
+                status=str(status),
+            )
+
+
+# Stage timings recorded by the current pool job, when one is capturing them.
+_capture = threading.local()
+
+
+@contextmanager
+def stage(histogram: Histogram, name: str) -> Iterator[None]:
+    """Time a stage into ``histogram`` under ``stage=name``."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        records: list[tuple[str, str, float]] | None = getattr(
+            _capture, "records", None
+        )
+        if records is not None:
+            records.append((histogram.name, name, seconds))
+        else:
+            histogram.observe(seconds, stage=name)
+
+
+@contextmanager
+def capture_stages() -> Iterator[list[tuple[str, str, float]]]:
+    """Collect the stages timed in this thread instead of recording them."""
+    records: list[tuple[str, str, float]] = []
+    outer = getattr(_capture, "records", None)
+    _capture.records = records
+    try:
+        yield records
+    finally:
+        _capture.records = outer
+
+
+def replay_stages(records: Sequence[tuple[str, str, float]]) -> None:
+    """Record stages captured by ``capture_stages``, possibly in another process."""
+    for name, stage_name, seconds in records:
+        metric = REGISTRY.get(name)
+        if isinstance(metric, Histogram):
+            metric.observe(seconds, stage=stage_name)
+
+
+def _header(metric: Metric) -> list[str]:
+    # Counters are declared under their sample name, as in text format 0.0.4.
+    name = metric.name + metric.suffix
+    return [f"# HELP {name} {metric.help}", f"# TYPE {name} {metric.kind}"]
+
+
+def _labels(names: Sequence[str], values: Sequence[Any]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)
+    )
+    return f"{{{pairs}}}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
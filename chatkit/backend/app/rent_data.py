@@ -0,0 +1,168 @@
+"""Local rent data: one ``RENT_Payments_{year}.txt`` TSV per year in DATA_DIR.
+
+Each year's file is parsed once into a columnar ``RentTable`` (see
+app/rent_table.py), reconciled, and parsed again only when the file changes.
+Payloads for the whole year or any subset of its properties are built from the
+table for just the properties asked for.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+from collections.abc import Iterable, Mapping
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from .cache import LRUCache
+from .metrics import WORKBOOK_STAGE_SECONDS, stage
+from .rent_payload import (
+    PAYLOAD_YEAR,
+    TEMPLATE_VERSION,
+    InvalidPayloadError,
+    check_property_ids,
+)
+
+if TYPE_CHECKING:
+    # Imported when a year is first loaded, so NumPy stays out of startup.
+    from .rent_table import Reconciliation, RentTable
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(
+    os.environ.get("RENT_DATA_DIR") or Path(__file__).resolve().parents[1] / "data"
+)
+RENT_PAYMENTS_FILE_TEMPLATE = "RENT_Payments_{year}.txt"
+_RENT_PAYMENTS_FILE_RE = re.compile(r"RENT_Payments_(\d{4})\.txt")
+# Parsed years kept in memory.
+YEAR_CACHE_SIZE = int(os.environ.get("RENT_PAYLOAD_CACHE_SIZE", "8"))
+
+
+class RentDataNotFoundError(LookupError):
+    """Raised for a year without a data file or a property absent from it."""
+
+
+@dataclass(frozen=True)
+class RentYear:
+    """One year's rent data and its reconciliation."""
+
+    year: int
+    path: Path
+    # (mtime_ns, size) of the file the table was built from.
+    fingerprint: tuple[int, int]
+    table: RentTable
+    reconciliation: Reconciliation
+    # property_id -> row of the table, in file order.
+    index: Mapping[str, int] = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        index = {
+            property_id: row for row, property_id in enumerate(self.table.property_ids)
+        }
+        object.__setattr__(self, "index", index)
+
+    @property
+    def property_ids(self) -> tuple[str, ...]:
+        return self.table.property_ids
+
+    def payload(self, property_ids: Iterable[str] | None = None) -> dict[str, Any]:
+        """Return the payload for ``property_ids`` (all properties when None)."""
+        if property_ids is None:
+            rows: list[int] = list(range(len(self.table)))
+        else:
+            rows = []
+            for property_id in dict.fromkeys(property_ids):
+                row = self.index.get(property_id)
+                if row is None:
+                    raise RentDataNotFoundError(
+                        f"No {self.year} rent data for property {property_id}"
+                    )
+                rows.append(row)
+        return {
+            "template_version": TEMPLATE_VERSION,
+            "year": self.year,
+            "properties": self.table.to_properties(rows),
+        }
+
+    def summary(self) -> dict[str, Any]:
+        """Totals and reconciliation counts for the whole year."""
+        from .rent_table import MISSING_DATA_REMARKS
+
+        table = self.table
+        return {
+            "properties": len(table),
+            "months": table.present.size,
+            "total_received": float(table.column("total_received").sum()),
+            "months_marked_missing": int((table.remarks == MISSING_DATA_REMARKS).sum()),
+            "reconciliation": self.reconciliation.counts(),
+        }
+
+
+_years: LRUCache[int, RentYear] = LRUCache(maxsize=YEAR_CACHE_SIZE)
+
+
+def available_years() -> list[int]:
+    """Years that have a data file, oldest first."""
+    years = []
+    for path in DATA_DIR.glob("RENT_Payments_*.txt"):
+        match = _RENT_PAYMENTS_FILE_RE.fullmatch(path.name)
+        if match is not None and path.is_file():
+            years.append(int(match.group(1)))
+    return sorted(years)
+
+
+def load_year(year: int) -> RentYear:
+    """Return the index for ``year``, parsing the TSV only when it has changed."""
+    path = DATA_DIR / RENT_PAYMENTS_FILE_TEMPLATE.format(year=year)
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        raise RentDataNotFoundError(f"No rent data file for {year}") from None
+    fingerprint = (stat.st_mtime_ns, stat.st_size)
+
+    cached = _years.get(year, valid=lambda index: index.fingerprint == fingerprint)
+    if cached is not None:
+        return cached
+    from .rent_table import read_rent_tsv, reconcile
+
+    table = read_rent_tsv(path)
+    # Every other field is well-typed by construction.
+    errors = check_property_ids(table.property_ids)
+    if errors:
+        exc = InvalidPayloadError(errors)
+        logger.error("Payload validation failed (local TSV %s): %s", path.name, exc)
+        raise exc
+    rent_year = RentYear(
+        year=year,
+        path=path,
+        fingerprint=fingerprint,
+        table=table,
+        reconciliation=reconcile(table),
+    )
+    unreconciled = rent_year.reconciliation.counts()["unreconciled"]
+    logger.info(
+        "Indexed %d properties from %s; %d months do not reconcile",
+        len(table),
+        path.name,
+        unreconciled,
+    )
+    _years.put(year, rent_year)
+    return rent_year
+
+
+def build_payload_from_local_tsv(
+    year: int = PAYLOAD_YEAR, property_ids: Iterable[str] | None = None
+) -> dict[str, Any]:
+    """Return the payload for ``year`` and ``property_ids`` from local data."""
+    with stage(WORKBOOK_STAGE_SECONDS, "tsv_build"):
+        return load_year(year).payload(property_ids)
+
+
+def clear_rent_data_cache() -> None:
+    _years.clear()
+
+
+def rent_data_stats() -> dict[str, int | None]:
+    return _years.stats()
@@ -0,0 +1,276 @@
+"""Schema check for rent workbook payloads.
+
+The property and row schemas below are compiled once at import into plain
+predicate functions, and ``check_rent_payload`` walks a payload a single time
+to collect every schema error (with its path) and to decide whether the payload
+has to be rebuilt from the local rent data, which used to take two walks.
+"""
+
+from __future__ import annotations
+
+import re
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from typing import Any
+
+TEMPLATE_VERSION = "property_rents_received_v1"
+# Year the chat assistant builds workbooks for when none is named.
+PAYLOAD_YEAR = 2025
+MIN_YEAR, MAX_YEAR = 1900, 2100
+MONTHS = frozenset(range(1, 13))
+# Each property becomes a worksheet named after its id, so ids follow Excel's
+# sheet name rules: 1-31 characters, none of []:*?/\ and no leading or
+# trailing apostrophe.
+_SHEET_NAME_RE = re.compile(r"(?!')[^\[\]:*?/\\]{1,31}(?<!')")
+
+# field -> kind; see _KIND_TESTS and _KIND_MESSAGES.
+PROPERTY_SCHEMA = {
+    "property_address": "optional_str",
+    "tenant_name": "optional_str",
+}
+ROW_SCHEMA = {
+    "month": "str",
+    "housing_dept": "optional_str",
+    "rent_due": "number",
+    "housing_paid": "number",
+    "tenant_paid": "number",
+    "total_received": "number",
+    "month_balance_due": "number",
+    "year_balance_due": "number",
+    "remarks": "str",
+}
+
+# Python expressions over ``v``, the field's value.
+_KIND_TESTS = {
+    "str": "isinstance(v, str)",
+    "optional_str": "v is None or isinstance(v, str)",
+    "number": "isinstance(v, (int, float))",
+}
+_KIND_MESSAGES = {
+    "str": "must be a string",
+    "optional_str": "must be a string or null",
+    "number": "must be a number",
+}
+
+
+@dataclass(frozen=True)
+class _CompiledSchema:
+    # True when every field of a record is valid; one call for a good record.
+    all_ok: Callable[[dict[str, Any]], bool]
+    # Run only for records that failed: (field, test, message).
+    fields: tuple[tuple[str, Callable[[Any], bool], str], ...]
+
+
+def _compile(
+    schema: dict[str, str], *, month_field: str | None = None
+) -> _CompiledSchema:
+    """Generate a straight-line predicate for ``schema`` plus per-field tests.
+
+    With ``month_field``, the predicate also requires that field to be a month
+    number, so a valid row costs a single call.
+    """
+    lines = [
+        "def all_ok(record, isinstance=isinstance, str=str, int=int, float=float,"
+        " months=MONTHS):",
+        "    get = record.get",
+    ]
+    if month_field is not None:
+        lines.append(f"    v = get({month_field!r})")
+        lines.append("    if not (isinstance(v, int) and v in months):")
+        lines.append("        return False")
+    fields = []
+    for field, kind in schema.items():
+        test = _KIND_TESTS[kind]
+        lines.append(f"    v = get({field!r})")
+        lines.append(f"    if not ({test}):")
+        lines.append("        return False")
+        fields.append((field, eval(f"lambda v: {test}"), _KIND_MESSAGES[kind]))
+    lines.append("    return True")
+    namespace: dict[str, Any] = {"MONTHS": MONTHS}
+    exec(compile("\n".join(lines), "<rent payload schema>", "exec"), namespace)
+    return _CompiledSchema(all_ok=namespace["all_ok"], fields=tuple(fields))
+
+
+_PROPERTY = _compile(PROPERTY_SCHEMA)
+_ROW = _compile(ROW_SCHEMA, month_field="month_number")
+
+
+@dataclass(frozen=True)
+class PayloadError:
+    path: str
+    message: str
+
+    def __str__(self) -> str:
+        return f"{self.path}: {self.message}" if self.path else self.message
+
+
+@dataclass(frozen=True)
+class PayloadCheck:
+    errors: tuple[PayloadError, ...]
+    # True when there are no properties, rows are missing, or a row is marked
+    # "Missing data", so the workbook should be built from local data instead.
+    needs_local_data: bool
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+
+class InvalidPayloadError(ValueError):
+    """Raised with every schema error found in a payload."""
+
+    def __init__(self, errors: tuple[PayloadError, ...]) -> None:
+        super().__init__("; ".join(str(error) for error in errors))
+        self.errors = errors
+
+
+def _field_errors(
+    record: dict[str, Any], schema: _CompiledSchema, path: str
+) -> list[PayloadError]:
+    return [
+        PayloadError(f"{path}.{field}", message)
+        for field, test, message in schema.fields
+        if not test(record.get(field))
+    ]
+
+
+def _marked_missing(remarks: Any) -> bool:
+    # "missing data" is 12 characters; the length test skips most remarks cheaply.
+    return (
+        isinstance(remarks, str)
+        and len(remarks) >= 12
+        and remarks.strip().lower() == "missing data"
+    )
+
+
+def _row_errors(rows: list[Any], path: str) -> tuple[list[PayloadError], bool]:
+    """Every error in a property's rows, and whether one is marked missing."""
+    errors: list[PayloadError] = []
+    needs_local = False
+    seen_months: set[int] = set()
+    month_errors = False
+    for index, row in enumerate(rows):
+        row_path = f"{path}.rows[{index}]"
+        if not isinstance(row, dict):
+            errors.append(PayloadError(row_path, "must be an object"))
+            continue
+        month_number = row.get("month_number")
+        if not isinstance(month_number, int) or month_number not in MONTHS:
+            errors.append(
+                PayloadError(
+                    f"{row_path}.month_number", "must be an integer between 1 and 12"
+                )
+            )
+            month_errors = True
+        elif month_number in seen_months:
+            errors.append(
+                PayloadError(f"{row_path}.month_number", f"duplicate {month_number}")
+            )
+            month_errors = True
+        else:
+            seen_months.add(month_number)
+        errors.extend(_field_errors(row, _ROW, row_path))
+        needs_local = needs_local or _marked_missing(row.get("remarks"))
+
+    if not month_errors and len(rows) == 12 and seen_months != MONTHS:
+        errors.append(PayloadError(f"{path}.rows", "must cover months 1 through 12"))
+    return errors, needs_local
+
+
+def _property_id_error(property_id: Any, seen: set[str]) -> str | None:
+    """Why ``property_id`` cannot name its sheet, recording it in ``seen``."""
+    if not isinstance(property_id, str) or not _SHEET_NAME_RE.fullmatch(property_id):
+        return "must be a valid sheet name"
+    # Excel compares sheet names case-insensitively.
+    key = property_id.casefold()
+    if key in seen:
+        return f"duplicate {property_id}"
+    seen.add(key)
+    return None
+
+
+def check_property_ids(property_ids: Iterable[Any]) -> tuple[PayloadError, ...]:
+    """Errors for property ids that cannot each name a sheet of one workbook."""
+    seen: set[str] = set()
+    errors = []
+    for index, property_id in enumerate(property_ids):
+        message = _property_id_error(property_id, seen)
+        if message is not None:
+            errors.append(PayloadError(f"properties[{index}].property_id", message))
+    if not seen and not errors:
+        errors.append(PayloadError("properties", "must include at least one property"))
+    return tuple(errors)
+
+
+def check_rent_payload(payload: Any) -> PayloadCheck:
+    errors: list[PayloadError] = []
+    add = errors.append
+    if not isinstance(payload, dict):
+        return PayloadCheck((PayloadError("", "payload must be an object"),), True)
+
+    if payload.get("template_version") != TEMPLATE_VERSION:
+        add(PayloadError("template_version", f"must be {TEMPLATE_VERSION}"))
+    year = payload.get("year")
+    if type(year) is not int or not MIN_YEAR <= year <= MAX_YEAR:
+        add(PayloadError("year", f"must be a year between {MIN_YEAR} and {MAX_YEAR}"))
+
+    properties = payload.get("properties")
+    if not isinstance(properties, list):
+        add(PayloadError("properties", "must be an array"))
+        return PayloadCheck(tuple(errors), True)
+
+    needs_local = not properties
+    if needs_local:
+        add(PayloadError("properties", "must include at least one property"))
+
+    row_ok = _ROW.all_ok
+    seen_ids: set[str] = set()
+    for index, prop in enumerate(properties):
+        path = f"properties[{index}]"
+        if not isinstance(prop, dict):
+            add(PayloadError(path, "must be an object"))
+            needs_local = True
+            continue
+
+        id_error = _property_id_error(prop.get("property_id"), seen_ids)
+        if id_error is not None:
+            add(PayloadError(f"{path}.property_id", id_error))
+        if prop.get("period_months") != 12:
+            add(PayloadError(f"{path}.period_months", "must be 12"))
+        if not _PROPERTY.all_ok(prop):
+            errors.extend(_field_errors(prop, _PROPERTY, path))
+
+        rows = prop.get("rows")
+        if not isinstance(rows, list):
+            add(PayloadError(f"{path}.rows", "must be a list"))
+            needs_local = True
+            continue
+        if len(rows) != 12:
+            add(PayloadError(f"{path}.rows", "must have exactly 12 rows"))
+            needs_local = needs_local or len(rows) < 12
+
+        # Fast path: every row valid with distinct months needs no further work.
+        seen_months: set[int] = set()
+        add_month = seen_months.add
+        for row in rows:
+            if type(row) is not dict or not row_ok(row):
+                break
+            add_month(row["month_number"])
+            remarks = row["remarks"]
+            if len(remarks) >= 12 and remarks.strip().lower() == "missing data":
+                needs_local = True
+        else:
+            if len(seen_months) == len(rows):
+                continue
+        row_errors, missing = _row_errors(rows, path)
+        errors.extend(row_errors)
+        needs_local = needs_local or missing
+
+    return PayloadCheck(tuple(errors), needs_local)
+
+
+def validate_rent_payload(payload: Any) -> None:
+    """Raise ``InvalidPayloadError`` listing every schema error in ``payload``."""
+    result = check_rent_payload(payload)
+    if result.errors:
+        raise InvalidPayloadError(result.errors)
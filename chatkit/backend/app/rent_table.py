@@ -0,0 +1,348 @@
+"""Columnar rent rows: one NumPy array per field, indexed by (property, month).
+
+A year's TSV is parsed column by column into a ``RentTable`` and reconciled in
+a single vectorized pass over every property. Payload dicts are only built
+from the table at the edge, for the properties a request asks for.
+
+Reconciliation checks each month against the rules the rent data follows:
+
+- ``total_received == housing_paid + tenant_paid``
+- ``month_balance_due == total_received - rent_due``
+- ``year_balance_due`` is the running total of ``month_balance_due``
+"""
+
+from __future__ import annotations
+
+import enum
+import logging
+from calendar import month_abbr
+from collections.abc import Sequence
+from csv import reader as csv_reader
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MONTH_NAMES = {index: month_abbr[index] for index in range(1, 13)}
+MISSING_DATA_REMARKS = "Missing data"
+# Payload field -> TSV column, in the order of RentTable.amounts' last axis.
+AMOUNT_COLUMNS = {
+    "rent_due": "scheduled_rent_amount",
+    "housing_paid": "housing_amount_paid",
+    "tenant_paid": "tenant_amount_paid",
+    "total_received": "total_amount_received",
+    "month_balance_due": "month_balance_due",
+    "year_balance_due": "year_balance_due",
+}
+AMOUNT_FIELDS = tuple(AMOUNT_COLUMNS)
+RENT_DUE, HOUSING_PAID, TENANT_PAID, TOTAL_RECEIVED, MONTH_BALANCE, YEAR_BALANCE = (
+    range(len(AMOUNT_FIELDS))
+)
+# Amounts within half a cent are equal.
+TOLERANCE = 0.005
+
+_DEFAULT_MONTH_NAMES = np.array([MONTH_NAMES[month] for month in range(1, 13)], object)
+
+
+class RentAnomaly(enum.IntFlag):
+    """Why a month was flagged by ``reconcile``."""
+
+    MISSING_MONTH = 1  # no row in the file
+    TOTAL_MISMATCH = 2
+    MONTH_BALANCE_MISMATCH = 4
+    YEAR_BALANCE_MISMATCH = 8
+
+
+@dataclass(frozen=True)
+class RentTable:
+    """A year of rent rows for ``len(property_ids)`` properties by 12 months."""
+
+    property_ids: tuple[str, ...]
+    addresses: tuple[str, ...]
+    tenants: tuple[str, ...]
+    # bool (properties, 12): the month has a row in the file. Missing months
+    # hold zero amounts and "Missing data" remarks.
+    present: np.ndarray
+    # float64 (properties, 12, len(AMOUNT_FIELDS)).
+    amounts: np.ndarray
+    # object arrays of str, (properties, 12).
+    month_names: np.ndarray
+    housing_depts: np.ndarray
+    remarks: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.property_ids)
+
+    def column(self, field: str) -> np.ndarray:
+        """The (properties, 12) view of one amount field."""
+        return self.amounts[..., AMOUNT_FIELDS.index(field)]
+
+    def to_properties(self, indexes: Sequence[int]) -> list[dict[str, Any]]:
+        """Build payload properties for the properties at ``indexes``."""
+        selected = np.asarray(indexes, dtype=np.intp)
+        amounts = self.amounts[selected].tolist()
+        month_names = self.month_names[selected].tolist()
+        housing_depts = self.housing_depts[selected].tolist()
+        remarks = self.remarks[selected].tolist()
+        properties = []
+        for position, index in enumerate(selected.tolist()):
+            properties.append(
+                {
+                    "property_id": self.property_ids[index],
+                    "property_address": self.addresses[index],
+                    "tenant_name": self.tenants[index],
+                    "period_months": 12,
+                    "rows": [
+                        {
+                            "month_number": month + 1,
+                            "month": name,
+                            "rent_due": values[RENT_DUE],
+                            "housing_dept": dept,
+                            "housing_paid": values[HOUSING_PAID],
+                            "tenant_paid": values[TENANT_PAID],
+                            "total_received": values[TOTAL_RECEIVED],
+                            "month_balance_due": values[MONTH_BALANCE],
+                            "year_balance_due": values[YEAR_BALANCE],
+                            "remarks": remark,
+                        }
+                        for month, (name, values, dept, remark) in enumerate(
+                            zip(
+                                month_names[position],
+                                amounts[position],
+                                housing_depts[position],
+                                remarks[position],
+                            )
+                        )
+                    ],
+                }
+            )
+        return properties
+
+
+@dataclass(frozen=True)
+class Reconciliation:
+    """Per-month anomaly flags and the values the rules expect."""
+
+    # uint8 (properties, 12) of RentAnomaly bits.
+    flags: np.ndarray
+    expected_total: np.ndarray
+    expected_month_balance: np.ndarray
+    running_balance: np.ndarray
+
+    def counts(self) -> dict[str, int]:
+        """Flagged months per anomaly, plus ``unreconciled`` for any mismatch."""
+        counts = {
+            anomaly.name.lower(): int(np.count_nonzero(self.flags & anomaly))
+            for anomaly in RentAnomaly
+            if anomaly.name
+        }
+        mismatch = ~np.uint8(RentAnomaly.MISSING_MONTH)
+        counts["unreconciled"] = int(np.count_nonzero(self.flags & mismatch))
+        return counts
+
+    def anomalies(self, table: RentTable) -> list[dict[str, Any]]:
+        """One entry per flagged month, with the recorded and expected values."""
+        properties, months = np.nonzero(self.flags)
+        recorded = table.amounts[properties, months]
+        return [
+            {
+                "property_id": table.property_ids[index],
+                "month_number": month + 1,
+                "flags": [
+                    anomaly.name
+                    for anomaly in RentAnomaly(flags)
+                    if anomaly.name is not None
+                ],
+                "total_received": values[TOTAL_RECEIVED],
+                "expected_total_received": expected_total,
+                "month_balance_due": values[MONTH_BALANCE],
+                "expected_month_balance_due": expected_month,
+                "year_balance_due": values[YEAR_BALANCE],
+                "expected_year_balance_due": running,
+            }
+            for index, month, flags, values, expected_total, expected_month, running in zip(
+                properties.tolist(),
+                months.tolist(),
+                self.flags[properties, months].tolist(),
+                recorded.tolist(),
+                self.expected_total[properties, months].tolist(),
+                self.expected_month_balance[properties, months].tolist(),
+                self.running_balance[properties, months].tolist(),
+            )
+        ]
+
+
+def reconcile(table: RentTable) -> Reconciliation:
+    """Check every month of every property against the rent rules at once."""
+    amounts = table.amounts
+    expected_total = amounts[..., HOUSING_PAID] + amounts[..., TENANT_PAID]
+    expected_month = amounts[..., TOTAL_RECEIVED] - amounts[..., RENT_DUE]
+    running = np.cumsum(amounts[..., MONTH_BALANCE], axis=1)
+
+    flags = np.where(table.present, 0, RentAnomaly.MISSING_MONTH).astype(np.uint8)
+    for anomaly, recorded, expected in (
+        (RentAnomaly.TOTAL_MISMATCH, amounts[..., TOTAL_RECEIVED], expected_total),
+        (
+            RentAnomaly.MONTH_BALANCE_MISMATCH,
+            amounts[..., MONTH_BALANCE],
+            expected_month,
+        ),
+        (RentAnomaly.YEAR_BALANCE_MISMATCH, amounts[..., YEAR_BALANCE], running),
+    ):
+        mismatch = table.present & (np.abs(recorded - expected) > TOLERANCE)
+        flags |= np.where(mismatch, np.uint8(anomaly), np.uint8(0))
+    return Reconciliation(
+        flags=flags,
+        expected_total=expected_total,
+        expected_month_balance=expected_month,
+        running_balance=running,
+    )
+
+
+def read_rent_tsv(file_path: Path) -> RentTable:
+    """Parse a ``RENT_Payments_{year}.txt`` file into a ``RentTable``.
+
+    Rows without a property id or with a month outside 1-12 are skipped, and
+    only the first row for a property and month is kept. Addresses and tenant
+    names come from the last row that has one.
+    """
+    with file_path.open(encoding="utf-8", newline="") as source:
+        rows = csv_reader(source, delimiter="\t")
+        header = next(rows, [])
+        records = list(rows)
+    width = len(header)
+    for position, record in enumerate(records):
+        if len(record) != width:
+            records[position] = (record + [""] * width)[:width]
+    # Transpose once: header name -> that column of every row.
+    columns = dict(zip(header, zip(*records)))
+    blank = ("",) * len(records)
+
+    def text(name: str) -> np.ndarray:
+        # Fixed-width strings for the short columns matched and parsed in bulk.
+        return np.array(columns.get(name, blank), dtype=np.str_)
+
+    def labels(name: str, positions: np.ndarray, fallback: str = "") -> np.ndarray:
+        # Free text is only copied out, so it stays as str objects.
+        column = columns.get(name, blank)
+        other = columns.get(fallback, blank)
+        values = [
+            (column[position] or other[position]).strip()
+            for position in positions.tolist()
+        ]
+        return np.array(values, dtype=object).reshape(len(values))
+
+    property_ids = np.strings.strip(text("property_id"))
+    month_raw = np.strings.strip(text("month_number"))
+    has_id = property_ids != ""
+    is_number = np.strings.isdecimal(month_raw)
+    month_numbers = np.where(is_number, month_raw, "0").astype(np.int64)
+    in_range = (month_numbers >= 1) & (month_numbers <= 12)
+    for position in np.flatnonzero(has_id & ~(is_number & in_range)).tolist():
+        logger.warning(
+            "Skipping %s row with invalid month_number=%r",
+            property_ids[position],
+            str(month_raw[position]),
+        )
+    valid = np.flatnonzero(has_id & is_number & in_range)
+
+    # Properties in order of first appearance.
+    unique_ids, first_seen, inverse = np.unique(
+        property_ids[valid], return_index=True, return_inverse=True
+    )
+    order = np.argsort(first_seen, kind="stable")
+    rank = np.empty(len(order), dtype=np.intp)
+    rank[order] = np.arange(len(order))
+    property_index = rank[inverse]
+    month_index = month_numbers[valid] - 1
+    count = len(order)
+
+    # First row per (property, month); later ones are duplicates.
+    _, first = np.unique(property_index * 12 + month_index, return_index=True)
+    keep = np.zeros(len(valid), dtype=bool)
+    keep[first] = True
+    for position in np.flatnonzero(~keep).tolist():
+        logger.warning(
+            "Duplicate data for %s month %d; keeping first row",
+            property_ids[valid[position]],
+            month_numbers[valid[position]],
+        )
+    kept = valid[keep]
+    kept_property = property_index[keep]
+    kept_month = month_index[keep]
+
+    present = np.zeros((count, 12), dtype=bool)
+    present[kept_property, kept_month] = True
+    amounts = np.zeros((count, 12, len(AMOUNT_FIELDS)), dtype=np.float64)
+    for field_index, column in enumerate(AMOUNT_COLUMNS.values()):
+        amounts[kept_property, kept_month, field_index] = _parse_amounts(
+            text(column)[kept],
+            column,
+            property_ids[kept],
+            month_numbers[kept],
+        )
+
+    month_names = np.tile(_DEFAULT_MONTH_NAMES, (count, 1))
+    names = labels("month_name", kept)
+    named = names != ""
+    month_names[kept_property[named], kept_month[named]] = names[named]
+
+    depts = labels("housing_dept_name", kept, fallback="housing_dept")
+    depts[depts == ""] = MISSING_DATA_REMARKS
+    housing_depts = np.full((count, 12), MISSING_DATA_REMARKS, dtype=object)
+    housing_depts[kept_property, kept_month] = depts
+    remarks = np.full((count, 12), MISSING_DATA_REMARKS, dtype=object)
+    remarks[kept_property, kept_month] = labels("notes", kept)
+
+    return RentTable(
+        property_ids=tuple(unique_ids[order].astype(object)),
+        addresses=_last_non_empty(
+            labels("property_address", valid), property_index, count
+        ),
+        tenants=_last_non_empty(labels("tenant_name", valid), property_index, count),
+        present=present,
+        amounts=amounts,
+        month_names=month_names,
+        housing_depts=housing_depts,
+        remarks=remarks,
+    )
+
+
+def _parse_amounts(
+    raw: np.ndarray, column: str, property_ids: np.ndarray, months: np.ndarray
+) -> np.ndarray:
+    if not raw.size:
+        # np.strings.replace cannot size its output for an empty array.
+        return np.zeros(0)
+    cleaned = np.strings.replace(
+        np.strings.replace(np.strings.strip(raw), "$", ""), ",", ""
+    )
+    cleaned = np.where(cleaned == "", "0", cleaned)
+    try:
+        return cleaned.astype(np.float64)
+    except ValueError:
+        pass
+    # Find the offending value for the error message.
+    for position, value in enumerate(cleaned.tolist()):
+        try:
+            float(value)
+        except ValueError:
+            raise ValueError(
+                f"{property_ids[position]} month {months[position]}: "
+                f"{column} is not a number ({raw[position]})"
+            ) from None
+    raise ValueError(f"{column} has values that are not numbers")
+
+
+def _last_non_empty(
+    values: np.ndarray, property_index: np.ndarray, count: int
+) -> tuple[str, ...]:
+    result = np.full(count, MISSING_DATA_REMARKS, dtype=object)
+    filled = np.flatnonzero(values != "")[::-1]
+    # np.unique keeps the first of each property in the reversed rows, i.e. the last.
+    properties, last = np.unique(property_index[filled], return_index=True)
+    result[properties] = values[filled[last]].astype(object)
+    return tuple(result)
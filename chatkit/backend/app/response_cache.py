@@ -0,0 +1,136 @@
+"""Exact-match cache of agent replies, replayed as a stream of ChatKit events.
+
+Many turns repeat exactly: the same canned question with the same history, or
+a workbook request answered with fixed-schema JSON. When enabled, a reply is
+stored under a hash of the agent's name, model and instructions and of the
+input items it was given, normalized so ids and surrounding whitespace do not
+matter. The next identical turn is answered from the cache without calling
+the model. Only replies made of plain assistant messages are stored, and
+entries expire after ``ttl`` seconds or when the byte cap evicts them.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import time
+from collections.abc import Sequence
+from dataclasses import dataclass
+from typing import Any
+
+from .cache import LRUCache
+
+
+@dataclass(frozen=True)
+class CachedReply:
+    """The assistant messages of one turn, as dumped ``AssistantMessageContent``."""
+
+    messages: tuple[tuple[dict[str, Any], ...], ...]
+    tokens: int
+    # How long the turn took when the model answered it.
+    seconds: float
+    expires_at: float
+    size: int
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {
+            key: _normalize(item)
+            for key, item in value.items()
+            if key != "id" and item is not None
+        }
+    if isinstance(value, list | tuple):
+        return [_normalize(item) for item in value]
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+def reply_cache_key(
+    agent_name: str, model: str, instructions: str, items: Sequence[Any]
+) -> str:
+    digest = hashlib.sha256()
+    for part in (agent_name, model, hashlib.sha256(instructions.encode()).hexdigest()):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    digest.update(
+        json.dumps(
+            _normalize(list(items)),
+            sort_keys=True,
+            separators=(",", ":"),
+            ensure_ascii=False,
+        ).encode()
+    )
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """LRU of ``CachedReply`` by key, bounded by ``max_bytes`` and ``ttl``."""
+
+    def __init__(self, ttl: float, max_bytes: int, max_entries: int = 10_000) -> None:
+        self.ttl = ttl
+        self._replies: LRUCache[str, CachedReply] = LRUCache(
+            maxsize=max_entries, max_bytes=max_bytes, sizeof=lambda reply: reply.size
+        )
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.bypassed = 0
+        self.uncacheable = 0
+        self.seconds_saved = 0.0
+        self.tokens_saved = 0
+
+    def get(self, key: str) -> CachedReply | None:
+        reply = self._replies.get(key)
+        if reply is not None and reply.expires_at <= time.monotonic():
+            self._replies.discard(key)
+            self.expired += 1
+            reply = None
+        if reply is None:
+            self.misses += 1
+        return reply
+
+    def put(
+        self,
+        key: str,
+        messages: Sequence[Sequence[dict[str, Any]]],
+        tokens: int,
+        seconds: float,
+    ) -> None:
+        frozen = tuple(tuple(contents) for contents in messages)
+        self._replies.put(
+            key,
+            CachedReply(
+                messages=frozen,
+                tokens=tokens,
+                seconds=seconds,
+                expires_at=time.monotonic() + self.ttl,
+                size=len(json.dumps(frozen, separators=(",", ":"))),
+            ),
+        )
+
+    def record_hit(self, reply: CachedReply, seconds: float) -> None:
+        """Count a reply served from the cache in ``seconds``."""
+        self.hits += 1
+        self.seconds_saved += max(0.0, reply.seconds - seconds)
+        self.tokens_saved += reply.tokens
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        memory = self._replies.stats()
+        return {
+            "size": memory["size"],
+            "bytes": memory["bytes"],
+            "max_bytes": memory["max_bytes"],
+            "evictions": memory["evictions"],
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "expired": self.expired,
+            "bypassed": self.bypassed,
+            "uncacheable": self.uncacheable,
+            "seconds_saved": round(self.seconds_saved, 3),
+            "tokens_saved": self.tokens_saved,
+        }
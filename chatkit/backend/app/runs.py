@@ -0,0 +1,102 @@
+"""Per-thread tracking of chat turns: one at a time per thread, newest wins.
+
+A turn holds its thread's lock from the time its request is parsed until its
+stream ends, so the store writes of two turns on one thread never interleave.
+A newer turn on the same thread cancels the one before it, and a turn whose
+client has disconnected is cancelled too. Cancelling stops the agent run
+(``RunResultStreaming.cancel``), which otherwise keeps generating in the
+background after its stream is abandoned.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import collections
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+
+class Run:
+    """One turn on a thread, and the agent run answering it once started."""
+
+    def __init__(self, thread_id: str, lock: asyncio.Lock) -> None:
+        self.thread_id = thread_id
+        self.lock = lock
+        self.holds_lock = False
+        # Why the turn was cancelled: "superseded" or "disconnected".
+        self.cancelled: str | None = None
+        self._agent_run: Any = None
+
+    def attach(self, agent_run: Any) -> None:
+        """Track the agent run answering this turn; stop it if already cancelled."""
+        self._agent_run = agent_run
+        if self.cancelled is not None:
+            agent_run.cancel()
+
+    def cancel(self, reason: str) -> bool:
+        if self.cancelled is not None:
+            return False
+        self.cancelled = reason
+        if self._agent_run is not None:
+            self._agent_run.cancel()
+        return True
+
+
+class ThreadRuns:
+    """The current turn per thread, with counts of cancelled runs and tokens."""
+
+    def __init__(self, disconnect_poll: float = 1.0) -> None:
+        self.disconnect_poll = disconnect_poll
+        self._runs: dict[str, Run] = {}
+        self.cancelled: collections.Counter[str] = collections.Counter()
+        self.wasted_tokens = 0
+
+    async def start(self, thread_id: str) -> Run:
+        """Register a turn on ``thread_id`` and wait for the thread's lock.
+
+        The turn already on the thread, if any, is cancelled first so the
+        lock comes free as soon as it has stopped.
+        """
+        previous = self._runs.get(thread_id)
+        run = Run(thread_id, previous.lock if previous else asyncio.Lock())
+        self._runs[thread_id] = run
+        if previous is not None:
+            self.cancel(previous, "superseded")
+        try:
+            await run.lock.acquire()
+        except BaseException:
+            self.finish(run)
+            raise
+        run.holds_lock = True
+        return run
+
+    def finish(self, run: Run) -> None:
+        if run.holds_lock:
+            run.holds_lock = False
+            run.lock.release()
+        if self._runs.get(run.thread_id) is run:
+            del self._runs[run.thread_id]
+
+    def cancel(self, run: Run, reason: str) -> None:
+        if run.cancel(reason):
+            self.cancelled[reason] += 1
+
+    def record_wasted(self, tokens: int) -> None:
+        """Output tokens generated for a turn that was cancelled."""
+        self.wasted_tokens += tokens
+
+    async def watch(
+        self, run: Run, is_disconnected: Callable[[], Awaitable[bool]]
+    ) -> None:
+        """Cancel ``run`` once ``is_disconnected`` reports the client has gone."""
+        while run.cancelled is None:
+            await asyncio.sleep(self.disconnect_poll)
+            if await is_disconnected():
+                self.cancel(run, "disconnected")
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "active": len(self._runs),
+            "cancelled": dict(self.cancelled),
+            "wasted_tokens": self.wasted_tokens,
+        }
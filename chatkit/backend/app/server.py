@@ -2,74 +2,293 @@
 
 from __future__ import annotations
 
-import os
-
-from typing import Any, AsyncIterator
+import asyncio
+import functools
+import inspect
 import logging
+import os
+import re
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, AsyncGenerator, AsyncIterator, Awaitable, Callable
 
-logger = logging.getLogger(__name__)
-
-from agents import Runner
-from chatkit.agents import AgentContext, simple_to_agent_input, stream_agent_response
+from agents import Agent, Runner
+from chatkit.agents import AgentContext, stream_agent_response
 from chatkit.server import ChatKitServer
-from chatkit.types import ThreadMetadata, ThreadStreamEvent, UserMessageItem
+from chatkit.store import Store
+from chatkit.types import (
+    AssistantMessageContent,
+    AssistantMessageContentPartAdded,
+    AssistantMessageContentPartDone,
+    AssistantMessageContentPartTextDelta,
+    AssistantMessageItem,
+    StreamingReq,
+    ThreadCreatedEvent,
+    ThreadItemAddedEvent,
+    ThreadItemDoneEvent,
+    ThreadItemUpdated,
+    ThreadMetadata,
+    ThreadStreamEvent,
+    UserMessageItem,
+)
 
+from .agent_input import AgentInputCache
+from .context_window import ContextWindow, count_input_tokens, count_text_tokens
 from .memory_store import MemoryStore
-from agents import Agent
+from .metrics import CHATKIT_STAGE_SECONDS, CHATKIT_STREAMS_IN_FLIGHT, stage
+from .response_cache import CachedReply, ResponseCache, reply_cache_key
+from .runs import Run, ThreadRuns
+from .sqlite_store import SqliteStore
 
+logger = logging.getLogger(__name__)
 
-MAX_RECENT_ITEMS = 30
+# History sent per turn: the newest items that fit CONTEXT_TOKEN_BUDGET, looking
+# back at most CONTEXT_MAX_ITEMS items. CONTEXT_SUMMARY_TOKENS > 0 reserves part
+# of the budget for a summary of older items that did not fit.
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CHATKIT_CONTEXT_TOKENS", "8000"))
+CONTEXT_MAX_ITEMS = int(os.environ.get("CHATKIT_CONTEXT_MAX_ITEMS", "100"))
+CONTEXT_SUMMARY_TOKENS = int(os.environ.get("CHATKIT_CONTEXT_SUMMARY_TOKENS", "0"))
 MODEL = "gpt-4.1-mini"
 DEFAULT_WORKFLOW_VERSION = os.environ.get("OPENAI_WORKFLOW_VERSION", "draft")
+# "memory" keeps threads in process; "sqlite" persists them to CHATKIT_SQLITE_PATH.
+STORE_BACKEND = os.environ.get("CHATKIT_STORE", "memory")
+SQLITE_PATH = os.environ.get("CHATKIT_SQLITE_PATH", "chatkit.sqlite3")
+# Limits for the in-memory store; 0 (the default) disables a limit. Without
+# CHATKIT_MEMORY_SPILL_PATH, threads evicted by a limit are deleted.
+MEMORY_MAX_THREADS = int(os.environ.get("CHATKIT_MEMORY_MAX_THREADS", "0"))
+MEMORY_MAX_ITEMS_PER_THREAD = int(
+    os.environ.get("CHATKIT_MEMORY_MAX_ITEMS_PER_THREAD", "0")
+)
+MEMORY_MAX_BYTES = int(os.environ.get("CHATKIT_MEMORY_MAX_BYTES", "0"))
+MEMORY_SPILL_PATH = os.environ.get("CHATKIT_MEMORY_SPILL_PATH")
+# Threads whose converted agent input is kept between turns.
+AGENT_INPUT_CACHE_THREADS = int(
+    os.environ.get("CHATKIT_AGENT_INPUT_CACHE_THREADS", "256")
+)
+# How often a streaming turn checks whether its client has disconnected.
+DISCONNECT_POLL_SECONDS = float(os.environ.get("CHATKIT_DISCONNECT_POLL_SECONDS", "1"))
+# Exact-match cache of agent replies (app/response_cache.py); off by default.
+RESPONSE_CACHE = os.environ.get("CHATKIT_RESPONSE_CACHE", "0") == "1"
+RESPONSE_CACHE_TTL_SECONDS = float(
+    os.environ.get("CHATKIT_RESPONSE_CACHE_TTL_SECONDS", "3600")
+)
+RESPONSE_CACHE_MAX_BYTES = int(
+    os.environ.get("CHATKIT_RESPONSE_CACHE_MAX_BYTES", str(16 * 1024 * 1024))
+)
+# "generate 2024 rent workbook" and the like; the year selects the data file.
+WORKBOOK_REQUEST_RE = re.compile(r"\b((?:19|20)\d{2}) rent workbook\b")
 
 
-assistant_agent = Agent[AgentContext[dict[str, Any]]](
-    model=MODEL,
-    name="Starter Assistant",
-    instructions=(
-        "You are a concise, helpful assistant. "
-        "Keep replies short and focus on directly answering "
-        "the user's request."
-    ),
-)
+# Agents are built on the first turn that needs one rather than at import.
+@functools.cache
+def assistant_agent() -> Agent[AgentContext[dict[str, Any]]]:
+    return Agent[AgentContext[dict[str, Any]]](
+        model=MODEL,
+        name="Starter Assistant",
+        instructions=(
+            "You are a concise, helpful assistant. "
+            "Keep replies short and focus on directly answering "
+            "the user's request."
+        ),
+    )
 
-rent_workbook_agent = Agent[AgentContext[dict[str, Any]]](
-    model=MODEL,
-    name="RentWorkbookAgent",
-    instructions=(
-        "You are the RentWorkbookAgent. "
-        "If the user asks to generate/export/create the 2025 rent workbook (e.g., 'generate 2025 rent workbook'), you MUST respond with ONLY a single valid JSON object and nothing else. "
-        "Do NOT ask clarifying questions. Do NOT include markdown. "
-        "JSON schema (must match exactly): "
-        "{\"template_version\":\"property_rents_received_v1\",\"year\":2025,\"properties\":[{\"property_id\":\"KN01\",\"property_address\":null,\"tenant_name\":null,\"period_months\":12,\"rows\":[{\"month_number\":1,\"month\":\"Jan\",\"rent_due\":0,\"housing_dept\":null,\"housing_paid\":0,\"tenant_paid\":0,\"total_received\":0,\"month_balance_due\":0,\"year_balance_due\":0,\"remarks\":\"\"}]}]}. "
-        "Requirements: include KN01..KN10; each has exactly 12 rows for months 1..12 in order; total rows 120. "
-        "If data is missing, keep the row and set numeric fields to 0 and remarks to 'Missing data'."
-    ),
-)
+
+@functools.cache
+def rent_workbook_agent() -> Agent[AgentContext[dict[str, Any]]]:
+    return Agent[AgentContext[dict[str, Any]]](
+        model=MODEL,
+        name="RentWorkbookAgent",
+        instructions=(
+            "You are the RentWorkbookAgent. "
+            "If the user asks to generate/export/create the 2025 rent workbook (e.g., 'generate 2025 rent workbook'), you MUST respond with ONLY a single valid JSON object and nothing else. "
+            "Do NOT ask clarifying questions. Do NOT include markdown. "
+            "JSON schema (must match exactly): "
+            '{"template_version":"property_rents_received_v1","year":2025,"properties":[{"property_id":"KN01","property_address":null,"tenant_name":null,"period_months":12,"rows":[{"month_number":1,"month":"Jan","rent_due":0,"housing_dept":null,"housing_paid":0,"tenant_paid":0,"total_received":0,"month_balance_due":0,"year_balance_due":0,"remarks":""}]}]}. '
+            "Requirements: include KN01..KN10; each has exactly 12 rows for months 1..12 in order; total rows 120. "
+            "If data is missing, keep the row and set numeric fields to 0 and remarks to 'Missing data'."
+        ),
+    )
+
+
+class TurnStats:
+    """Latency and streamed output tokens for one kind of turn."""
+
+    def __init__(self) -> None:
+        self.turns = 0
+        self.tokens_streamed = 0
+        self.seconds = 0.0
+
+    def record(self, tokens: int, seconds: float) -> None:
+        self.turns += 1
+        self.tokens_streamed += tokens
+        self.seconds += seconds
+
+    def as_dict(self) -> dict[str, float | None]:
+        return {
+            "turns": self.turns,
+            "tokens_streamed": self.tokens_streamed,
+            "avg_ms": self.seconds / self.turns * 1000 if self.turns else None,
+        }
+
+
+def create_store() -> MemoryStore | SqliteStore:
+    if STORE_BACKEND == "sqlite":
+        logger.info("Using SQLite store at %s", SQLITE_PATH)
+        return SqliteStore(SQLITE_PATH)
+    if STORE_BACKEND != "memory":
+        raise ValueError(f"Unknown CHATKIT_STORE {STORE_BACKEND!r}")
+    return MemoryStore(
+        max_threads=MEMORY_MAX_THREADS or None,
+        max_items_per_thread=MEMORY_MAX_ITEMS_PER_THREAD or None,
+        max_bytes=MEMORY_MAX_BYTES or None,
+        spill=SqliteStore(MEMORY_SPILL_PATH) if MEMORY_SPILL_PATH else None,
+    )
+
+
+def _check_streaming_hook() -> None:
+    # StarterChatServer takes each thread's lock (app/runs.py) by overriding
+    # this private method; fail at import rather than silently lose locking
+    # and supersede-cancel if an openai-chatkit release renames or reshapes it.
+    hook = getattr(ChatKitServer, "_process_streaming_impl", None)
+    if not inspect.isasyncgenfunction(hook) or list(
+        inspect.signature(hook).parameters
+    ) != ["self", "request", "context"]:
+        raise RuntimeError(
+            "openai-chatkit no longer provides "
+            "ChatKitServer._process_streaming_impl(self, request, context); "
+            "per-thread run locking in app/server.py needs updating"
+        )
+
+
+_check_streaming_hook()
 
 
 class StarterChatServer(ChatKitServer[dict[str, Any]]):
-    """Server implementation that keeps conversation state in memory."""
+    """Server implementation that keeps conversation state in the configured store."""
 
     def __init__(self) -> None:
-        self.store: MemoryStore = MemoryStore()
+        store = create_store()
+        self.input_cache = AgentInputCache(
+            max_threads=AGENT_INPUT_CACHE_THREADS, count_tokens=count_input_tokens
+        )
+        self.context_window = ContextWindow(
+            CONTEXT_TOKEN_BUDGET, summary_tokens=CONTEXT_SUMMARY_TOKENS
+        )
+        store.add_item_listener(self.input_cache.invalidate)
+        self.store: Store[dict] = store
+        # Answers workbook requests from local data; main.py installs it.
+        self.workbook_reply: Callable[[int], Awaitable[str]] | None = None
+        self._turns: defaultdict[str, TurnStats] = defaultdict(TurnStats)
+        self.runs = ThreadRuns(disconnect_poll=DISCONNECT_POLL_SECONDS)
+        self.response_cache = (
+            ResponseCache(RESPONSE_CACHE_TTL_SECONDS, RESPONSE_CACHE_MAX_BYTES)
+            if RESPONSE_CACHE
+            else None
+        )
         super().__init__(self.store)
 
+    async def _process_streaming_impl(
+        self, request: StreamingReq, context: dict[str, Any]
+    ) -> AsyncGenerator[ThreadStreamEvent, None]:
+        # Each streaming request is a turn on its thread (see app/runs.py), which
+        # covers the user message and every item the library saves. A new
+        # thread's id is only known once the library has created it.
+        thread_id = getattr(request.params, "thread_id", None)
+        run: Run | None = None
+        watcher: asyncio.Task[None] | None = None
+        try:
+            if thread_id is not None:
+                run, watcher = await self._start_run(thread_id, context)
+            async for event in super()._process_streaming_impl(request, context):
+                if run is None and isinstance(event, ThreadCreatedEvent):
+                    run, watcher = await self._start_run(event.thread.id, context)
+                yield event
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+            if run is not None:
+                self.runs.finish(run)
+
+    async def _start_run(
+        self, thread_id: str, context: dict[str, Any]
+    ) -> tuple[Run, asyncio.Task[None] | None]:
+        run = await self.runs.start(thread_id)
+        context["run"] = run
+        request = context.get("request")
+        watcher = None
+        if request is not None:
+            watcher = asyncio.create_task(self.runs.watch(run, request.is_disconnected))
+        return run, watcher
+
     async def respond(
         self,
         thread: ThreadMetadata,
         item: UserMessageItem | None,
         context: dict[str, Any],
     ) -> AsyncIterator[ThreadStreamEvent]:
-        items_page = await self.store.load_thread_items(
-            thread.id,
-            after=None,
-            limit=MAX_RECENT_ITEMS,
-            order="desc",
-            context=context,
+        started = time.perf_counter()
+        run: Run | None = context.get("run")
+        if run is not None and run.cancelled is not None:
+            # A newer message arrived, or the client left, before this turn began.
+            return
+        # Route workbook requests to the dedicated agent so it never asks clarifying questions.
+        user_text = ""
+        if item is not None:
+            user_text = getattr(item, "text", "") or getattr(item, "content", "") or ""
+        user_text_l = str(user_text).lower()
+        workbook_request = WORKBOOK_REQUEST_RE.search(user_text_l)
+        # The agent's instructions only cover 2025; other years need the fast path.
+        use_rent_workbook_agent = (
+            workbook_request is not None and workbook_request.group(1) == "2025"
         )
+
+        if workbook_request is not None and self.workbook_reply is not None:
+            try:
+                text = await self.workbook_reply(int(workbook_request.group(1)))
+            except Exception:
+                logger.exception("Workbook fast path failed; using RentWorkbookAgent")
+            else:
+                yield ThreadItemDoneEvent(
+                    item=AssistantMessageItem(
+                        id=self.store.generate_item_id("message", thread, context),
+                        thread_id=thread.id,
+                        created_at=datetime.now(),
+                        content=[AssistantMessageContent(text=text)],
+                    )
+                )
+                elapsed = time.perf_counter() - started
+                self._turns["workbook_fast_path"].record(
+                    count_text_tokens(text), elapsed
+                )
+                CHATKIT_STAGE_SECONDS.observe(elapsed, stage="workbook_fast_path")
+                return
+
+        generation = self.input_cache.generation(thread.id)
+        with stage(CHATKIT_STAGE_SECONDS, "store_load"):
+            items_page = await self.store.load_thread_items(
+                thread.id,
+                after=None,
+                limit=CONTEXT_MAX_ITEMS,
+                order="desc",
+                context=context,
+            )
         items = list(reversed(items_page.data))
-        agent_input = await simple_to_agent_input(items)
+        with stage(CHATKIT_STAGE_SECONDS, "input_conversion"):
+            converted = await self.input_cache.convert(thread.id, items, generation)
+            window = self.context_window.build(items, converted)
+        agent_input = window.input
+        logger.info(
+            "Context for thread %s: %d items, %d tokens, %d older items dropped "
+            "(%d summarized); built in %.1fms (%.1fms selecting)",
+            thread.id,
+            window.items,
+            window.tokens,
+            window.dropped,
+            window.summarized,
+            (time.perf_counter() - started) * 1000,
+            window.seconds * 1000,
+        )
 
         agent_context = AgentContext(
             thread=thread,
@@ -80,30 +299,31 @@ class StarterChatServer(ChatKitServer[dict[str, Any]]):
         # Workflow routing: confirm the values are present and pass them via trace metadata.
         workflow_id = context.get("workflow_id")
         workflow_version = context.get("workflow_version") or DEFAULT_WORKFLOW_VERSION
-        logger.info("ChatKit request workflow_id=%s workflow_version=%s", workflow_id, workflow_version)
+        logger.info(
+            "ChatKit request workflow_id=%s workflow_version=%s",
+            workflow_id,
+            workflow_version,
+        )
 
         trace_metadata: dict[str, Any] = {}
         if workflow_id:
             trace_metadata["workflow_id"] = workflow_id
             trace_metadata["workflow_version"] = workflow_version
 
-        # Route workbook requests to the dedicated agent so it never asks clarifying questions.
-        user_text = ""
-        if item is not None:
-            user_text = (
-                getattr(item, "text", "")
-                or getattr(item, "content", "")
-                or ""
-            )
-        user_text_l = str(user_text).lower()
-        use_rent_workbook_agent = (
-            "2025 rent workbook" in user_text_l
-            or "generate 2025 rent workbook" in user_text_l
-            or "export 2025 rent workbook" in user_text_l
-            or "create 2025 rent workbook" in user_text_l
+        selected_agent = (
+            rent_workbook_agent() if use_rent_workbook_agent else assistant_agent()
         )
 
-        selected_agent = rent_workbook_agent if use_rent_workbook_agent else assistant_agent
+        reply_key, cached = self._cached_reply(selected_agent, agent_input, context)
+        if cached is not None:
+            async for event in self._replay(cached, thread, context):
+                yield event
+            elapsed = time.perf_counter() - started
+            assert self.response_cache is not None
+            self.response_cache.record_hit(cached, elapsed)
+            self._turns["response_cache"].record(cached.tokens, elapsed)
+            CHATKIT_STAGE_SECONDS.observe(elapsed, stage="response_cache")
+            return
 
         # Run the default agent, but include trace metadata so the platform can route to the workflow.
         # If this SDK version doesn't accept trace_metadata, fall back cleanly.
@@ -121,5 +341,126 @@ class StarterChatServer(ChatKitServer[dict[str, Any]]):
                 context=agent_context,
             )
 
-        async for event in stream_agent_response(agent_context, result):
-            yield event
+        if run is not None:
+            run.attach(result)
+
+        # Text streamed so far, to count what a cancelled run wasted.
+        deltas: list[str] = []
+        # The reply's messages, for the response cache; tool calls, widgets and
+        # the like make a reply uncacheable.
+        messages: list[list[dict[str, Any]]] = []
+        cacheable = reply_key is not None
+        CHATKIT_STREAMS_IN_FLIGHT.inc()
+        try:
+            async for event in stream_agent_response(agent_context, result):
+                if isinstance(event, ThreadItemUpdated) and isinstance(
+                    event.update, AssistantMessageContentPartTextDelta
+                ):
+                    if not deltas:
+                        CHATKIT_STAGE_SECONDS.observe(
+                            time.perf_counter() - started, stage="first_token"
+                        )
+                    deltas.append(event.update.delta)
+                elif cacheable and isinstance(event, ThreadItemDoneEvent):
+                    if isinstance(event.item, AssistantMessageItem):
+                        content = event.item.content
+                        messages.append(
+                            [part.model_dump(mode="json") for part in content]
+                        )
+                    else:
+                        cacheable = False
+                yield event
+        except (GeneratorExit, asyncio.CancelledError):
+            # The stream was dropped under us; the agent run would carry on.
+            if run is not None:
+                self.runs.cancel(run, "disconnected")
+            else:
+                result.cancel()
+            raise
+        finally:
+            CHATKIT_STREAMS_IN_FLIGHT.dec()
+            CHATKIT_STAGE_SECONDS.observe(time.perf_counter() - started, stage="stream")
+            if run is not None and run.cancelled is not None:
+                self.runs.record_wasted(
+                    max(
+                        result.context_wrapper.usage.output_tokens,
+                        count_text_tokens("".join(deltas)),
+                    )
+                )
+        if run is not None and run.cancelled is not None:
+            return
+        elapsed = time.perf_counter() - started
+        tokens = result.context_wrapper.usage.output_tokens
+        self._turns[selected_agent.name].record(tokens, elapsed)
+        if reply_key is not None and self.response_cache is not None:
+            if cacheable and messages:
+                self.response_cache.put(reply_key, messages, tokens, elapsed)
+            else:
+                self.response_cache.uncacheable += 1
+
+    def _cached_reply(
+        self,
+        agent: Agent[AgentContext[dict[str, Any]]],
+        agent_input: list[Any],
+        context: dict[str, Any],
+    ) -> tuple[str | None, CachedReply | None]:
+        """The response cache key for this turn, and the reply cached under it.
+
+        A request sent with ``Cache-Control: no-cache`` skips the lookup but
+        stores its reply; ``no-store`` skips the cache altogether.
+        """
+        if self.response_cache is None or not isinstance(agent.instructions, str):
+            return None, None
+        request = context.get("request")
+        directives = (
+            request.headers.get("cache-control", "").lower()
+            if request is not None
+            else ""
+        )
+        if "no-store" in directives or "no-cache" in directives:
+            self.response_cache.bypassed += 1
+        if "no-store" in directives:
+            return None, None
+        key = reply_cache_key(
+            agent.name, str(agent.model), agent.instructions, agent_input
+        )
+        if "no-cache" in directives:
+            return key, None
+        return key, self.response_cache.get(key)
+
+    async def _replay(
+        self, reply: CachedReply, thread: ThreadMetadata, context: dict[str, Any]
+    ) -> AsyncIterator[ThreadStreamEvent]:
+        """The events the agent stream sent for ``reply``, with new item ids."""
+        for contents in reply.messages:
+            parts = [AssistantMessageContent.model_validate(part) for part in contents]
+            item = AssistantMessageItem(
+                id=self.store.generate_item_id("message", thread, context),
+                thread_id=thread.id,
+                created_at=datetime.now(),
+                content=[],
+            )
+            yield ThreadItemAddedEvent(item=item)
+            for index, part in enumerate(parts):
+                yield ThreadItemUpdated(
+                    item_id=item.id,
+                    update=AssistantMessageContentPartAdded(
+                        content_index=index, content=AssistantMessageContent(text="")
+                    ),
+                )
+                yield ThreadItemUpdated(
+                    item_id=item.id,
+                    update=AssistantMessageContentPartTextDelta(
+                        content_index=index, delta=part.text
+                    ),
+                )
+                yield ThreadItemUpdated(
+                    item_id=item.id,
+                    update=AssistantMessageContentPartDone(
+                        content_index=index, content=part
+                    ),
+                )
+            yield ThreadItemDoneEvent(item=item.model_copy(update={"content": parts}))
+
+    def turn_stats(self) -> dict[str, dict[str, float | None]]:
+        return {route: stats.as_dict() for route, stats in self._turns.items()}
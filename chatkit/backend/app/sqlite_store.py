@@ -0,0 +1,379 @@
+"""
+SQLite-backed ChatKit store that survives restarts and can be shared between
+uvicorn workers on the same machine.
+
+The database runs in WAL mode so readers never block the writer. All SQLite
+calls happen on a small thread pool: reads borrow one of a few pooled
+connections, and writes are queued and committed in batches by a single
+writer connection, so a burst of streamed item updates costs one transaction
+instead of one per item.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import queue
+import sqlite3
+import threading
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, TypeVar
+
+from chatkit.store import NotFoundError, Store
+from chatkit.types import Attachment, Page, ThreadItem, ThreadMetadata
+from pydantic import TypeAdapter
+
+from .store_events import ItemChangeNotifier
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_ITEM_ADAPTER: TypeAdapter[ThreadItem] = TypeAdapter(ThreadItem)
+_ATTACHMENT_ADAPTER: TypeAdapter[Attachment] = TypeAdapter(Attachment)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS threads (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    created_at REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_threads_created ON threads (created_at, seq);
+
+CREATE TABLE IF NOT EXISTS items (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    thread_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_items_thread_id ON items (thread_id, id);
+CREATE INDEX IF NOT EXISTS idx_items_thread_created
+    ON items (thread_id, created_at, seq);
+
+CREATE TABLE IF NOT EXISTS attachments (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+"""
+
+# Rows that share a created_at keep insertion order in both directions, matching
+# the stable sort MemoryStore paginates with.
+_ORDER = {
+    "asc": (
+        "created_at ASC, seq ASC",
+        "(created_at > ? OR (created_at = ? AND seq > ?))",
+    ),
+    "desc": (
+        "created_at DESC, seq ASC",
+        "(created_at < ? OR (created_at = ? AND seq > ?))",
+    ),
+}
+
+_Statement = tuple[str, tuple[Any, ...]]
+
+
+def _timestamp(value: datetime) -> float:
+    return value.timestamp()
+
+
+class SqliteStore(ItemChangeNotifier, Store[dict]):
+    def __init__(
+        self, path: str | Path, readers: int = 4, max_batch: int = 256
+    ) -> None:
+        super().__init__()
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_batch = max_batch
+        # One extra thread so a running write batch never starves readers.
+        self._executor = ThreadPoolExecutor(
+            max_workers=readers + 1, thread_name_prefix="sqlite-store"
+        )
+        self._writer = self._connect()
+        self._writer.executescript(_SCHEMA)
+        self._readers: queue.SimpleQueue[sqlite3.Connection] = queue.SimpleQueue()
+        for _ in range(readers):
+            self._readers.put(self._connect())
+
+        self._pending: list[tuple[list[_Statement], Future[None]]] = []
+        self._pending_lock = threading.Lock()
+        self._flushing = False
+        self.batches = 0
+        self.batched_writes = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None, timeout=30
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    # ---- threading helpers -------------------------------------------------
+
+    async def _read(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        return await asyncio.wrap_future(self._executor.submit(self._with_reader, fn))
+
+    def _with_reader(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        conn = self._readers.get()
+        try:
+            return fn(conn)
+        finally:
+            self._readers.put(conn)
+
+    async def _write(self, *statements: _Statement) -> None:
+        future: Future[None] = Future()
+        with self._pending_lock:
+            self._pending.append((list(statements), future))
+            start_flush = not self._flushing
+            self._flushing = True
+        if start_flush:
+            self._executor.submit(self._flush)
+        await asyncio.wrap_future(future)
+
+    def _flush(self) -> None:
+        stopped = True
+        try:
+            while True:
+                with self._pending_lock:
+                    batch = self._pending[: self.max_batch]
+                    del self._pending[: self.max_batch]
+                    if not batch:
+                        self._flushing = False
+                        stopped = False
+                        return
+                self._commit_batch(batch)
+        finally:
+            if stopped:
+                # Only reached if the flusher itself failed: fail what is still
+                # queued rather than leave it waiting for a flush that is gone.
+                with self._pending_lock:
+                    stranded = self._pending[:]
+                    self._pending.clear()
+                    self._flushing = False
+                error = RuntimeError("SQLite writer stopped")
+                _resolve([(future, error) for _, future in stranded])
+
+    def _reconnect_writer(self) -> None:
+        try:
+            self._writer.close()
+        except sqlite3.Error:
+            pass
+        try:
+            self._writer = self._connect()
+        except sqlite3.Error:
+            logger.exception("Could not reopen the SQLite writer")
+
+    def _commit_batch(self, batch: list[tuple[list[_Statement], Future[None]]]) -> None:
+        conn = self._writer
+        outcomes: list[tuple[Future[None], BaseException | None]] = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for statements, future in batch:
+                # A savepoint per write keeps one failing write from sinking the batch.
+                conn.execute("SAVEPOINT write_op")
+                try:
+                    for sql, params in statements:
+                        conn.execute(sql, params)
+                except sqlite3.Error as exc:
+                    conn.execute("ROLLBACK TO write_op")
+                    outcomes.append((future, exc))
+                else:
+                    outcomes.append((future, None))
+                conn.execute("RELEASE write_op")
+            conn.execute("COMMIT")
+        except BaseException as exc:
+            logger.exception("SQLite write batch failed")
+            outcomes = [(future, exc) for _, future in batch]
+            if conn.in_transaction:
+                try:
+                    conn.execute("ROLLBACK")
+                except sqlite3.Error:
+                    # The connection is left mid-transaction; start over with a
+                    # fresh one so later batches can begin.
+                    logger.exception("SQLite rollback failed; reconnecting")
+                    self._reconnect_writer()
+        finally:
+            self.batches += 1
+            self.batched_writes += len(batch)
+            if len(outcomes) < len(batch):
+                # Something outside the handler above interrupted the batch.
+                error = RuntimeError("SQLite write batch did not complete")
+                outcomes = [(future, error) for _, future in batch]
+            _resolve(outcomes)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        self._writer.close()
+        while not self._readers.empty():
+            self._readers.get().close()
+
+    # ---- threads -------------------------------------------------------------
+
+    async def load_thread(self, thread_id: str, context: dict) -> ThreadMetadata:
+        row = await self._read(
+            lambda conn: conn.execute(
+                "SELECT data FROM threads WHERE id = ?", (thread_id,)
+            ).fetchone()
+        )
+        if row is None:
+            raise NotFoundError(f"Thread {thread_id} not found")
+        return ThreadMetadata.model_validate_json(row[0])
+
+    async def save_thread(self, thread: ThreadMetadata, context: dict) -> None:
+        await self._write(
+            (
+                "INSERT INTO threads (id, created_at, data) VALUES (?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET "
+                "created_at = excluded.created_at, data = excluded.data",
+                (thread.id, _timestamp(thread.created_at), thread.model_dump_json()),
+            )
+        )
+
+    async def load_threads(
+        self, limit: int, after: str | None, order: str, context: dict
+    ) -> Page[ThreadMetadata]:
+        rows, has_more = await self._read(
+            lambda conn: self._page(conn, "threads", None, after, limit, order)
+        )
+        data = [ThreadMetadata.model_validate_json(row) for row in rows]
+        next_after = data[-1].id if has_more and data else None
+        return Page(data=data, has_more=has_more, after=next_after)
+
+    async def delete_thread(self, thread_id: str, context: dict) -> None:
+        await self._write(
+            ("DELETE FROM items WHERE thread_id = ?", (thread_id,)),
+            ("DELETE FROM threads WHERE id = ?", (thread_id,)),
+        )
+        self._notify_item_change(thread_id, None)
+
+    # ---- items ---------------------------------------------------------------
+
+    async def load_thread_items(
+        self, thread_id: str, after: str | None, limit: int, order: str, context: dict
+    ) -> Page[ThreadItem]:
+        rows, has_more = await self._read(
+            lambda conn: self._page(conn, "items", thread_id, after, limit, order)
+        )
+        data = [_ITEM_ADAPTER.validate_json(row) for row in rows]
+        next_after = data[-1].id if has_more and data else None
+        return Page(data=data, has_more=has_more, after=next_after)
+
+    async def add_thread_item(
+        self, thread_id: str, item: ThreadItem, context: dict
+    ) -> None:
+        await self.save_item(thread_id, item, context)
+
+    async def save_item(self, thread_id: str, item: ThreadItem, context: dict) -> None:
+        await self._write(
+            (
+                "INSERT INTO items (thread_id, id, created_at, data) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (thread_id, id) DO UPDATE SET "
+                "created_at = excluded.created_at, data = excluded.data",
+                (
+                    thread_id,
+                    item.id,
+                    _timestamp(item.created_at),
+                    _ITEM_ADAPTER.dump_json(item).decode(),
+                ),
+            )
+        )
+        self._notify_item_change(thread_id, item.id)
+
+    async def load_item(
+        self, thread_id: str, item_id: str, context: dict
+    ) -> ThreadItem:
+        row = await self._read(
+            lambda conn: conn.execute(
+                "SELECT data FROM items WHERE thread_id = ? AND id = ?",
+                (thread_id, item_id),
+            ).fetchone()
+        )
+        if row is None:
+            raise NotFoundError(f"Item {item_id} not found in thread {thread_id}")
+        return _ITEM_ADAPTER.validate_json(row[0])
+
+    async def delete_thread_item(
+        self, thread_id: str, item_id: str, context: dict
+    ) -> None:
+        await self._write(
+            (
+                "DELETE FROM items WHERE thread_id = ? AND id = ?",
+                (thread_id, item_id),
+            )
+        )
+        self._notify_item_change(thread_id, item_id)
+
+    def _page(
+        self,
+        conn: sqlite3.Connection,
+        table: str,
+        thread_id: str | None,
+        after: str | None,
+        limit: int,
+        order: str,
+    ) -> tuple[list[str], bool]:
+        order_by, after_clause = _ORDER["desc" if order == "desc" else "asc"]
+        where: list[str] = []
+        params: list[Any] = []
+        if thread_id is not None:
+            where.append("thread_id = ?")
+            params.append(thread_id)
+        if after:
+            cursor_sql = f"SELECT created_at, seq FROM {table} WHERE id = ?"
+            cursor_params: list[Any] = [after]
+            if thread_id is not None:
+                cursor_sql += " AND thread_id = ?"
+                cursor_params.append(thread_id)
+            cursor = conn.execute(cursor_sql, cursor_params).fetchone()
+            # An unknown cursor starts from the beginning, like MemoryStore.
+            if cursor is not None:
+                where.append(after_clause)
+                params.extend([cursor[0], cursor[0], cursor[1]])
+        sql = f"SELECT data FROM {table}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {order_by} LIMIT ?"
+        params.append(limit + 1)
+        rows = [row[0] for row in conn.execute(sql, params)]
+        return rows[:limit], len(rows) > limit
+
+    # ---- attachments ---------------------------------------------------------
+
+    async def save_attachment(self, attachment: Attachment, context: dict) -> None:
+        await self._write(
+            (
+                "INSERT INTO attachments (id, data) VALUES (?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET data = excluded.data",
+                (attachment.id, _ATTACHMENT_ADAPTER.dump_json(attachment).decode()),
+            )
+        )
+
+    async def load_attachment(self, attachment_id: str, context: dict) -> Attachment:
+        row = await self._read(
+            lambda conn: conn.execute(
+                "SELECT data FROM attachments WHERE id = ?", (attachment_id,)
+            ).fetchone()
+        )
+        if row is None:
+            raise NotFoundError(f"Attachment {attachment_id} not found")
+        return _ATTACHMENT_ADAPTER.validate_json(row[0])
+
+    async def delete_attachment(self, attachment_id: str, context: dict) -> None:
+        await self._write(("DELETE FROM attachments WHERE id = ?", (attachment_id,)))
+
+
+def _resolve(outcomes: list[tuple[Future[None], BaseException | None]]) -> None:
+    for future, error in outcomes:
+        # A caller that was cancelled already cancelled its future.
+        if future.done():
+            continue
+        if error is None:
+            future.set_result(None)
+        else:
+            future.set_exception(error)
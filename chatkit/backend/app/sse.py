@@ -0,0 +1,158 @@
+"""Coalescing, backpressure-aware SSE streaming for /chatkit.
+
+``stream_agent_response`` emits one ``thread.item.updated`` text delta per
+token, and each became its own SSE frame and socket write. ``coalesce_sse``
+sits between the ChatKit server and the response:
+
+- Adjacent text deltas for the same message part arriving within ``window``
+  seconds are merged into one delta, so the client renders the same text
+  from fewer events. Every other event passes through unchanged and in order.
+- Frames ready at the same time go out as one chunk of at most about
+  ``max_bytes``.
+- The upstream is read into a queue of ``max_queue`` frames; when the client
+  reads slowly the queue fills and the upstream waits instead of buffering
+  without bound.
+- An idle stream gets a ``: ping`` comment every ``heartbeat`` seconds, which
+  keeps proxies from closing it.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncIterable, AsyncIterator
+from typing import Any
+
+from .metrics import Counter
+
+HEARTBEAT = b": ping\n\n"
+# A text delta as the ChatKit server serializes it:
+# data: {"type":"thread.item.updated","item_id":...,"update":{"type":
+# "assistant_message.content_part.text_delta","content_index":0,"delta":"..."}}
+_DELTA_START = b'data: {"type":"thread.item.updated",'
+_TEXT_DELTA_MARK = b'"assistant_message.content_part.text_delta"'
+# Quotes inside JSON strings are escaped, so these only match the structure.
+_DELTA_KEY = b',"delta":"'
+_DELTA_END = b'"}}\n\n'
+_END = object()
+
+SSE_EVENTS = Counter(
+    "chatkit_sse_events", "Events produced for /chatkit streams, before merging."
+)
+SSE_FRAMES = Counter(
+    "chatkit_sse_frames", "SSE frames sent on /chatkit streams, after merging."
+)
+SSE_WRITES = Counter("chatkit_sse_writes", "Chunks written to /chatkit streams.")
+SSE_HEARTBEATS = Counter("chatkit_sse_heartbeats", "Heartbeats sent on idle streams.")
+
+
+class _Failure:
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+
+
+async def coalesce_sse(
+    frames: AsyncIterable[bytes],
+    *,
+    window: float = 0.015,
+    max_bytes: int = 16 * 1024,
+    max_queue: int = 256,
+    heartbeat: float = 15.0,
+) -> AsyncIterator[bytes]:
+    """Re-chunk ``data:`` frames from ``frames``; see the module docstring."""
+    queue: asyncio.Queue[Any] = asyncio.Queue(maxsize=max_queue)
+    producer = asyncio.create_task(_fill(frames, queue))
+    try:
+        while True:
+            try:
+                async with asyncio.timeout(heartbeat):
+                    frame = await queue.get()
+            except TimeoutError:
+                SSE_HEARTBEATS.inc()
+                SSE_WRITES.inc()
+                yield HEARTBEAT
+                continue
+            if frame is _END:
+                return
+            if isinstance(frame, _Failure):
+                raise frame.error
+            if window > 0 and _TEXT_DELTA_MARK in frame:
+                # More tokens are likely on their way; give them a moment.
+                await asyncio.sleep(window)
+            batch = [frame]
+            size = len(frame)
+            ended: Any = None
+            while size < max_bytes and not queue.empty():
+                frame = queue.get_nowait()
+                if frame is _END or isinstance(frame, _Failure):
+                    ended = frame
+                    break
+                batch.append(frame)
+                size += len(frame)
+            SSE_EVENTS.inc(len(batch))
+            merged = merge_text_deltas(batch)
+            SSE_FRAMES.inc(len(merged))
+            SSE_WRITES.inc()
+            yield b"".join(merged)
+            if ended is _END:
+                return
+            if isinstance(ended, _Failure):
+                raise ended.error
+    finally:
+        producer.cancel()
+        try:
+            await producer
+        except asyncio.CancelledError:
+            pass
+
+
+async def _fill(frames: AsyncIterable[bytes], queue: asyncio.Queue[Any]) -> None:
+    try:
+        async for frame in frames:
+            await queue.put(frame)
+    except asyncio.CancelledError:
+        raise
+    except BaseException as exc:
+        await queue.put(_Failure(exc))
+    else:
+        await queue.put(_END)
+
+
+def merge_text_deltas(frames: list[bytes]) -> list[bytes]:
+    """Merge runs of text-delta frames for the same item and content part.
+
+    Works on the serialized frames: ``delta`` is the last field of a text
+    delta, so frames that agree up to it are for the same part, and their
+    escaped JSON strings can simply be joined.
+    """
+    merged: list[bytes] = []
+    head: bytes | None = None
+    deltas: list[bytes] = []
+    for frame in frames:
+        parts = _split_text_delta(frame)
+        if parts is not None and parts[0] == head:
+            deltas.append(parts[1])
+            continue
+        if head is not None:
+            merged.append(_join(head, deltas))
+            head, deltas = None, []
+        if parts is not None:
+            head, deltas = parts[0], [parts[1]]
+        else:
+            merged.append(frame)
+    if head is not None:
+        merged.append(_join(head, deltas))
+    return merged
+
+
+def _split_text_delta(frame: bytes) -> tuple[bytes, bytes] | None:
+    """(frame up to the delta's value, the escaped value) for a text delta."""
+    if _TEXT_DELTA_MARK not in frame or not frame.endswith(_DELTA_END):
+        return None
+    head, found, rest = frame.partition(_DELTA_KEY)
+    if not found or not head.startswith(_DELTA_START):
+        return None
+    return head, rest[: -len(_DELTA_END)]
+
+
+def _join(head: bytes, deltas: list[bytes]) -> bytes:
+    return head + _DELTA_KEY + b"".join(deltas) + _DELTA_END
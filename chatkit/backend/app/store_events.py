@@ -0,0 +1,32 @@
+"""Change notifications for the ChatKit stores.
+
+Caches derived from thread history subscribe here so they can drop entries when
+an item is rewritten or deleted underneath them.
+"""
+
+from __future__ import annotations
+
+import logging
+from collections.abc import Callable
+
+logger = logging.getLogger(__name__)
+
+# Called with (thread_id, item_id); item_id is None when the whole thread changed.
+ItemListener = Callable[[str, "str | None"], None]
+
+
+class ItemChangeNotifier:
+    """Mixin that lets a store announce item writes and deletions."""
+
+    def __init__(self) -> None:
+        self._item_listeners: list[ItemListener] = []
+
+    def add_item_listener(self, listener: ItemListener) -> None:
+        self._item_listeners.append(listener)
+
+    def _notify_item_change(self, thread_id: str, item_id: str | None) -> None:
+        for listener in self._item_listeners:
+            try:
+                listener(thread_id, item_id)
+            except Exception:
+                logger.exception("Item listener failed for thread %s", thread_id)
@@ -0,0 +1,117 @@
+"""Background warm-up of the workbook pipeline after a start.
+
+Fly stops idle machines, so without this the first workbook request after a
+start pays for parsing the template and the rent data on top of the
+interpreter start-up. The steps run one after another in the background while
+the app already serves requests, and their timings are logged and reported.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from typing import Any
+
+from .import_profile import log_import_profile
+
+logger = logging.getLogger(__name__)
+
+
+def process_age() -> float | None:
+    """Seconds since this process started, where /proc tells (Linux, e.g. Fly)."""
+    try:
+        # Field 22 of /proc/self/stat is the start time in clock ticks after boot;
+        # the command name before it may contain spaces, so split after ")".
+        fields = Path("/proc/self/stat").read_text().rsplit(")", 1)[1].split()
+        start_ticks = int(fields[19])
+        uptime = float(Path("/proc/uptime").read_text().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return round(uptime - start_ticks / os.sysconf("SC_CLK_TCK"), 2)
+
+
+class Warmup:
+    """Runs named warm-up steps once and records how long each took."""
+
+    def __init__(self) -> None:
+        # name -> {"status", "seconds", "error"}, in the order the steps run.
+        self.steps: dict[str, dict[str, Any]] = {}
+        self.startup_seconds: float | None = None
+        self.finished_after: float | None = None
+        self.first_workbook_after: float | None = None
+        self._task: asyncio.Task[None] | None = None
+
+    @property
+    def ready(self) -> bool:
+        """True once every step has run, or when there was nothing to warm."""
+        return self._task is None or self._task.done()
+
+    def start(self, steps: list[tuple[str, Callable[[], Awaitable[Any]]]]) -> None:
+        """Run ``steps`` in a background task; call from the app's lifespan."""
+        self.startup_seconds = process_age()
+        logger.info(
+            "Cold start: app ready to serve %s after process start",
+            _seconds(self.startup_seconds),
+        )
+        for name, _ in steps:
+            self.steps[name] = {"status": "pending"}
+        if steps:
+            self._task = asyncio.create_task(self._run(steps))
+
+    async def _run(self, steps: list[tuple[str, Callable[[], Awaitable[Any]]]]) -> None:
+        for name, step in steps:
+            started = time.perf_counter()
+            try:
+                await step()
+            except Exception as exc:
+                logger.exception("Warm-up step %s failed", name)
+                self.steps[name] = {"status": "failed", "error": str(exc)}
+            else:
+                self.steps[name] = {"status": "done"}
+            self.steps[name]["seconds"] = round(time.perf_counter() - started, 3)
+        self.finished_after = process_age()
+        logger.info(
+            "Cold start: warm-up finished %s after process start (startup %s, %s)",
+            _seconds(self.finished_after),
+            _seconds(self.startup_seconds),
+            ", ".join(
+                f"{name} {entry['seconds']:.2f}s" for name, entry in self.steps.items()
+            ),
+        )
+        log_import_profile("after warm-up")
+
+    async def stop(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def workbook_served(self) -> None:
+        """Log time-to-first-workbook once per process."""
+        if self.first_workbook_after is not None:
+            return
+        self.first_workbook_after = process_age() or 0.0
+        logger.info(
+            "Cold start: first workbook served %s after process start (warm-up %s)",
+            _seconds(self.first_workbook_after),
+            "off" if not self.steps else "finished" if self.ready else "running",
+        )
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "startup_seconds": self.startup_seconds,
+            "finished_after_seconds": self.finished_after,
+            "first_workbook_after_seconds": self.first_workbook_after,
+            "steps": self.steps,
+        }
+
+
+def _seconds(value: float | None) -> str:
+    return "?" if value is None else f"{value:.2f}s"
@@ -1,10 +1,21 @@
 from __future__ import annotations
 
+import logging
+import os
+import pickle
+import threading
 from io import BytesIO
 from pathlib import Path
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
-from openpyxl import load_workbook
+from .metrics import WORKBOOK_STAGE_SECONDS, stage
+from .workbook_cache import workbook_cache_key
+from .xlsx_splice import SplicedTemplate, compile_template, stream_xlsx
+
+if TYPE_CHECKING:
+    from openpyxl import Workbook
+
+logger = logging.getLogger(__name__)
 
 # Template mapping (must match templates/README.md)
 HEADER_YEAR_CELL = "B2"
@@ -24,43 +35,105 @@ COL_MONTH_BAL = 7
 COL_YEAR_BAL = 8
 COL_REMARKS = 9
 
+# (column, payload field, value written when the field is missing or falsy)
+TABLE_COLUMNS: tuple[tuple[int, str, Any], ...] = (
+    (COL_MONTH, "month", ""),
+    (COL_RENT_DUE, "rent_due", 0),
+    (COL_HOUSING_DEPT, "housing_dept", ""),
+    (COL_HOUSING_PAID, "housing_paid", 0),
+    (COL_TENANT_PAID, "tenant_paid", 0),
+    (COL_TOTAL_RECEIVED, "total_received", 0),
+    (COL_MONTH_BAL, "month_balance_due", 0),
+    (COL_YEAR_BAL, "year_balance_due", 0),
+    (COL_REMARKS, "remarks", ""),
+)
+
+# "openpyxl" fills the template through openpyxl's object model; "splice" writes
+# the same cells straight into the template XML (see app/xlsx_splice.py).
+WORKBOOK_ENGINE = os.environ.get("RENT_WORKBOOK_ENGINE", "openpyxl")
+
 
 def _repo_root() -> Path:
     # backend/app/workbook.py -> repo root is: app -> backend -> chatkit
     return Path(__file__).resolve().parents[2]
 
 
-def generate_rent_workbook(payload: dict[str, Any]) -> bytes:
+TEMPLATE_PATH = _repo_root() / "templates" / "Property_Rents_Received_Template.xlsx"
+
+# Parsed template kept as a pickle: unpickling is far cheaper than re-reading the XLSX,
+# and each request gets its own independent Workbook to fill in.
+_template_lock = threading.Lock()
+_template_snapshot: tuple[tuple[int, int], bytes] | None = None
+_spliced_snapshot: tuple[tuple[int, int], SplicedTemplate] | None = None
+
+
+def template_fingerprint() -> tuple[int, int]:
+    """Return (mtime_ns, size) of the template; changes whenever the file does."""
+    try:
+        stat = TEMPLATE_PATH.stat()
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Template not found: {TEMPLATE_PATH}") from None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def rent_workbook_key(payload: dict[str, Any]) -> str:
+    """Cache key and ETag for the workbook ``payload`` renders to."""
+    # Identical payloads against the same template yield identical workbooks, so
+    # the payload hash doubles as the ETag and the cache key.
+    mtime_ns, size = template_fingerprint()
+    return workbook_cache_key(payload, f"{WORKBOOK_ENGINE}:{mtime_ns}:{size}")
+
+
+def load_template_workbook() -> Workbook:
+    """Return a fresh copy of the template, parsing the XLSX only when it changed."""
+    global _template_snapshot
+
+    fingerprint = template_fingerprint()
+    snapshot = _template_snapshot
+    if snapshot is None or snapshot[0] != fingerprint:
+        with _template_lock:
+            snapshot = _template_snapshot
+            if snapshot is None or snapshot[0] != fingerprint:
+                # openpyxl is only imported once a workbook is needed; importing
+                # it at startup slowed every cold start.
+                from openpyxl import load_workbook
+
+                logger.info("Parsing workbook template %s", TEMPLATE_PATH)
+                wb = load_workbook(TEMPLATE_PATH)
+                snapshot = (fingerprint, pickle.dumps(wb, pickle.HIGHEST_PROTOCOL))
+                _template_snapshot = snapshot
+                return wb
+    return pickle.loads(snapshot[1])
+
+
+def clear_template_cache() -> None:
+    global _template_snapshot, _spliced_snapshot
+    with _template_lock:
+        _template_snapshot = None
+        _spliced_snapshot = None
+
+
+def _sheet_values(payload: dict[str, Any]) -> dict[str, dict[str, Any]]:
+    """Map each property sheet to the cell values the template mapping asks for."""
     template_version = payload.get("template_version")
     if template_version != "property_rents_received_v1":
         raise ValueError("Unsupported template_version")
 
     year = payload.get("year")
-    if year != 2025:
-        raise ValueError("Unsupported year")
-
-    template_path = _repo_root() / "templates" / "Property_Rents_Received_Template.xlsx"
-    if not template_path.exists():
-        raise FileNotFoundError(f"Template not found: {template_path}")
-
-    wb = load_workbook(template_path)
 
+    values: dict[str, dict[str, Any]] = {}
     properties = payload.get("properties") or []
     for p in properties:
         property_id = p.get("property_id")
         if not property_id:
             continue
 
-        if property_id not in wb.sheetnames:
-            continue
-
-        ws = wb[property_id]
-
-        ws[HEADER_YEAR_CELL].value = year
-        ws[HEADER_ADDRESS_CELL].value = p.get("property_address") or ""
-        ws[HEADER_TENANT_CELL].value = p.get("tenant_name") or ""
+        cells = values.setdefault(property_id, {})
+        cells[HEADER_YEAR_CELL] = year
+        cells[HEADER_ADDRESS_CELL] = p.get("property_address") or ""
+        cells[HEADER_TENANT_CELL] = p.get("tenant_name") or ""
         period_months = p.get("period_months")
-        ws[HEADER_PERIOD_CELL].value = period_months if period_months is not None else ""
+        cells[HEADER_PERIOD_CELL] = period_months if period_months is not None else ""
 
         rows = p.get("rows") or []
         by_month: dict[int, dict[str, Any]] = {}
@@ -74,17 +147,101 @@ def generate_rent_workbook(payload: dict[str, Any]) -> bytes:
         for mn in range(1, 13):
             r = by_month.get(mn, {})
             excel_row = TABLE_START_ROW + (mn - 1)
-
-            ws.cell(row=excel_row, column=COL_MONTH).value = r.get("month") or ""
-            ws.cell(row=excel_row, column=COL_RENT_DUE).value = r.get("rent_due") or 0
-            ws.cell(row=excel_row, column=COL_HOUSING_DEPT).value = r.get("housing_dept") or ""
-            ws.cell(row=excel_row, column=COL_HOUSING_PAID).value = r.get("housing_paid") or 0
-            ws.cell(row=excel_row, column=COL_TENANT_PAID).value = r.get("tenant_paid") or 0
-            ws.cell(row=excel_row, column=COL_TOTAL_RECEIVED).value = r.get("total_received") or 0
-            ws.cell(row=excel_row, column=COL_MONTH_BAL).value = r.get("month_balance_due") or 0
-            ws.cell(row=excel_row, column=COL_YEAR_BAL).value = r.get("year_balance_due") or 0
-            ws.cell(row=excel_row, column=COL_REMARKS).value = r.get("remarks") or ""
-
-    buf = BytesIO()
-    wb.save(buf)
-    return buf.getvalue()
+            for column, field, default in TABLE_COLUMNS:
+                cells[_cell_ref(column, excel_row)] = r.get(field) or default
+
+    return values
+
+
+def _cell_ref(column: int, row: int) -> str:
+    return f"{chr(ord('A') + column - 1)}{row}"
+
+
+SPLICE_CELLS = (
+    HEADER_YEAR_CELL,
+    HEADER_ADDRESS_CELL,
+    HEADER_TENANT_CELL,
+    HEADER_PERIOD_CELL,
+    *(
+        _cell_ref(column, TABLE_START_ROW + offset)
+        for offset in range(12)
+        for column, _, _ in TABLE_COLUMNS
+    ),
+)
+
+
+def generate_rent_workbook(payload: dict[str, Any], engine: str | None = None) -> bytes:
+    if (engine or WORKBOOK_ENGINE) == "splice":
+        parts = render_rent_workbook_parts(payload)
+        with stage(WORKBOOK_STAGE_SECONDS, "save"):
+            return b"".join(stream_xlsx(parts))
+
+    with stage(WORKBOOK_STAGE_SECONDS, "template_load"):
+        property_sheets = template_property_sheets()
+        wb = load_template_workbook()
+    with stage(WORKBOOK_STAGE_SECONDS, "fill"):
+        _fill_workbook(wb, payload, property_sheets)
+    with stage(WORKBOOK_STAGE_SECONDS, "save"):
+        buf = BytesIO()
+        wb.save(buf)
+        return buf.getvalue()
+
+
+def _fill_workbook(
+    wb: Workbook, payload: dict[str, Any], property_sheets: list[str]
+) -> None:
+    values = _sheet_values(payload)
+    active = wb.active
+
+    # One sheet per property: the template's own sheet when it has one, else a
+    # copy of the first property sheet. Copies are titled once the property
+    # sheets that are not needed are gone, so their names are free.
+    sheets = []
+    for property_id in values:
+        if property_id in property_sheets:
+            sheets.append((property_id, wb[property_id]))
+        elif property_id in wb.sheetnames:
+            raise ValueError(f"{property_id} is missing mapped cells")
+        else:
+            sheets.append((property_id, wb.copy_worksheet(wb[property_sheets[0]])))
+    for name in property_sheets:
+        if name not in values:
+            wb.remove(wb[name])
+    wb.active = active if active in wb.worksheets else 0
+
+    for property_id, ws in sheets:
+        ws.title = property_id
+        for ref, value in values[property_id].items():
+            ws[ref].value = value
+
+
+def load_spliced_template() -> SplicedTemplate:
+    """Return the pre-split template, recompiling it only when the file changed."""
+    global _spliced_snapshot
+
+    fingerprint = template_fingerprint()
+    snapshot = _spliced_snapshot
+    if snapshot is None or snapshot[0] != fingerprint:
+        with _template_lock:
+            snapshot = _spliced_snapshot
+            if snapshot is None or snapshot[0] != fingerprint:
+                logger.info("Splitting workbook template %s", TEMPLATE_PATH)
+                snapshot = (fingerprint, compile_template(TEMPLATE_PATH, SPLICE_CELLS))
+                _spliced_snapshot = snapshot
+    return snapshot[1]
+
+
+def template_property_sheets() -> list[str]:
+    """Template sheets that carry every mapped cell, in workbook order."""
+    sheets = list(load_spliced_template().sheets)
+    if not sheets:
+        raise ValueError("Template has no sheet with the mapped cells")
+    return sheets
+
+
+def render_rent_workbook_parts(payload: dict[str, Any]) -> list[tuple[str, bytes]]:
+    """Fill the template by splicing cell XML; pass the result to ``stream_xlsx``."""
+    with stage(WORKBOOK_STAGE_SECONDS, "template_load"):
+        template = load_spliced_template()
+    with stage(WORKBOOK_STAGE_SECONDS, "fill"):
+        return template.render(_sheet_values(payload))
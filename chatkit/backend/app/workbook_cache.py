@@ -0,0 +1,167 @@
+"""Content-addressed cache of finished workbooks."""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any
+
+from .cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+def workbook_cache_key(payload: dict[str, Any], template_version: str) -> str:
+    """Hash the canonical JSON form of ``payload`` together with the template version."""
+    canonical = json.dumps(
+        payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    digest = hashlib.sha256(template_version.encode())
+    digest.update(b"\0")
+    digest.update(canonical.encode())
+    return digest.hexdigest()
+
+
+class WorkbookCache:
+    """Byte-bounded LRU of ``.xlsx`` bytes, optionally mirrored to a directory.
+
+    The directory lets several workers share generated workbooks and keeps them
+    across restarts; entries are written atomically and never modified, since a
+    key always names the same content. Disk I/O runs on a thread, and once the
+    files this worker knows of exceed ``max_disk_bytes`` the least recently
+    used ones (by mtime, touched on every read) are deleted.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        max_entries: int = 256,
+        spill_dir: Path | None = None,
+        max_disk_bytes: int = 0,
+    ) -> None:
+        self._memory: LRUCache[str, bytes] = LRUCache(
+            maxsize=max_entries, max_bytes=max_bytes, sizeof=len
+        )
+        self.spill_dir = spill_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.disk_hits = 0
+        self.disk_writes = 0
+        self.disk_evictions = 0
+        # Bytes under spill_dir as of the last scan plus this worker's writes
+        # since; None until the first write scans the directory.
+        self._disk_bytes: int | None = None
+        self._disk_lock = threading.Lock()
+        if spill_dir is not None:
+            spill_dir.mkdir(parents=True, exist_ok=True)
+
+    async def get(self, key: str) -> bytes | None:
+        data = self._memory.get(key)
+        if data is not None or self.spill_dir is None:
+            return data
+        data = await asyncio.to_thread(self._read, key)
+        if data is not None:
+            self.disk_hits += 1
+            self._memory.put(key, data)
+        return data
+
+    async def put(self, key: str, data: bytes) -> None:
+        self._memory.put(key, data)
+        if self.spill_dir is not None and await asyncio.to_thread(
+            self._write, key, data
+        ):
+            self.disk_writes += 1
+
+    def _read(self, key: str) -> bytes | None:
+        path = self._spill_path(key)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        except OSError:
+            logger.warning("Could not read cached workbook %s", key, exc_info=True)
+            return None
+        try:
+            # Reads count as use, so pruning keeps the workbooks still asked for.
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def _write(self, key: str, data: bytes) -> bool:
+        path = self._spill_path(key)
+        if path.exists():
+            return False
+        try:
+            fd, tmp_name = tempfile.mkstemp(dir=self.spill_dir, suffix=".tmp")
+        except OSError:
+            logger.warning("Could not spill workbook %s", key, exc_info=True)
+            return False
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                tmp.write(data)
+            os.replace(tmp_name, path)
+        except OSError:
+            logger.warning("Could not spill workbook %s", key, exc_info=True)
+            try:
+                os.unlink(tmp_name)
+            except OSError:
+                pass
+            return False
+        with self._disk_lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, size, _ in self._spilled())
+            else:
+                self._disk_bytes += len(data)
+            if self.max_disk_bytes and self._disk_bytes > self.max_disk_bytes:
+                self._prune()
+        return True
+
+    def _spilled(self) -> list[tuple[float, int, Path]]:
+        assert self.spill_dir is not None
+        files = []
+        for path in self.spill_dir.glob("*.xlsx"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def _prune(self) -> None:
+        # Rescan: other workers sharing the directory add and delete files too.
+        files = sorted(self._spilled())
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            except OSError:
+                logger.warning("Could not prune cached workbook %s", path)
+                continue
+            total -= size
+            self.disk_evictions += 1
+        self._disk_bytes = total
+
+    def _spill_path(self, key: str) -> Path:
+        assert self.spill_dir is not None
+        return self.spill_dir / f"{key}.xlsx"
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            **self._memory.stats(),
+            "spill_dir": str(self.spill_dir) if self.spill_dir else None,
+            "disk_hits": self.disk_hits,
+            "disk_writes": self.disk_writes,
+            "disk_bytes": self._disk_bytes,
+            "max_disk_bytes": self.max_disk_bytes,
+            "disk_evictions": self.disk_evictions,
+        }
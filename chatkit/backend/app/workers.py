@@ -0,0 +1,159 @@
+"""Bounded executor for CPU-bound work that must not block the event loop."""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import math
+import multiprocessing
+import time
+from collections.abc import Callable
+from concurrent.futures import (
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from typing import Any, TypeVar
+
+from .metrics import capture_stages, replay_stages
+
+T = TypeVar("T")
+
+
+class PoolSaturatedError(RuntimeError):
+    """Raised when a job is submitted while every worker and queue slot is taken."""
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__("worker pool is saturated")
+        self.retry_after = retry_after
+
+
+def _timed_call(
+    fn: Callable[..., T], *args: Any
+) -> tuple[T, float, float, list[tuple[str, str, float]]]:
+    # Runs inside the worker; wall-clock start lets the caller split queue wait
+    # from execution time even when the worker is another process. Stage
+    # timings go back with the result to be recorded in the caller's metrics.
+    started = time.time()
+    with capture_stages() as stages:
+        result = fn(*args)
+    return result, started, time.time() - started, stages
+
+
+def _call_soon(
+    loop: asyncio.AbstractEventLoop, callback: Callable[..., None], *args: Any
+) -> None:
+    # Executor callbacks run in a worker thread; counters belong to the loop.
+    try:
+        loop.call_soon_threadsafe(callback, *args)
+    except RuntimeError:
+        # The loop has closed, and the counters with it.
+        pass
+
+
+class WorkerPool:
+    """Thread or process pool with an admission limit and simple counters.
+
+    At most ``max_workers`` jobs run at once and at most ``max_queue`` more may
+    wait for a worker; anything beyond that is rejected with
+    :class:`PoolSaturatedError` instead of piling up.
+    """
+
+    def __init__(
+        self, max_workers: int = 2, max_queue: int = 8, kind: str = "thread"
+    ) -> None:
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        if max_queue < 0:
+            raise ValueError("max_queue must not be negative")
+        if kind not in ("thread", "process"):
+            raise ValueError("kind must be 'thread' or 'process'")
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.kind = kind
+        self._executor: Executor | None = None
+
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.exec_seconds_total = 0.0
+        self.exec_seconds_max = 0.0
+        self.wait_seconds_total = 0.0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                # Forking copies locks that other threads (warm-up, the
+                # default executor) hold at that moment, and a worker waiting
+                # on one never finishes; spawned workers start clean.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="workbook"
+                )
+        return self._executor
+
+    def retry_after(self) -> int:
+        """Seconds a rejected client should wait, estimated from recent job times."""
+        average = self.exec_seconds_total / self.completed if self.completed else 1.0
+        backlog = self.in_flight / self.max_workers
+        return max(1, math.ceil(average * backlog))
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        if self.in_flight >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise PoolSaturatedError(self.retry_after())
+
+        loop = asyncio.get_running_loop()
+        submitted = time.time()
+        job = self._get_executor().submit(functools.partial(_timed_call, fn, *args))
+        # A job keeps its slot until the worker is done with it, even when the
+        # awaiting request is cancelled: the worker cannot be stopped midway.
+        self.in_flight += 1
+        job.add_done_callback(
+            lambda done: _call_soon(loop, self._job_done, done, submitted)
+        )
+        result, _started, _elapsed, stages = await asyncio.wrap_future(job)
+        replay_stages(stages)
+        return result
+
+    def _job_done(self, job: Future[Any], submitted: float) -> None:
+        # Counters are only touched from the event loop, so they need no lock.
+        self.in_flight -= 1
+        if job.cancelled() or job.exception() is not None:
+            self.failed += 1
+            return
+        _result, started, elapsed, _stages = job.result()
+        self.completed += 1
+        self.exec_seconds_total += elapsed
+        self.exec_seconds_max = max(self.exec_seconds_max, elapsed)
+        self.wait_seconds_total += max(0.0, started - submitted)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queue_depth": max(0, self.in_flight - self.max_workers),
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "exec_seconds_avg": (
+                self.exec_seconds_total / self.completed if self.completed else 0.0
+            ),
+            "exec_seconds_max": self.exec_seconds_max,
+            "wait_seconds_avg": (
+                self.wait_seconds_total / self.completed if self.completed else 0.0
+            ),
+        }
@@ -0,0 +1,535 @@
+"""Fill fixed cells of an XLSX template by splicing bytes into its sheet XML.
+
+The template is split once around every cell we are going to overwrite, so a
+render is a handful of ``bytes.join`` calls per sheet instead of building and
+serializing openpyxl's full object model. Output mirrors what openpyxl writes
+for the same assignments: strings become inline strings, numbers use the
+``%.16g`` format, formulas are replaced by values, ``calcChain.xml`` is dropped
+and Excel is asked to recalculate on load.
+
+The sheets that carry every mapped cell are the template's property sheets. A
+render writes one per entry in its values: sheets the template lacks are copied
+from the first property sheet and appended, and property sheets without values
+are dropped, which means rewriting the workbook's sheet list, relationships and
+content types as well.
+"""
+
+from __future__ import annotations
+
+import posixpath
+import re
+import zipfile
+from collections import Counter
+from collections.abc import Iterable, Iterator, Mapping
+from dataclasses import dataclass, replace
+from math import isinf, isnan
+from pathlib import Path
+from typing import Any
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape, unescape
+
+_MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+_CALC_CHAIN_RE = re.compile(rb'<Override[^>]*PartName="/xl/calcChain\.xml"[^>]*/>')
+_CALC_CHAIN_REL_RE = re.compile(
+    rb'<Relationship[^>]*Target="[^"]*calcChain\.xml"[^>]*/>'
+)
+_CALC_PR_RE = re.compile(rb"<calcPr\b([^>]*?)(/?)>")
+_SHEETS_RE = re.compile(rb"<sheets>(.*?)</sheets>", re.DOTALL)
+_SHEET_ELEMENT_RE = re.compile(rb"<sheet\b[^>]*/>")
+_RELATIONSHIP_RE = re.compile(rb"<Relationship\b[^>]*/>")
+_OVERRIDE_RE = re.compile(rb"<Override\b[^>]*/>")
+_ACTIVE_TAB_RE = re.compile(rb'\sactiveTab="(\d+)"')
+_APP_SHEET_TITLES_RE = re.compile(
+    rb"<HeadingPairs>.*?</HeadingPairs>|<TitlesOfParts>.*?</TitlesOfParts>", re.DOTALL
+)
+_WORKSHEET_PART_RE = re.compile(r"xl/worksheets/sheet(\d+)\.xml")
+_RELATIONSHIP_ID_RE = re.compile(r"rId(\d+)")
+# Elements of a copied sheet that point at its own relationships (drawings,
+# comments) are not copied, and neither are its tab selection and revision id.
+_CLONE_DROP_RE = re.compile(
+    rb"<(?:drawing|legacyDrawing|legacyDrawingHF|picture)\b[^>]*/>"
+    rb'|\stabSelected="[^"]*"'
+)
+_ROOT_UID_RE = re.compile(rb'(<worksheet\b[^>]*?)\sxr:uid="[^"]*"')
+_STYLE_ATTR_RE = re.compile(rb'\ss="(\d+)"')
+# Same characters openpyxl refuses to write into a cell.
+_ILLEGAL_CHARACTERS_RE = re.compile(r"[\000-\010]|[\013-\014]|[\016-\037]")
+
+_CHUNK_SIZE = 64 * 1024
+
+_WORKSHEET_REL_TYPE = (
+    "http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"
+)
+_WORKSHEET_CONTENT_TYPE = (
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"
+)
+
+
+@dataclass(frozen=True)
+class _SheetTemplate:
+    part: str
+    # ``chunks[i]`` precedes ``cells[i]``; the final chunk closes the document.
+    chunks: tuple[bytes, ...]
+    # Template XML of each spliceable cell, kept when a render leaves it alone.
+    cells: tuple[bytes, ...]
+    styles: tuple[bytes, ...]
+    index: Mapping[str, int]
+
+
+@dataclass(frozen=True)
+class _SheetLayout:
+    """Where one property sheet is declared, so it can be dropped from a render."""
+
+    rel: bytes  # its <Relationship> in xl/_rels/workbook.xml.rels
+    # <Override>s in [Content_Types].xml for the sheet and the parts it owns.
+    overrides: tuple[bytes, ...]
+    # Its relationships part and the parts only it refers to (drawings), each
+    # with their relationships part; any of these may not exist.
+    owned: tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class _WorkbookLayout:
+    """The template's sheet list, split out so renders can add and drop sheets."""
+
+    # workbook.xml around the <sheet> elements, and every element in order.
+    workbook: tuple[bytes, bytes]
+    sheet_elements: tuple[tuple[str, bytes], ...]
+    # Index into sheet_elements of the active tab.
+    active: int
+    # workbook.xml.rels and [Content_Types].xml without the property sheets'
+    # entries, split where new entries go.
+    rels: tuple[bytes, bytes]
+    types: tuple[bytes, bytes]
+    sheet_layouts: Mapping[str, _SheetLayout]
+    # Property sheet that new sheets are copied from, when it can be copied.
+    base: _SheetTemplate | None
+    next_part: int
+    next_rel: int
+    next_sheet_id: int
+
+
+@dataclass(frozen=True)
+class SplicedTemplate:
+    """Pre-split XLSX template that can be filled without parsing it again."""
+
+    sheets: Mapping[str, _SheetTemplate]
+    # Sheets that exist but lack one of the mapped cells.
+    unspliceable: frozenset[str]
+    parts: tuple[tuple[str, bytes], ...]
+    # None when the workbook's sheet list is in a shape we do not rewrite.
+    layout: _WorkbookLayout | None = None
+
+    def render(
+        self, values: Mapping[str, Mapping[str, Any]]
+    ) -> list[tuple[str, bytes]]:
+        """Return every zip member with ``values[sheet][ref]`` spliced in.
+
+        Sheets named in ``values`` but not in the template are copied from the
+        first property sheet; property sheets not in ``values`` are dropped.
+        """
+        filled: dict[str, bytes] = {}
+        added: list[tuple[str, bytes]] = []
+        for sheet_name, cell_values in values.items():
+            sheet = self.sheets.get(sheet_name)
+            if sheet is not None:
+                filled[sheet.part] = _fill(sheet_name, sheet, cell_values)
+                continue
+            if sheet_name in self.unspliceable:
+                raise ValueError(f"{sheet_name} is missing mapped cells")
+            if self.layout is None or self.layout.base is None:
+                raise ValueError(f"Template has no sheet to copy for {sheet_name}")
+            added.append((sheet_name, _fill(sheet_name, self.layout.base, cell_values)))
+
+        dropped = {name for name in self.sheets if name not in values}
+        if not added and not dropped:
+            return [(name, filled.get(name, data)) for name, data in self.parts]
+        if self.layout is None:
+            raise ValueError("Template sheets cannot be added or removed")
+        return _relayout(self, filled, added, dropped)
+
+
+def _fill(
+    sheet_name: str, sheet: _SheetTemplate, cell_values: Mapping[str, Any]
+) -> bytes:
+    cells = list(sheet.cells)
+    for ref, value in cell_values.items():
+        position = sheet.index.get(ref)
+        if position is None:
+            raise ValueError(f"{sheet_name}!{ref} is not a spliceable cell")
+        cells[position] = _cell_xml(ref, sheet.styles[position], value)
+    pieces: list[bytes] = []
+    for chunk, cell in zip(sheet.chunks, cells):
+        pieces.append(chunk)
+        pieces.append(cell)
+    pieces.append(sheet.chunks[-1])
+    return b"".join(pieces)
+
+
+def _relayout(
+    template: SplicedTemplate,
+    filled: Mapping[str, bytes],
+    added: list[tuple[str, bytes]],
+    dropped: set[str],
+) -> list[tuple[str, bytes]]:
+    """Write the workbook with ``added`` sheets appended and ``dropped`` removed."""
+    layout = template.layout
+    assert layout is not None
+    order: list[str] = []
+    sheet_elements: list[bytes] = []
+    for name, element in layout.sheet_elements:
+        if name not in dropped:
+            order.append(name)
+            sheet_elements.append(element)
+    rels = [
+        entry.rel for name, entry in layout.sheet_layouts.items() if name not in dropped
+    ]
+    types = [
+        override
+        for name, entry in layout.sheet_layouts.items()
+        if name not in dropped
+        for override in entry.overrides
+    ]
+    new_parts: list[tuple[str, bytes]] = []
+    for offset, (name, data) in enumerate(added):
+        part = f"xl/worksheets/sheet{layout.next_part + offset}.xml"
+        rel_id = f"rId{layout.next_rel + offset}"
+        order.append(name)
+        sheet_elements.append(
+            f'<sheet name="{escape(name, {chr(34): "&quot;"})}" '
+            f'sheetId="{layout.next_sheet_id + offset}" r:id="{rel_id}"/>'.encode()
+        )
+        rels.append(
+            f'<Relationship Id="{rel_id}" Type="{_WORKSHEET_REL_TYPE}" '
+            f'Target="/{part}"/>'.encode()
+        )
+        types.append(
+            f'<Override PartName="/{part}" '
+            f'ContentType="{_WORKSHEET_CONTENT_TYPE}"/>'.encode()
+        )
+        new_parts.append((part, data))
+
+    # Keep the same sheet active if it survived, else the first one.
+    active_name = layout.sheet_elements[layout.active][0]
+    active = order.index(active_name) if active_name not in dropped else 0
+    head, tail = layout.workbook
+    head = _ACTIVE_TAB_RE.sub(f' activeTab="{active}"'.encode(), head, count=1)
+    replaced = {
+        "xl/workbook.xml": head + b"".join(sheet_elements) + tail,
+        "xl/_rels/workbook.xml.rels": layout.rels[0] + b"".join(rels) + layout.rels[1],
+        "[Content_Types].xml": layout.types[0] + b"".join(types) + layout.types[1],
+    }
+    removed = set()
+    for name in dropped:
+        removed.add(template.sheets[name].part)
+        removed.update(layout.sheet_layouts[name].owned)
+
+    output: list[tuple[str, bytes]] = []
+    for name, data in template.parts:
+        if name in removed:
+            continue
+        if name in replaced:
+            data = replaced[name]
+        elif name == "docProps/app.xml":
+            # The cached sheet titles no longer match; Excel rebuilds them.
+            data = _APP_SHEET_TITLES_RE.sub(b"", data)
+        else:
+            data = filled.get(name, data)
+        output.append((name, data))
+    output.extend(new_parts)
+    return output
+
+
+def compile_template(path: Path, cells: Iterable[str]) -> SplicedTemplate:
+    """Split every worksheet of ``path`` around the given cell references.
+
+    A sheet missing any referenced cell is recorded as unspliceable: inserting
+    new cells would mean rewriting rows rather than splicing bytes.
+    """
+    refs = tuple(cells)
+    with zipfile.ZipFile(path) as archive:
+        parts = [(info.filename, archive.read(info)) for info in archive.infolist()]
+    members = dict(parts)
+
+    sheets: dict[str, _SheetTemplate] = {}
+    unspliceable: set[str] = set()
+    for name, part in _sheet_parts(members).items():
+        sheet = _split_sheet(part, members[part], refs)
+        if sheet is None:
+            unspliceable.add(name)
+        else:
+            sheets[name] = sheet
+
+    output: list[tuple[str, bytes]] = []
+    for name, data in parts:
+        if name == "xl/calcChain.xml":
+            continue
+        if name == "[Content_Types].xml":
+            data = _CALC_CHAIN_RE.sub(b"", data)
+        elif name == "xl/_rels/workbook.xml.rels":
+            data = _CALC_CHAIN_REL_RE.sub(b"", data)
+        elif name == "xl/workbook.xml":
+            data = _force_full_calc(data)
+        output.append((name, data))
+    return SplicedTemplate(
+        sheets=sheets,
+        unspliceable=frozenset(unspliceable),
+        parts=tuple(output),
+        layout=_compile_layout(dict(output), sheets),
+    )
+
+
+def stream_xlsx(parts: Iterable[tuple[str, bytes]]) -> Iterator[bytes]:
+    """Yield a deflated zip of ``parts`` chunk by chunk."""
+    sink = ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, data in parts:
+            archive.writestr(name, data)
+            if sink.size >= _CHUNK_SIZE:
+                yield sink.take()
+    if sink.size:
+        yield sink.take()
+
+
+class ChunkSink:
+    """Write-only, non-seekable file object; zipfile falls back to data descriptors."""
+
+    def __init__(self) -> None:
+        self._pending: list[bytes] = []
+        self.size = 0
+
+    def write(self, data: bytes, /) -> int:
+        self._pending.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        chunk = b"".join(self._pending)
+        self._pending.clear()
+        self.size = 0
+        return chunk
+
+
+def _sheet_parts(members: Mapping[str, bytes]) -> dict[str, str]:
+    workbook = ElementTree.fromstring(members["xl/workbook.xml"])
+    rels = ElementTree.fromstring(members["xl/_rels/workbook.xml.rels"])
+    targets = {
+        rel.get("Id"): rel.get("Target", "")
+        for rel in rels.iter(f"{{{_PKG_REL_NS}}}Relationship")
+    }
+    result: dict[str, str] = {}
+    for sheet in workbook.iter(f"{{{_MAIN_NS}}}sheet"):
+        target = targets.get(sheet.get(f"{{{_REL_NS}}}id"))
+        if not target:
+            continue
+        if target.startswith("/"):
+            part = target.lstrip("/")
+        else:
+            part = posixpath.normpath(posixpath.join("xl", target))
+        result[sheet.get("name", "")] = part
+    return result
+
+
+def _compile_layout(
+    members: Mapping[str, bytes], sheets: Mapping[str, _SheetTemplate]
+) -> _WorkbookLayout | None:
+    workbook = members["xl/workbook.xml"]
+    sheets_match = _SHEETS_RE.search(workbook)
+    # Defined names scoped to a sheet refer to it by position.
+    if sheets_match is None or b"localSheetId" in workbook or not sheets:
+        return None
+    rels = members["xl/_rels/workbook.xml.rels"]
+    types = members["[Content_Types].xml"]
+    rel_elements = {
+        _attribute(element, "Id"): element for element in _RELATIONSHIP_RE.findall(rels)
+    }
+    # How many relationships parts point at each part.
+    referrers: Counter[str] = Counter(
+        target
+        for name, data in members.items()
+        if name.endswith(".rels")
+        for target in set(_rel_targets(name, data))
+    )
+    overrides = {
+        _attribute(element, "PartName"): element
+        for element in _OVERRIDE_RE.findall(types)
+    }
+
+    sheet_elements: list[tuple[str, bytes]] = []
+    sheet_layouts: dict[str, _SheetLayout] = {}
+    sheet_ids = [0]
+    for element in _SHEET_ELEMENT_RE.findall(sheets_match.group(1)):
+        name = _attribute(element, "name")
+        rel_id = _attribute(element, "r:id")
+        sheet_id = _attribute(element, "sheetId")
+        if name is None or rel_id is None or sheet_id is None or not sheet_id.isdigit():
+            return None
+        name = unescape(name, {"&quot;": '"', "&apos;": "'"})
+        sheet_elements.append((name, element))
+        sheet_ids.append(int(sheet_id))
+        sheet = sheets.get(name)
+        if sheet is None:
+            continue
+        rel = rel_elements.get(rel_id)
+        if rel is None or f"/{sheet.part}" not in overrides:
+            return None
+        rels = rels.replace(rel, b"", 1)
+        rels_part = _rels_part(sheet.part)
+        owned = [rels_part]
+        sheet_overrides = [overrides[f"/{sheet.part}"]]
+        for target in _rel_targets(rels_part, members.get(rels_part, b"")):
+            if referrers[target] == 1:
+                owned += [target, _rels_part(target)]
+                if f"/{target}" in overrides:
+                    sheet_overrides.append(overrides[f"/{target}"])
+        for override in sheet_overrides:
+            types = types.replace(override, b"", 1)
+        sheet_layouts[name] = _SheetLayout(
+            rel=rel, overrides=tuple(sheet_overrides), owned=tuple(owned)
+        )
+    if len(sheet_layouts) != len(sheets):
+        return None
+
+    active_match = _ACTIVE_TAB_RE.search(workbook, 0, sheets_match.start())
+    active = int(active_match.group(1)) if active_match else 0
+    part_numbers = [
+        int(match.group(1))
+        for match in map(_WORKSHEET_PART_RE.fullmatch, members)
+        if match is not None
+    ]
+    rel_numbers = [
+        int(match.group(1))
+        for match in map(_RELATIONSHIP_ID_RE.fullmatch, filter(None, rel_elements))
+        if match is not None
+    ]
+    rels_end = rels.rindex(b"</Relationships>")
+    types_end = types.rindex(b"</Types>")
+    return _WorkbookLayout(
+        workbook=(workbook[: sheets_match.start(1)], workbook[sheets_match.end(1) :]),
+        sheet_elements=tuple(sheet_elements),
+        active=active if active < len(sheet_elements) else 0,
+        rels=(rels[:rels_end], rels[rels_end:]),
+        types=(types[:types_end], types[types_end:]),
+        sheet_layouts=sheet_layouts,
+        base=_clone_source(next(iter(sheets.values()))),
+        next_part=max(part_numbers, default=0) + 1,
+        next_rel=max(rel_numbers, default=0) + 1,
+        next_sheet_id=max(sheet_ids) + 1,
+    )
+
+
+def _rels_part(part: str) -> str:
+    directory, filename = posixpath.split(part)
+    return f"{directory}/_rels/{filename}.rels"
+
+
+def _rel_targets(rels_part: str, xml: bytes) -> list[str]:
+    """Parts that the relationships in ``rels_part`` point at."""
+    # xl/worksheets/_rels/sheet1.xml.rels resolves targets against xl/worksheets.
+    base = posixpath.dirname(posixpath.dirname(rels_part))
+    targets = []
+    for element in _RELATIONSHIP_RE.findall(xml):
+        target = _attribute(element, "Target")
+        if not target or _attribute(element, "TargetMode") == "External":
+            continue
+        if target.startswith("/"):
+            targets.append(target.lstrip("/"))
+        else:
+            targets.append(posixpath.normpath(posixpath.join(base, target)))
+    return targets
+
+
+def _attribute(element: bytes, name: str) -> str | None:
+    match = re.search(rb"\s" + re.escape(name.encode()) + rb'="([^"]*)"', element)
+    return match.group(1).decode() if match else None
+
+
+def _clone_source(sheet: _SheetTemplate) -> _SheetTemplate | None:
+    chunks = tuple(
+        _ROOT_UID_RE.sub(rb"\1", _CLONE_DROP_RE.sub(b"", chunk))
+        for chunk in sheet.chunks
+    )
+    # Anything else pointing at the sheet's relationships cannot be copied.
+    if any(b"r:id=" in chunk for chunk in chunks):
+        return None
+    return replace(sheet, part="", chunks=chunks)
+
+
+def _split_sheet(part: str, xml: bytes, refs: tuple[str, ...]) -> _SheetTemplate | None:
+    located: list[tuple[int, int, str, bytes]] = []
+    for ref in refs:
+        match = re.search(
+            rb'<c r="' + ref.encode() + rb'"(?=[\s/>])[^>]*?(?:/>|>.*?</c>)',
+            xml,
+            re.DOTALL,
+        )
+        if match is None:
+            return None
+        style = _STYLE_ATTR_RE.search(match.group(0).split(b">", 1)[0])
+        located.append(
+            (match.start(), match.end(), ref, style.group(1) if style else b"")
+        )
+    located.sort()
+
+    chunks: list[bytes] = []
+    cursor = 0
+    for start, end, _, _ in located:
+        if start < cursor:
+            raise ValueError(f"Overlapping cells in {part}")
+        chunks.append(xml[cursor:start])
+        cursor = end
+    chunks.append(xml[cursor:])
+    return _SheetTemplate(
+        part=part,
+        chunks=tuple(chunks),
+        cells=tuple(xml[start:end] for start, end, _, _ in located),
+        styles=tuple(style for _, _, _, style in located),
+        index={ref: position for position, (_, _, ref, _) in enumerate(located)},
+    )
+
+
+def _force_full_calc(workbook_xml: bytes) -> bytes:
+    def replace(match: re.Match[bytes]) -> bytes:
+        attrs = re.sub(rb'\sfullCalcOnLoad="[^"]*"', b"", match.group(1))
+        return b"<calcPr" + attrs + b' fullCalcOnLoad="1"' + match.group(2) + b">"
+
+    if _CALC_PR_RE.search(workbook_xml):
+        return _CALC_PR_RE.sub(replace, workbook_xml, count=1)
+    return workbook_xml.replace(
+        b"</sheets>", b'</sheets><calcPr fullCalcOnLoad="1"/>', 1
+    )
+
+
+def _cell_xml(ref: str, style: bytes, value: Any) -> bytes:
+    attrs = f'r="{ref}"'
+    if style:
+        attrs += f' s="{style.decode()}"'
+
+    if value is None:
+        return f'<c {attrs} t="n"/>'.encode()
+    if value == "":
+        return f'<c {attrs} t="inlineStr"/>'.encode()
+    if isinstance(value, bool):
+        return f'<c {attrs} t="b"><v>{int(value)}</v></c>'.encode()
+    if isinstance(value, (int, float)):
+        text = "" if isnan(value) or isinf(value) else "%.16g" % value
+        return f'<c {attrs} t="n"><v>{text}</v></c>'.encode()
+    if isinstance(value, str):
+        if _ILLEGAL_CHARACTERS_RE.search(value):
+            raise ValueError(f"{ref} contains characters Excel cannot store")
+        if value.startswith("=") and len(value) > 1:
+            return f"<c {attrs}><f>{escape(value[1:])}</f><v/></c>".encode()
+        space = ' xml:space="preserve"' if value != value.strip() else ""
+        return (
+            f'<c {attrs} t="inlineStr"><is><t{space}>{escape(value)}</t></is></c>'
+        ).encode()
+    raise ValueError(f"Cannot write {type(value).__name__} value to {ref}")
@@ -0,0 +1,97 @@
+"""Per-turn history preprocessing with and without the agent-input cache.
+
+Replays a long conversation through MemoryStore the way StarterChatServer.respond
+loads it, converting the recent window each turn both from scratch and through
+AgentInputCache, and checks the two inputs are identical on every turn.
+
+Run from chatkit/backend: python scripts/bench_agent_input.py [--turns N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from chatkit.agents import simple_to_agent_input  # noqa: E402
+from chatkit.types import (  # noqa: E402
+    AssistantMessageContent,
+    AssistantMessageItem,
+    InferenceOptions,
+    UserMessageItem,
+    UserMessageTextContent,
+)
+
+from app.agent_input import AgentInputCache  # noqa: E402
+from app.memory_store import MemoryStore  # noqa: E402
+from app.server import CONTEXT_MAX_ITEMS  # noqa: E402
+
+THREAD_ID = "thr_bench"
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=500)
+    args = parser.parse_args()
+
+    store = MemoryStore()
+    cache = AgentInputCache()
+    store.add_item_listener(cache.invalidate)
+    base = datetime(2025, 1, 1)
+    uncached = cached = 0.0
+
+    for turn in range(args.turns):
+        await store.add_thread_item(
+            THREAD_ID,
+            UserMessageItem(
+                id=f"user_{turn:05d}",
+                thread_id=THREAD_ID,
+                created_at=base + timedelta(seconds=2 * turn),
+                content=[UserMessageTextContent(text=f"question {turn} " * 30)],
+                attachments=[],
+                quoted_text="an earlier answer" if turn % 5 == 0 else None,
+                inference_options=InferenceOptions(),
+            ),
+            {},
+        )
+        generation = cache.generation(THREAD_ID)
+        page = await store.load_thread_items(
+            THREAD_ID, None, CONTEXT_MAX_ITEMS, "desc", {}
+        )
+        items = list(reversed(page.data))
+
+        start = time.perf_counter()
+        expected = await simple_to_agent_input(items)
+        uncached += time.perf_counter() - start
+        start = time.perf_counter()
+        actual = await cache.to_agent_input(THREAD_ID, items, generation)
+        cached += time.perf_counter() - start
+        if actual != expected:
+            raise SystemExit(f"agent input differs on turn {turn}")
+
+        reply = AssistantMessageItem(
+            id=f"asst_{turn:05d}",
+            thread_id=THREAD_ID,
+            created_at=base + timedelta(seconds=2 * turn + 1),
+            content=[AssistantMessageContent(text="")],
+        )
+        await store.add_thread_item(THREAD_ID, reply, {})
+        # The finished reply is saved again, as stream_agent_response does.
+        reply.content = [AssistantMessageContent(text=f"answer {turn} " * 40)]
+        await store.save_item(THREAD_ID, reply, {})
+
+    print(f"{args.turns} turns, window of {CONTEXT_MAX_ITEMS} items")
+    print(f"full conversion  {uncached / args.turns * 1e6:8.1f}us per turn")
+    print(f"cached           {cached / args.turns * 1e6:8.1f}us per turn")
+    print(f"speedup          {uncached / cached:8.1f}x")
+    print(f"cache stats      {cache.stats()}")
+    print("agent input matches full conversion on every turn")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
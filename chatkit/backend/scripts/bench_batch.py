@@ -0,0 +1,115 @@
+"""Measure batch export throughput as the process pool grows.
+
+A batch of ``--workbooks`` workbooks (each year's local data, plus portfolios
+of ``--properties`` synthetic properties) is rendered one after another in
+this process, then through ``BatchExporter`` with 1, 2, 4... process workers up
+to the core count (or ``--max-workers``).
+
+Run from chatkit/backend: python scripts/bench_batch.py [--workbooks N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import io
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import warnings
+import zipfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_rent_table import _write_year  # noqa: E402
+
+
+def _worker_counts(most: int) -> list[int]:
+    counts = [1]
+    while counts[-1] * 2 <= most:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != most:
+        counts.append(most)
+    return counts
+
+
+async def _run_batch(exporter, items) -> bytes:
+    progress = exporter.start(items)
+    chunks = [chunk async for chunk in exporter.stream(items, progress)]
+    if progress.failed:
+        raise SystemExit(f"{progress.failed} workbooks failed: {progress.snapshot()}")
+    return b"".join(chunks)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workbooks", type=int, default=24)
+    parser.add_argument("--properties", type=int, default=40)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+    warnings.filterwarnings("ignore", category=UserWarning, module="openpyxl")
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Workers read RENT_DATA_DIR when they import app.rent_data.
+        os.environ["RENT_DATA_DIR"] = directory
+        rng = random.Random(args.seed)
+        years = list(range(2020, 2024))
+        for year in years:
+            _write_year(
+                Path(directory) / f"RENT_Payments_{year}.txt", args.properties, rng
+            )
+
+        from app.batch import BatchItem, render_batch_item
+
+        items = [
+            BatchItem(f"Rent_Workbook_{index}.xlsx", years[index % len(years)])
+            for index in range(args.workbooks)
+        ]
+        start = time.perf_counter()
+        for item in items:
+            render_batch_item(item)
+        sequential = time.perf_counter() - start
+        print(
+            f"{args.workbooks} workbooks of {args.properties} properties, "
+            f"{os.cpu_count()} cores"
+        )
+        print(
+            f"{'in process':<12} {sequential:7.2f}s "
+            f"{args.workbooks / sequential:7.1f} workbooks/s"
+        )
+
+        asyncio.run(_scale(items, sequential, args.max_workers))
+
+
+async def _scale(items, sequential: float, max_workers: int) -> None:
+    from app.batch import BatchExporter
+    from app.workers import WorkerPool
+
+    for workers in _worker_counts(max_workers):
+        pool = WorkerPool(max_workers=workers, max_queue=workers, kind="process")
+        exporter = BatchExporter(pool, max_workbooks=len(items))
+        # Start the workers so their start-up is not timed.
+        await _run_batch(exporter, items[:workers])
+        start = time.perf_counter()
+        data = await _run_batch(exporter, items)
+        elapsed = time.perf_counter() - start
+        pool.shutdown()
+        members = len(zipfile.ZipFile(io.BytesIO(data)).namelist())
+        if members != len(items) + 1:
+            raise SystemExit(f"zip has {members} members")
+        print(
+            f"{f'{workers} workers':<12} {elapsed:7.2f}s "
+            f"{len(items) / elapsed:7.1f} workbooks/s "
+            f"{sequential / elapsed:5.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Benchmark MemoryStore on long threads against the previous list-scan design.
+
+Pages from both stores are also compared, so the run doubles as a check that
+pagination order (including created_at ties) did not change.
+
+Run from chatkit/backend: python scripts/bench_memory_store.py [--items N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from chatkit.types import (  # noqa: E402
+    AssistantMessageContent,
+    AssistantMessageItem,
+    Page,
+    ThreadItem,
+)
+
+from app.memory_store import MemoryStore  # noqa: E402
+
+THREAD_ID = "thr_bench"
+
+
+class ListScanStore:
+    """The original per-thread list implementation, kept as a reference."""
+
+    def __init__(self) -> None:
+        self.items: list[ThreadItem] = []
+
+    async def add_thread_item(self, thread_id, item, context) -> None:
+        self.items.append(item)
+
+    async def save_item(self, thread_id, item, context) -> None:
+        for idx, existing in enumerate(self.items):
+            if existing.id == item.id:
+                self.items[idx] = item
+                return
+        self.items.append(item)
+
+    async def load_item(self, thread_id, item_id, context):
+        for item in self.items:
+            if item.id == item_id:
+                return item
+        raise KeyError(item_id)
+
+    async def load_thread_items(self, thread_id, after, limit, order, context):
+        rows = sorted(self.items, key=lambda i: i.created_at, reverse=order == "desc")
+        start = 0
+        if after:
+            for idx, row in enumerate(rows):
+                if row.id == after:
+                    start = idx + 1
+                    break
+        data = rows[start : start + limit]
+        has_more = start + limit < len(rows)
+        return Page(
+            data=data, has_more=has_more, after=data[-1].id if has_more else None
+        )
+
+
+def _items(count: int) -> list[AssistantMessageItem]:
+    base = datetime(2025, 1, 1)
+    # Every third item shares the previous timestamp to exercise tie ordering.
+    return [
+        AssistantMessageItem(
+            id=f"msg_{index:06d}",
+            thread_id=THREAD_ID,
+            created_at=base + timedelta(seconds=index - index % 3),
+            content=[AssistantMessageContent(text=f"message {index}")],
+        )
+        for index in range(count)
+    ]
+
+
+async def _bench(store, items, iterations: int) -> dict[str, float]:
+    timings: dict[str, float] = {}
+    for item in items:
+        await store.add_thread_item(THREAD_ID, item, {})
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await store.load_thread_items(THREAD_ID, None, 30, "desc", {})
+    timings["latest 30 (desc)"] = time.perf_counter() - start
+
+    cursors = [random.choice(items).id for _ in range(iterations)]
+    start = time.perf_counter()
+    for cursor in cursors:
+        await store.load_thread_items(THREAD_ID, cursor, 30, "asc", {})
+    timings["page after cursor"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for cursor in cursors:
+        await store.load_item(THREAD_ID, cursor, {})
+    timings["load_item"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for cursor in cursors:
+        await store.save_item(
+            THREAD_ID, await store.load_item(THREAD_ID, cursor, {}), {}
+        )
+    timings["save_item (update)"] = time.perf_counter() - start
+    return timings
+
+
+async def _check_pages(reference, store, items) -> None:
+    for order in ("asc", "desc"):
+        for after in [None, *(item.id for item in items[::97])]:
+            expected = await reference.load_thread_items(
+                THREAD_ID, after, 30, order, {}
+            )
+            actual = await store.load_thread_items(THREAD_ID, after, 30, order, {})
+            if [i.id for i in expected.data] != [i.id for i in actual.data] or (
+                expected.has_more,
+                expected.after,
+            ) != (actual.has_more, actual.after):
+                raise SystemExit(f"page mismatch: order={order} after={after}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=10_000)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    items = _items(args.items)
+    reference = ListScanStore()
+    store = MemoryStore()
+    before = await _bench(reference, items, args.iterations)
+    after = await _bench(store, items, args.iterations)
+    await _check_pages(reference, store, items)
+
+    print(f"{args.items} items, {args.iterations} calls per operation")
+    for name, seconds in before.items():
+        per_call_before = seconds / args.iterations * 1e6
+        per_call_after = after[name] / args.iterations * 1e6
+        print(
+            f"{name:<20} list scan {per_call_before:9.1f}us   "
+            f"indexed {per_call_after:7.1f}us   "
+            f"{per_call_before / per_call_after:6.1f}x"
+        )
+    print("pagination matches the list-scan reference")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
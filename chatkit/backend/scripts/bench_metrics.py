@@ -0,0 +1,96 @@
+"""Measure what the metrics cost: per observation, per request and per scrape.
+
+Times ``Histogram.observe`` and ``stage``, a trivial ASGI endpoint with and
+without ``MetricsMiddleware``, and rendering /metrics once ``--routes`` routes
+have a few statuses each.
+
+Run from chatkit/backend: python scripts/bench_metrics.py
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.metrics import (  # noqa: E402
+    HTTP_REQUEST_SECONDS,
+    WORKBOOK_STAGE_SECONDS,
+    MetricsMiddleware,
+    render,
+    stage,
+)
+
+
+def _per_call(fn, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls
+
+
+def _observe() -> None:
+    WORKBOOK_STAGE_SECONDS.observe(0.0123, stage="fill")
+
+
+def _stage() -> None:
+    with stage(WORKBOOK_STAGE_SECONDS, "fill"):
+        pass
+
+
+async def _plain(scope, receive, send) -> None:
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+async def _request_cost(app, requests: int) -> float:
+    scope = {"type": "http", "method": "GET", "path": "/"}
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message) -> None:
+        pass
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app(scope, receive, send)
+    return (time.perf_counter() - start) / requests
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=200_000)
+    parser.add_argument("--routes", type=int, default=30)
+    args = parser.parse_args()
+
+    print(f"observe          {_per_call(_observe, args.calls) * 1e9:8.0f}ns")
+    print(f"stage()          {_per_call(_stage, args.calls) * 1e9:8.0f}ns")
+
+    plain = asyncio.run(_request_cost(_plain, args.calls))
+    measured = asyncio.run(_request_cost(MetricsMiddleware(_plain), args.calls))
+    print(
+        f"request          {plain * 1e6:8.2f}us bare, {measured * 1e6:.2f}us "
+        f"with middleware (+{(measured - plain) * 1e6:.2f}us)"
+    )
+
+    for route in range(args.routes):
+        for status in ("200", "304", "404", "500"):
+            HTTP_REQUEST_SECONDS.observe(
+                0.01, method="GET", route=f"/api/route/{route}", status=status
+            )
+    start = time.perf_counter()
+    text = render()
+    elapsed = time.perf_counter() - start
+    print(
+        f"render           {elapsed * 1000:8.2f}ms for {len(text.splitlines())} "
+        f"lines ({len(text) / 1024:.0f} KiB)"
+    )
+
+
+if __name__ == "__main__":
+    main()
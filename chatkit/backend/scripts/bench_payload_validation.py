@@ -0,0 +1,186 @@
+"""Benchmark the single-pass payload check against the previous two-walk version.
+
+Random mutations of the local 2025 payload are run through both, and the run
+fails if they disagree on whether a payload is valid or needs local data. The
+reference takes the year and property id rules of the multi-year check.
+
+Run from chatkit/backend: python scripts/bench_payload_validation.py [--iterations N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import copy
+import logging
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.rent_data import build_payload_from_local_tsv  # noqa: E402
+from app.rent_payload import _SHEET_NAME_RE, check_rent_payload  # noqa: E402
+
+
+def reference_needs_local_data(payload: dict[str, Any]) -> bool:
+    """The original ``_payload_needs_local_data``, kept as a reference."""
+    properties = payload.get("properties")
+    if not isinstance(properties, list):
+        return True
+    if not properties:
+        return True
+    for prop in properties:
+        if not isinstance(prop, dict):
+            return True
+        rows = prop.get("rows")
+        if not isinstance(rows, list) or len(rows) < 12:
+            return True
+        for row in rows:
+            remarks = row.get("remarks")
+            if isinstance(remarks, str) and remarks.strip().lower() == "missing data":
+                return True
+    return False
+
+
+def reference_validate(payload: dict[str, Any]) -> None:
+    """The original ``_validate_rent_payload`` without logging."""
+    if payload.get("template_version") != "property_rents_received_v1":
+        raise ValueError("template_version must be property_rents_received_v1")
+    year = payload.get("year")
+    if type(year) is not int or not 1900 <= year <= 2100:
+        raise ValueError("year must be a year between 1900 and 2100")
+    properties = payload.get("properties")
+    if not isinstance(properties, list):
+        raise ValueError("properties must be an array")
+    if not properties:
+        raise ValueError("properties must include at least one property")
+
+    seen_ids: set[str] = set()
+    for prop in properties:
+        if not isinstance(prop, dict):
+            raise ValueError("each property must be an object")
+        property_id = prop.get("property_id")
+        if not isinstance(property_id, str) or not _SHEET_NAME_RE.fullmatch(
+            property_id
+        ):
+            raise ValueError("invalid or missing property_id")
+        if property_id.casefold() in seen_ids:
+            raise ValueError("duplicate property_id found")
+        seen_ids.add(property_id.casefold())
+
+        if prop.get("period_months") != 12:
+            raise ValueError(f"{property_id} must have period_months 12")
+        for field in ("property_address", "tenant_name"):
+            value = prop.get(field)
+            if value is not None and not isinstance(value, str):
+                raise ValueError(f"{field} must be a string or null")
+
+        rows = prop.get("rows")
+        if not isinstance(rows, list):
+            raise ValueError(f"{property_id} rows must be a list")
+        if len(rows) != 12:
+            raise ValueError(f"{property_id} must have exactly 12 rows")
+
+        seen_months: set[int] = set()
+        for row in rows:
+            if not isinstance(row, dict):
+                raise ValueError("each row must be an object")
+            month_number = row.get("month_number")
+            if not isinstance(month_number, int) or not 1 <= month_number <= 12:
+                raise ValueError("month_number must be an integer between 1 and 12")
+            if month_number in seen_months:
+                raise ValueError("duplicate month_number detected")
+            seen_months.add(month_number)
+
+            if not isinstance(row.get("month"), str):
+                raise ValueError("month must be a string")
+            housing_dept = row.get("housing_dept")
+            if housing_dept is not None and not isinstance(housing_dept, str):
+                raise ValueError("housing_dept must be a string or null")
+            numeric_fields = (
+                "rent_due",
+                "housing_paid",
+                "tenant_paid",
+                "total_received",
+                "month_balance_due",
+                "year_balance_due",
+            )
+            for numeric_field in numeric_fields:
+                if not isinstance(row.get(numeric_field), (int, float)):
+                    raise ValueError(f"{numeric_field} must be a number")
+            if not isinstance(row.get("remarks"), str):
+                raise ValueError("remarks must be a string")
+
+        if seen_months != set(range(1, 13)):
+            raise ValueError("rows must cover months 1 through 12")
+
+
+def reference_check(payload: dict[str, Any]) -> tuple[bool, bool]:
+    needs_local = reference_needs_local_data(payload)
+    try:
+        reference_validate(payload)
+    except ValueError:
+        return False, needs_local
+    return True, needs_local
+
+
+def _mutate(payload: dict[str, Any], rng: random.Random) -> dict[str, Any]:
+    payload = copy.deepcopy(payload)
+    prop = rng.choice(payload["properties"])
+    row = rng.choice(prop["rows"])
+    choice = rng.randrange(9)
+    if choice == 0:
+        row[rng.choice(list(row))] = rng.choice([None, "x", 1.5, [], True])
+    elif choice == 1:
+        del row[rng.choice(list(row))]
+    elif choice == 2:
+        row["month_number"] = rng.randint(0, 13)
+    elif choice == 3:
+        prop["rows"].pop()
+    elif choice == 4:
+        row["remarks"] = "  Missing Data "
+    elif choice == 5:
+        prop["property_id"] = rng.choice(["KN01", "kn02", "KN11", "a/b", None])
+    elif choice == 6:
+        del payload["properties"][rng.randrange(len(payload["properties"])) :]
+    elif choice == 7:
+        prop["period_months"] = rng.choice([11, None, "12"])
+    else:
+        payload[rng.choice(["year", "template_version"])] = rng.choice(["other", 1899])
+    return payload
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    valid = build_payload_from_local_tsv(2025)
+    rng = random.Random(args.seed)
+    samples = [valid] + [_mutate(valid, rng) for _ in range(300)]
+    for index, sample in enumerate(samples):
+        result = check_rent_payload(sample)
+        if (result.ok, result.needs_local_data) != reference_check(sample):
+            raise SystemExit(f"verdicts differ on sample {index}")
+
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        reference_check(valid)
+    before = (time.perf_counter() - start) / args.iterations
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        check_rent_payload(valid)
+    after = (time.perf_counter() - start) / args.iterations
+
+    print(f"valid 120-row payload, {args.iterations} iterations")
+    print(f"two walks    {before * 1e6:8.1f}us")
+    print(f"single pass  {after * 1e6:8.1f}us   {before / after:5.2f}x")
+    print(f"verdicts match on {len(samples)} valid and mutated payloads")
+
+
+if __name__ == "__main__":
+    main()
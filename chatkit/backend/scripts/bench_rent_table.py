@@ -0,0 +1,275 @@
+"""Benchmark the columnar rent table against the previous dict-of-rows parser.
+
+Synthetic ``RENT_Payments_{year}.txt`` files with ``--property-years`` property
+years in total (some months left out and some amounts off) are loaded by both,
+and reconciled by the vectorized ``reconcile`` and by a loop over the dicts.
+The run fails if the payloads or the flagged months differ.
+
+Run from chatkit/backend: python scripts/bench_rent_table.py [--property-years N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from csv import DictReader
+from pathlib import Path
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.rent_table import (  # noqa: E402
+    AMOUNT_COLUMNS,
+    MISSING_DATA_REMARKS,
+    MONTH_NAMES,
+    TOLERANCE,
+    RentAnomaly,
+    read_rent_tsv,
+    reconcile,
+)
+
+HEADER = [
+    "property_id",
+    "property_address",
+    "tenant_name",
+    "month_number",
+    "month_name",
+    "housing_dept_name",
+    *AMOUNT_COLUMNS.values(),
+    "notes",
+]
+
+
+def _write_year(path: Path, properties: int, rng: random.Random) -> None:
+    lines = ["\t".join(HEADER)]
+    for number in range(properties):
+        rent = rng.choice([950, 1200, 1475.5, 2100])
+        year_balance = 0.0
+        for month in range(1, 13):
+            if rng.random() < 0.01:
+                continue
+            housing = rng.choice([0.0, rent / 2])
+            tenant = rent - housing - rng.choice([0.0, 0.0, 0.0, 50.0])
+            total = housing + tenant
+            month_balance = total - rent
+            year_balance += month_balance
+            if rng.random() < 0.005:
+                total += 10
+            # A typo in the running balance, not carried into later months.
+            recorded_balance = year_balance + (rng.random() < 0.005)
+            lines.append(
+                "\t".join(
+                    [
+                        f"P{number:06d}",
+                        f"{number} Main St",
+                        f"Tenant {number}",
+                        str(month),
+                        MONTH_NAMES[month],
+                        "Housing Authority" if housing else "",
+                        f"${rent:,.2f}",
+                        f"{housing:.2f}",
+                        f"{tenant:.2f}",
+                        f"{total:,.2f}",
+                        f"{month_balance:.2f}",
+                        f"{recorded_balance:.2f}",
+                        "",
+                    ]
+                )
+            )
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def _number(value: str | None) -> float:
+    cleaned = (value or "").strip().replace("$", "").replace(",", "")
+    return float(cleaned) if cleaned else 0.0
+
+
+def reference_parse(path: Path) -> dict[str, dict[str, Any]]:
+    """The previous ``_parse_rent_tsv``, without logging, kept as a reference."""
+    property_rows: dict[str, dict[str, Any]] = {}
+    with path.open(encoding="utf-8") as source:
+        for row in DictReader(source, delimiter="\t"):
+            property_id = (row.get("property_id") or "").strip()
+            if not property_id:
+                continue
+            try:
+                month_number = int(row.get("month_number") or "")
+            except ValueError:
+                continue
+            if not 1 <= month_number <= 12:
+                continue
+            entry = property_rows.setdefault(
+                property_id,
+                {"property_address": None, "tenant_name": None, "rows": {}},
+            )
+            address = (row.get("property_address") or "").strip()
+            if address:
+                entry["property_address"] = address
+            tenant = (row.get("tenant_name") or "").strip()
+            if tenant:
+                entry["tenant_name"] = tenant
+            if month_number in entry["rows"]:
+                continue
+            month_row = {
+                "month_number": month_number,
+                "month": (row.get("month_name") or "").strip()
+                or MONTH_NAMES[month_number],
+            }
+            for field, column in AMOUNT_COLUMNS.items():
+                month_row[field] = _number(row.get(column))
+            month_row["housing_dept"] = (
+                row.get("housing_dept_name") or row.get("housing_dept") or ""
+            ).strip() or MISSING_DATA_REMARKS
+            month_row["remarks"] = (row.get("notes") or "").strip()
+            entry["rows"][month_number] = month_row
+
+    missing = dict.fromkeys(AMOUNT_COLUMNS, 0.0)
+    return {
+        property_id: {
+            "property_id": property_id,
+            "property_address": entry["property_address"] or MISSING_DATA_REMARKS,
+            "tenant_name": entry["tenant_name"] or MISSING_DATA_REMARKS,
+            "period_months": 12,
+            "rows": [
+                entry["rows"].get(month)
+                or {
+                    "month_number": month,
+                    "month": MONTH_NAMES[month],
+                    **missing,
+                    "housing_dept": MISSING_DATA_REMARKS,
+                    "remarks": MISSING_DATA_REMARKS,
+                }
+                for month in range(1, 13)
+            ],
+        }
+        for property_id, entry in property_rows.items()
+    }
+
+
+def reference_reconcile(
+    properties: dict[str, dict[str, Any]], present: dict[str, set[int]]
+) -> list[tuple[str, int, int]]:
+    """Flag months one row at a time, as a loop over the payload would."""
+    flagged = []
+    for property_id, prop in properties.items():
+        running = 0.0
+        for row in prop["rows"]:
+            running += row["month_balance_due"]
+            month = row["month_number"]
+            if month not in present[property_id]:
+                flagged.append((property_id, month, int(RentAnomaly.MISSING_MONTH)))
+                continue
+            flags = 0
+            expected = row["housing_paid"] + row["tenant_paid"]
+            if abs(row["total_received"] - expected) > TOLERANCE:
+                flags |= RentAnomaly.TOTAL_MISMATCH
+            expected = row["total_received"] - row["rent_due"]
+            if abs(row["month_balance_due"] - expected) > TOLERANCE:
+                flags |= RentAnomaly.MONTH_BALANCE_MISMATCH
+            if abs(row["year_balance_due"] - running) > TOLERANCE:
+                flags |= RentAnomaly.YEAR_BALANCE_MISMATCH
+            if flags:
+                flagged.append((property_id, month, int(flags)))
+    return flagged
+
+
+def _present_months(path: Path) -> dict[str, set[int]]:
+    present: dict[str, set[int]] = {}
+    with path.open(encoding="utf-8") as source:
+        for row in DictReader(source, delimiter="\t"):
+            present.setdefault(row["property_id"], set()).add(int(row["month_number"]))
+    return present
+
+
+def _measure(fn: Callable[[], Any]) -> tuple[Any, float, float]:
+    """Result and seconds of ``fn()``, and the MiB it holds in a second run."""
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    kept = fn()
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return result, elapsed, held / 2**20
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--property-years", type=int, default=12_000)
+    parser.add_argument("--years", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    rng = random.Random(args.seed)
+    per_year = max(1, args.property_years // args.years)
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for year in range(2025 - args.years + 1, 2026):
+            path = Path(directory) / f"RENT_Payments_{year}.txt"
+            _write_year(path, per_year, rng)
+            paths.append(path)
+        present = [_present_months(path) for path in paths]
+
+        dicts, dict_parse, dict_parse_mib = _measure(
+            lambda: [reference_parse(path) for path in paths]
+        )
+        dict_flagged, dict_reconcile, _ = _measure(
+            lambda: [
+                reference_reconcile(properties, months)
+                for properties, months in zip(dicts, present)
+            ]
+        )
+        tables, table_parse, table_parse_mib = _measure(
+            lambda: [read_rent_tsv(path) for path in paths]
+        )
+        reconciliations, table_reconcile, _ = _measure(
+            lambda: [reconcile(table) for table in tables]
+        )
+        payloads, edge, _ = _measure(
+            lambda: [table.to_properties(range(len(table))) for table in tables]
+        )
+
+    flagged = 0
+    for table, reconciliation, properties, expected, reference in zip(
+        tables, reconciliations, payloads, dicts, dict_flagged
+    ):
+        if properties != list(expected.values()):
+            raise SystemExit("payloads differ")
+        anomalies = [
+            (
+                anomaly["property_id"],
+                anomaly["month_number"],
+                int(sum(RentAnomaly[name] for name in anomaly["flags"])),
+            )
+            for anomaly in reconciliation.anomalies(table)
+        ]
+        if anomalies != reference:
+            raise SystemExit("flagged months differ")
+        flagged += len(anomalies)
+
+    total = per_year * len(paths)
+    print(f"{total} property-years in {len(paths)} files, {flagged} months flagged")
+    print(f"{'':<10} {'parse':>10} {'reconcile':>10} {'held MiB':>9}")
+    print(
+        f"{'dicts':<10} {dict_parse * 1000:8.1f}ms {dict_reconcile * 1000:8.1f}ms "
+        f"{dict_parse_mib:9.1f}"
+    )
+    print(
+        f"{'columnar':<10} {table_parse * 1000:8.1f}ms "
+        f"{table_reconcile * 1000:8.1f}ms {table_parse_mib:9.1f}"
+    )
+    print(f"reconcile {dict_reconcile / table_reconcile:5.1f}x faster")
+    print(f"payload dicts built at the edge for every property: {edge * 1000:.1f}ms")
+    print("payloads and flagged months match")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""Measure /chatkit-style SSE streaming with and without delta coalescing.
+
+A uvicorn server in a subprocess streams ``--streams`` concurrent replies of
+``--tokens`` text deltas each, framed as the ChatKit server frames them, with
+``--burst`` deltas arriving together every ``--interval-ms`` as model output
+does. Each reply is sent once as one frame per event and once through
+``coalesce_sse``. Reported: server CPU seconds (from /proc), SSE frames and
+chunks the clients received, and first-delta latency. The run fails if the
+text a client rebuilds from the deltas differs between the two.
+
+Run from chatkit/backend: python scripts/bench_sse.py [--streams N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND))
+
+
+def _frame(event: dict) -> bytes:
+    return b"data: " + json.dumps(event, separators=(",", ":")).encode() + b"\n\n"
+
+
+def _token(stream: int, index: int) -> str:
+    return f" tok{stream}-{index}é"
+
+
+async def reply(stream: int, tokens: int, burst: int, interval: float):
+    """Frames of one assistant reply, paced like a model's output."""
+    item_id = f"msg_{stream}"
+    yield _frame({"type": "thread.item.added", "item": {"id": item_id}})
+    for start in range(0, tokens, burst):
+        await asyncio.sleep(interval)
+        for index in range(start, min(start + burst, tokens)):
+            yield _frame(
+                {
+                    "type": "thread.item.updated",
+                    "item_id": item_id,
+                    "update": {
+                        "type": "assistant_message.content_part.text_delta",
+                        "content_index": 0,
+                        "delta": _token(stream, index),
+                    },
+                }
+            )
+    yield _frame({"type": "thread.item.done", "item": {"id": item_id}})
+
+
+def serve(port: int) -> None:
+    import uvicorn
+    from fastapi import FastAPI
+    from fastapi.responses import StreamingResponse
+
+    from app.sse import coalesce_sse
+
+    app = FastAPI()
+
+    @app.get("/stream/{stream}")
+    async def stream_endpoint(
+        stream: int, tokens: int, burst: int, interval: float, coalesce: int
+    ) -> StreamingResponse:
+        frames = reply(stream, tokens, burst, interval)
+        body = coalesce_sse(frames) if coalesce else frames
+        return StreamingResponse(body, media_type="text/event-stream")
+
+    uvicorn.run(app, port=port, log_level="warning")
+
+
+def _cpu_seconds(pid: int) -> float:
+    fields = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+    # utime and stime, fields 14 and 15.
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+async def _client(client, url: str) -> tuple[str, int, int, float]:
+    started = time.perf_counter()
+    first_delta = None
+    chunks = 0
+    frames = 0
+    text = []
+    buffer = b""
+    async with client.stream("GET", url) as response:
+        async for chunk in response.aiter_raw():
+            chunks += 1
+            buffer += chunk
+            *complete, buffer = buffer.split(b"\n\n")
+            for frame in complete:
+                if not frame.startswith(b"data: "):
+                    continue
+                frames += 1
+                event = json.loads(frame[6:])
+                if event["type"] == "thread.item.updated":
+                    if first_delta is None:
+                        first_delta = time.perf_counter() - started
+                    text.append(event["update"]["delta"])
+    return "".join(text), frames, chunks, first_delta or 0.0
+
+
+async def _run(args: argparse.Namespace, port: int, coalesce: int) -> dict:
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.streams)
+    async with httpx.AsyncClient(limits=limits, timeout=120) as client:
+        query = (
+            f"tokens={args.tokens}&burst={args.burst}"
+            f"&interval={args.interval_ms / 1000}&coalesce={coalesce}"
+        )
+        results = await asyncio.gather(
+            *(
+                _client(client, f"http://127.0.0.1:{port}/stream/{stream}?{query}")
+                for stream in range(args.streams)
+            )
+        )
+    return {
+        "texts": [text for text, _, _, _ in results],
+        "frames": sum(frames for _, frames, _, _ in results),
+        "chunks": sum(chunks for _, _, chunks, _ in results),
+        "first_delta": statistics.median(first for _, _, _, first in results),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--streams", type=int, default=40)
+    parser.add_argument("--tokens", type=int, default=300)
+    parser.add_argument("--burst", type=int, default=3)
+    parser.add_argument("--interval-ms", type=float, default=20.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.port)
+        return
+
+    server = subprocess.Popen(
+        [sys.executable, __file__, "--serve", "--port", str(args.port)], cwd=BACKEND
+    )
+    try:
+        import httpx
+
+        for _ in range(100):
+            try:
+                httpx.get(f"http://127.0.0.1:{args.port}/docs")
+                break
+            except httpx.TransportError:
+                time.sleep(0.1)
+        print(
+            f"{args.streams} streams x {args.tokens} deltas, {args.burst} every "
+            f"{args.interval_ms:g}ms"
+        )
+        texts = None
+        for coalesce, label in ((0, "frame per event"), (1, "coalesced")):
+            cpu = _cpu_seconds(server.pid)
+            wall = time.perf_counter()
+            result = asyncio.run(_run(args, args.port, coalesce))
+            wall = time.perf_counter() - wall
+            cpu = _cpu_seconds(server.pid) - cpu
+            if texts is not None and result["texts"] != texts:
+                raise SystemExit("coalesced streams rebuild different text")
+            texts = result["texts"]
+            print(
+                f"{label:<16} server CPU {cpu:5.2f}s  {result['frames']:6d} frames "
+                f"{result['chunks']:6d} chunks  "
+                f"{args.streams * args.tokens / wall:7.0f} deltas/s  "
+                f"first delta {result['first_delta'] * 1000:5.1f}ms"
+            )
+        print("rebuilt text matches")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Throughput of MemoryStore vs SqliteStore under concurrent conversations.
+
+Each simulated conversation adds items and reads back the latest page the way
+StarterChatServer.respond does on every turn.
+
+Run from chatkit/backend: python scripts/bench_stores.py [--threads N] [--turns N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from chatkit.store import Store  # noqa: E402
+from chatkit.types import (  # noqa: E402
+    AssistantMessageContent,
+    AssistantMessageItem,
+    ThreadMetadata,
+)
+
+from app.memory_store import MemoryStore  # noqa: E402
+from app.sqlite_store import SqliteStore  # noqa: E402
+
+
+async def _conversation(store: Store[dict], index: int, turns: int) -> None:
+    thread_id = f"thr_{index:05d}"
+    await store.save_thread(ThreadMetadata(id=thread_id, created_at=datetime.now()), {})
+    for turn in range(turns):
+        item = AssistantMessageItem(
+            id=f"msg_{index:05d}_{turn:04d}",
+            thread_id=thread_id,
+            created_at=datetime.now(),
+            content=[AssistantMessageContent(text=f"turn {turn} " * 20)],
+        )
+        await store.add_thread_item(thread_id, item, {})
+        await store.load_thread_items(thread_id, None, 30, "desc", {})
+        await store.save_item(thread_id, item, {})
+
+
+async def _run(store: Store[dict], threads: int, turns: int) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*(_conversation(store, i, turns) for i in range(threads)))
+    return time.perf_counter() - start
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=40)
+    args = parser.parse_args()
+    operations = args.threads * args.turns * 3
+
+    elapsed = await _run(MemoryStore(), args.threads, args.turns)
+    print(f"memory  {operations / elapsed:10.0f} ops/s  ({elapsed:.2f}s)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SqliteStore(Path(tmp) / "bench.sqlite3")
+        try:
+            elapsed = await _run(store, args.threads, args.turns)
+        finally:
+            store.close()
+        print(
+            f"sqlite  {operations / elapsed:10.0f} ops/s  ({elapsed:.2f}s, "
+            f"{store.batched_writes} writes in {store.batches} transactions)"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
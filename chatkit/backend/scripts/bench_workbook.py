@@ -0,0 +1,104 @@
+"""Compare cold and warm rent workbook generation latency for each engine.
+
+``--properties N`` renders N properties (the local ones repeated under new ids,
+so every sheet is copied from the template's first) to check that time and
+memory grow linearly with the portfolio.
+
+Run from chatkit/backend: python scripts/bench_workbook.py [--iterations N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import time
+import tracemalloc
+import warnings
+from pathlib import Path
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.rent_data import build_payload_from_local_tsv  # noqa: E402
+from app.workbook import clear_template_cache, generate_rent_workbook  # noqa: E402
+
+
+def _time_ms(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def _summary(label: str, samples: list[float]) -> str:
+    return (
+        f"{label:<6} n={len(samples):<4} "
+        f"median={statistics.median(samples):7.1f}ms "
+        f"min={min(samples):7.1f}ms max={max(samples):7.1f}ms"
+    )
+
+
+def _peak_kib(fn) -> float:
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def _portfolio(base: dict[str, Any], count: int) -> dict[str, Any]:
+    properties = base["properties"]
+    return {
+        **base,
+        "properties": [
+            {**properties[index % len(properties)], "property_id": f"P{index:04d}"}
+            for index in range(count)
+        ],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument(
+        "--engine", choices=("openpyxl", "splice"), action="append", default=None
+    )
+    parser.add_argument("--properties", type=int, default=None)
+    args = parser.parse_args()
+
+    # openpyxl warns about the template's unsupported data validation extension.
+    warnings.simplefilter("ignore", UserWarning)
+    payload = build_payload_from_local_tsv()
+    if args.properties:
+        payload = _portfolio(payload, args.properties)
+    count = len(payload["properties"])
+
+    for engine in args.engine or ["openpyxl", "splice"]:
+
+        def cold(engine: str = engine) -> None:
+            clear_template_cache()
+            generate_rent_workbook(payload, engine=engine)
+
+        def warm(engine: str = engine) -> None:
+            generate_rent_workbook(payload, engine=engine)
+
+        cold_samples = [_time_ms(cold) for _ in range(args.iterations)]
+        warm()
+        warm_samples = [_time_ms(warm) for _ in range(args.iterations)]
+
+        print(f"[{engine}] {count} properties")
+        print(_summary("cold", cold_samples))
+        print(_summary("warm", warm_samples))
+        print(
+            f"speedup (median): "
+            f"{statistics.median(cold_samples) / statistics.median(warm_samples):.2f}x"
+        )
+        print(
+            f"warm per property: {statistics.median(warm_samples) / count:.2f}ms, "
+            f"peak traced memory (warm): {_peak_kib(warm):.0f} KiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
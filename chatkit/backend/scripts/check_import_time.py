@@ -0,0 +1,79 @@
+"""Startup check: importing app.main must stay fast and leave heavy modules out.
+
+``python -X importtime -c "import app.main"`` runs in ``--runs`` fresh
+interpreters; the median time of each module is reported for the slowest
+ones. Exits non-zero if a module that should load lazily (openpyxl, NumPy,
+ChatKit's server and the Agents SDK) is imported, or if app.main takes longer
+than ``--budget`` seconds.
+
+Run from chatkit/backend: python scripts/check_import_time.py [--budget S]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parents[1]
+# Loaded on first use: workbook rendering, rent data and the first chat turn.
+LAZY_MODULES = ("openpyxl", "numpy", "agents", "chatkit.server", "app.server")
+
+
+def _import_times() -> dict[str, float]:
+    """Cumulative seconds per module for one ``import app.main``."""
+    env = {**os.environ, "CHATKIT_IMPORT_PROFILE": "0"}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=0.6)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    runs = [_import_times() for _ in range(args.runs)]
+    median = {
+        name: statistics.median(run.get(name, 0.0) for run in runs) for name in runs[0]
+    }
+    print(f"slowest imports (median of {args.runs} runs, cumulative):")
+    slowest = sorted(median.items(), key=lambda entry: entry[1], reverse=True)
+    for name, seconds in slowest[: args.top]:
+        print(f"  {seconds * 1000:8.1f}ms  {name}")
+
+    failures = [
+        f"{name} is imported at startup"
+        for name in LAZY_MODULES
+        if any(name in run for run in runs)
+    ]
+    total = median.get("app.main", 0.0)
+    if total > args.budget:
+        failures.append(f"app.main took {total:.2f}s, budget {args.budget:.2f}s")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        raise SystemExit(1)
+    print(f"app.main imported in {total * 1000:.0f}ms; heavy modules load lazily")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Golden check: the splice engine must produce the same workbook as openpyxl.
+
+Both engines fill the template for a set of payloads; the results are loaded
+back with openpyxl and compared cell by cell (value, style and number format),
+along with the sheet order and active sheet.
+Exits non-zero on the first payload that differs.
+
+Run from chatkit/backend: python scripts/check_workbook_engines.py
+"""
+
+from __future__ import annotations
+
+import copy
+import sys
+import warnings
+from io import BytesIO
+from pathlib import Path
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from openpyxl import load_workbook  # noqa: E402
+
+from app.rent_data import build_payload_from_local_tsv  # noqa: E402
+from app.workbook import generate_rent_workbook  # noqa: E402
+
+
+def _edge_case_payload(base: dict[str, Any]) -> dict[str, Any]:
+    payload = copy.deepcopy(base)
+    first = payload["properties"][0]
+    first["property_address"] = "  12 <Main> & Co  "
+    first["tenant_name"] = None
+    first["rows"][0].update(
+        remarks="=SUM(B9:B20)",
+        rent_due=1234.5678901234567,
+        housing_dept="",
+        tenant_paid=True,
+    )
+    first["rows"][1].update(remarks="Ünïcode — ✓", month_balance_due=-0.0)
+    first["rows"] = first["rows"][:6]
+    payload["properties"][1]["period_months"] = None
+    payload["properties"].append({"property_id": "NOT_A_SHEET", "rows": []})
+    return payload
+
+
+def _portfolio_payload(base: dict[str, Any]) -> dict[str, Any]:
+    # A subset of the template's sheets plus properties it has no sheet for; the
+    # active sheet (KN10) is dropped.
+    payload = copy.deepcopy(base)
+    kept = payload["properties"][2]
+    payload["year"] = 2031
+    payload["properties"] = [kept]
+    for property_id in ("P-100", 'Unit "7" & <B>', "kn01"):
+        prop = copy.deepcopy(kept)
+        prop["property_id"] = property_id
+        payload["properties"].append(prop)
+    return payload
+
+
+def _cells(data: bytes) -> dict[tuple[str, str], tuple[Any, ...]]:
+    wb = load_workbook(BytesIO(data))
+    result: dict[tuple[str, str], tuple[Any, ...]] = {
+        ("", "sheets"): (wb.sheetnames, wb.active.title if wb.active else None)
+    }
+    for ws in wb.worksheets:
+        for row in ws.iter_rows():
+            for cell in row:
+                result[(ws.title, cell.coordinate)] = (
+                    cell.value,
+                    cell.data_type,
+                    cell.number_format,
+                    repr(cell.font),
+                    repr(cell.fill),
+                    repr(cell.border),
+                    repr(cell.alignment),
+                    repr(cell.protection),
+                )
+        result[(ws.title, "merged")] = (sorted(map(str, ws.merged_cells.ranges)),)
+    return result
+
+
+def main() -> int:
+    # openpyxl warns about the template's unsupported data validation extension.
+    warnings.simplefilter("ignore", UserWarning)
+    local = build_payload_from_local_tsv()
+    payloads = {
+        "local TSV": local,
+        "edge cases": _edge_case_payload(local),
+        "portfolio": _portfolio_payload(local),
+    }
+
+    failed = False
+    for label, payload in payloads.items():
+        expected = _cells(generate_rent_workbook(payload, engine="openpyxl"))
+        actual = _cells(generate_rent_workbook(payload, engine="splice"))
+        diffs = [
+            key
+            for key in sorted(expected.keys() | actual.keys())
+            if expected.get(key) != actual.get(key)
+        ]
+        if diffs:
+            failed = True
+            print(f"FAIL {label}: {len(diffs)} cells differ")
+            for key in diffs[:10]:
+                print(f"  {key}: openpyxl={expected.get(key)} splice={actual.get(key)}")
+        else:
+            print(f"ok   {label}: {len(expected)} cells identical")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,460 @@
+"""End-to-end load test of the backends, offline, against a local model stub.
+
+Starts scripts/stub_openai.py, this backend and, when it is checked out next
+to it, the managed-chatkit backend as uvicorn processes, then sends
+``--requests`` requests per scenario, ``--concurrency`` at a time:
+
+- chat: POST /chatkit (threads.create) answered by the agent through the
+  stub; latency to the first text delta and to the end of the stream;
+- workbook: POST /api/rent-workbook with ../rent_workbook_payload.json, each
+  with a different remark under ``--workbook-uncached`` so none is cached;
+- session: POST /api/create-session on managed-chatkit by
+  ``--session-users`` users who keep their cookie.
+
+Per scenario it reports p50/p95/p99 latency, throughput, errors, and the
+server's peak RSS and CPU seconds. ``--output`` saves the results as JSON.
+The run exits 1 when a limit is broken: ``--max-p95-ms chat=2000``,
+``--max-error-rate``, ``--max-rss-mb``, or, with ``--baseline`` naming an
+earlier output, a p95 that grew or throughput that fell by more than
+``--max-regression``.
+
+Run from chatkit/backend: python scripts/loadtest.py [--scenarios chat,workbook]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+BACKEND = Path(__file__).resolve().parents[1]
+MANAGED_BACKEND = BACKEND.parents[1] / "managed-chatkit" / "backend"
+PAYLOAD_FILE = BACKEND.parent / "rent_workbook_payload.json"
+SCENARIOS = ("chat", "workbook", "session")
+TEXT_DELTA = b'"assistant_message.content_part.text_delta"'
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Process:
+    """A server started for the run, with its RSS and CPU read from /proc."""
+
+    def __init__(
+        self, name: str, args: list[str], cwd: Path, env: dict[str, str], port: int
+    ) -> None:
+        self.name = name
+        self.url = f"http://127.0.0.1:{port}"
+        self.popen = subprocess.Popen(
+            [sys.executable, *args], cwd=cwd, env={**os.environ, **env}
+        )
+
+    def wait_ready(self, path: str, timeout: float = 60.0) -> None:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.popen.poll() is not None:
+                raise SystemExit(f"{self.name} exited with {self.popen.returncode}")
+            try:
+                httpx.get(self.url + path, timeout=1.0)
+                return
+            except httpx.TransportError:
+                time.sleep(0.1)
+        raise SystemExit(f"{self.name} did not start within {timeout:g}s")
+
+    def rss_mb(self) -> float:
+        for line in Path(f"/proc/{self.popen.pid}/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+        return 0.0
+
+    def cpu_seconds(self) -> float:
+        fields = Path(f"/proc/{self.popen.pid}/stat").read_text().rsplit(")", 1)[1]
+        # utime and stime, fields 14 and 15.
+        utime, stime = fields.split()[11:13]
+        return (int(utime) + int(stime)) / os.sysconf("SC_CLK_TCK")
+
+    def stop(self) -> None:
+        self.popen.terminate()
+        try:
+            self.popen.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.popen.kill()
+
+
+def _percentiles(samples: list[float]) -> dict[str, float] | None:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+
+    def rank(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+    return {
+        "p50": round(rank(0.50) * 1000, 2),
+        "p95": round(rank(0.95) * 1000, 2),
+        "p99": round(rank(0.99) * 1000, 2),
+        "max": round(ordered[-1] * 1000, 2),
+        "mean": round(statistics.fmean(ordered) * 1000, 2),
+    }
+
+
+# A request: returns the seconds to the first text delta for chat, else None.
+Call = Callable[[int], Awaitable[float | None]]
+
+
+async def _drive(call: Call, requests: int, concurrency: int) -> dict[str, Any]:
+    slots = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    first_deltas: list[float] = []
+    errors: list[str] = []
+
+    async def run(index: int) -> None:
+        async with slots:
+            started = time.perf_counter()
+            try:
+                first_delta = await call(index)
+            except Exception as exc:
+                errors.append(f"{type(exc).__name__}: {exc}")
+                return
+            latencies.append(time.perf_counter() - started)
+            if first_delta is not None:
+                first_deltas.append(first_delta)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run(index) for index in range(requests)))
+    seconds = time.perf_counter() - started
+    result: dict[str, Any] = {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": len(errors),
+        "error_samples": sorted(set(errors))[:5],
+        "seconds": round(seconds, 3),
+        "throughput_rps": round(len(latencies) / seconds, 2),
+        "latency_ms": _percentiles(latencies),
+    }
+    if first_deltas:
+        result["first_delta_ms"] = _percentiles(first_deltas)
+    return result
+
+
+async def _measure(
+    server: Process, call: Call, args: argparse.Namespace
+) -> dict[str, Any]:
+    """Warm up, then drive ``call`` while sampling the server's memory."""
+    await _drive(call, args.warmup, args.concurrency)
+    rss_start = server.rss_mb()
+    peak = rss_start
+    done = asyncio.Event()
+
+    async def sample() -> None:
+        nonlocal peak
+        while not done.is_set():
+            peak = max(peak, server.rss_mb())
+            await asyncio.sleep(0.1)
+
+    sampler = asyncio.create_task(sample())
+    cpu = server.cpu_seconds()
+    try:
+        result = await _drive(call, args.requests, args.concurrency)
+    finally:
+        done.set()
+        await sampler
+    rss_end = server.rss_mb()
+    result["server"] = {
+        "rss_start_mb": round(rss_start, 1),
+        "rss_peak_mb": round(max(peak, rss_end), 1),
+        "rss_end_mb": round(rss_end, 1),
+        "cpu_seconds": round(server.cpu_seconds() - cpu, 2),
+    }
+    return result
+
+
+def _chat_call(client: httpx.AsyncClient) -> Call:
+    async def call(index: int) -> float | None:
+        body = {
+            "type": "threads.create",
+            "params": {
+                "input": {
+                    "content": [{"type": "input_text", "text": f"hello {index}"}],
+                    "attachments": [],
+                    "inference_options": {},
+                }
+            },
+        }
+        started = time.perf_counter()
+        first_delta = None
+        async with client.stream("POST", "/chatkit", json=body) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes():
+                if first_delta is None and TEXT_DELTA in chunk:
+                    first_delta = time.perf_counter() - started
+        if first_delta is None:
+            raise RuntimeError("stream ended without a text delta")
+        return first_delta
+
+    return call
+
+
+def _workbook_call(client: httpx.AsyncClient, uncached: bool) -> Call:
+    payload = json.loads(PAYLOAD_FILE.read_text())
+
+    async def call(index: int) -> float | None:
+        body = payload
+        if uncached:
+            body = json.loads(json.dumps(payload))
+            body["properties"][0]["rows"][0]["remarks"] = f"load test {index}"
+        response = await client.post("/api/rent-workbook", json=body)
+        response.raise_for_status()
+        if not response.content.startswith(b"PK"):
+            raise RuntimeError("response is not an xlsx file")
+        return None
+
+    return call
+
+
+def _session_call(clients: list[httpx.AsyncClient]) -> Call:
+    async def call(index: int) -> float | None:
+        response = await clients[index % len(clients)].post(
+            "/api/create-session", json={}
+        )
+        response.raise_for_status()
+        if "client_secret" not in response.json():
+            raise RuntimeError("no client_secret in the response")
+        return None
+
+    return call
+
+
+async def _run_scenario(
+    name: str, servers: dict[str, Process], args: argparse.Namespace
+) -> dict[str, Any]:
+    limits = httpx.Limits(max_connections=args.concurrency)
+    timeout = httpx.Timeout(120.0)
+    if name == "session":
+        server = servers["managed"]
+        clients = [
+            httpx.AsyncClient(base_url=server.url, limits=limits, timeout=timeout)
+            for _ in range(args.session_users)
+        ]
+        try:
+            return await _measure(server, _session_call(clients), args)
+        finally:
+            for client in clients:
+                await client.aclose()
+    server = servers["chatkit"]
+    async with httpx.AsyncClient(
+        base_url=server.url, limits=limits, timeout=timeout
+    ) as client:
+        call = (
+            _chat_call(client)
+            if name == "chat"
+            else _workbook_call(client, args.workbook_uncached)
+        )
+        return await _measure(server, call, args)
+
+
+def _limits(args: argparse.Namespace) -> dict[str, float]:
+    limits = {}
+    for entry in args.max_p95_ms:
+        scenario, _, value = entry.partition("=")
+        limits[scenario] = float(value)
+    return limits
+
+
+def check(
+    results: dict[str, Any], args: argparse.Namespace, baseline: dict[str, Any] | None
+) -> list[str]:
+    """Broken limits, as messages; empty when the run passes."""
+    failures = []
+    p95_limits = _limits(args)
+    for name, result in results.items():
+        latency = result["latency_ms"] or {}
+        error_rate = result["errors"] / result["requests"]
+        if error_rate > args.max_error_rate:
+            failures.append(f"{name}: error rate {error_rate:.1%}")
+        if name in p95_limits and latency.get("p95", 0) > p95_limits[name]:
+            failures.append(
+                f"{name}: p95 {latency['p95']:.0f}ms > {p95_limits[name]:g}ms"
+            )
+        if args.max_rss_mb and result["server"]["rss_peak_mb"] > args.max_rss_mb:
+            failures.append(
+                f"{name}: peak RSS {result['server']['rss_peak_mb']:.0f} MiB "
+                f"> {args.max_rss_mb:g} MiB"
+            )
+        before = (baseline or {}).get(name)
+        if not before or not before.get("latency_ms") or not latency:
+            continue
+        allowed = 1 + args.max_regression
+        if latency["p95"] > before["latency_ms"]["p95"] * allowed:
+            failures.append(
+                f"{name}: p95 {latency['p95']:.0f}ms, baseline "
+                f"{before['latency_ms']['p95']:.0f}ms"
+            )
+        if result["throughput_rps"] * allowed < before["throughput_rps"]:
+            failures.append(
+                f"{name}: {result['throughput_rps']:.1f} req/s, baseline "
+                f"{before['throughput_rps']:.1f} req/s"
+            )
+    return failures
+
+
+def _print(name: str, result: dict[str, Any]) -> None:
+    latency = result["latency_ms"] or {}
+    line = (
+        f"{name:<9} {result['throughput_rps']:7.1f} req/s  "
+        f"p50 {latency.get('p50', 0):7.1f}ms  p95 {latency.get('p95', 0):7.1f}ms  "
+        f"p99 {latency.get('p99', 0):7.1f}ms  errors {result['errors']:3d}  "
+        f"RSS {result['server']['rss_peak_mb']:5.0f} MiB  "
+        f"CPU {result['server']['cpu_seconds']:5.2f}s"
+    )
+    if "first_delta_ms" in result:
+        line += f"  first delta p50 {result['first_delta_ms']['p50']:.0f}ms"
+    print(line)
+    for sample in result["error_samples"]:
+        print(f"          {sample}")
+
+
+def _start_servers(
+    args: argparse.Namespace, scenarios: list[str]
+) -> dict[str, Process]:
+    servers: dict[str, Process] = {}
+    port = _free_port()
+    servers["stub"] = Process(
+        "stub",
+        [
+            "scripts/stub_openai.py",
+            f"--port={port}",
+            f"--ttft-ms={args.stub_ttft_ms}",
+            f"--tokens={args.stub_tokens}",
+            f"--tokens-per-second={args.stub_tokens_per_second}",
+            f"--session-ms={args.stub_session_ms}",
+        ],
+        BACKEND,
+        {},
+        port,
+    )
+    servers["stub"].wait_ready("/stats")
+    stub_url = servers["stub"].url
+    uvicorn = ["-m", "uvicorn", "app.main:app", "--log-level=warning"]
+    if {"chat", "workbook"} & set(scenarios):
+        port = _free_port()
+        servers["chatkit"] = Process(
+            "chatkit backend",
+            [*uvicorn, f"--port={port}"],
+            BACKEND,
+            {
+                "OPENAI_BASE_URL": f"{stub_url}/v1",
+                "OPENAI_API_KEY": "sk-stub",
+                "OPENAI_AGENTS_DISABLE_TRACING": "1",
+            },
+            port,
+        )
+        servers["chatkit"].wait_ready("/health")
+    if "session" in scenarios:
+        port = _free_port()
+        servers["managed"] = Process(
+            "managed-chatkit backend",
+            [*uvicorn, f"--port={port}"],
+            MANAGED_BACKEND,
+            {
+                "CHATKIT_API_BASE": stub_url,
+                "OPENAI_API_KEY": "sk-stub",
+                "CHATKIT_WORKFLOW_ID": "wf_loadtest",
+            },
+            port,
+        )
+        servers["managed"].wait_ready("/health")
+    return servers
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=5, help="requests first")
+    parser.add_argument("--workbook-uncached", action="store_true")
+    parser.add_argument("--session-users", type=int, default=50)
+    parser.add_argument("--stub-ttft-ms", type=float, default=300.0)
+    parser.add_argument("--stub-tokens", type=int, default=60)
+    parser.add_argument("--stub-tokens-per-second", type=float, default=80.0)
+    parser.add_argument("--stub-session-ms", type=float, default=50.0)
+    parser.add_argument("--output", type=Path, help="write the results here")
+    parser.add_argument("--baseline", type=Path, help="an earlier --output")
+    parser.add_argument("--max-regression", type=float, default=0.25)
+    parser.add_argument(
+        "--max-p95-ms", action="append", default=[], metavar="SCENARIO=MS"
+    )
+    parser.add_argument("--max-error-rate", type=float, default=0.0)
+    parser.add_argument("--max-rss-mb", type=float, default=0.0)
+    args = parser.parse_args()
+
+    scenarios = [name for name in args.scenarios.split(",") if name]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    if "session" in scenarios and not MANAGED_BACKEND.is_dir():
+        print(f"skipping session: {MANAGED_BACKEND} not found")
+        scenarios.remove("session")
+    baseline = (
+        json.loads(args.baseline.read_text())["scenarios"] if args.baseline else None
+    )
+
+    print(
+        f"{args.requests} requests per scenario, {args.concurrency} at a time; stub: "
+        f"first token {args.stub_ttft_ms:g}ms, {args.stub_tokens} tokens at "
+        f"{args.stub_tokens_per_second:g}/s"
+    )
+    servers = _start_servers(args, scenarios)
+    results: dict[str, Any] = {}
+    try:
+        for name in scenarios:
+            results[name] = asyncio.run(_run_scenario(name, servers, args))
+            _print(name, results[name])
+    finally:
+        for server in servers.values():
+            server.stop()
+
+    failures = check(results, args, baseline)
+    if args.output:
+        report = {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "environment": {
+                "python": platform.python_version(),
+                "cpus": os.cpu_count(),
+            },
+            "settings": {
+                key: str(value) if isinstance(value, Path) else value
+                for key, value in vars(args).items()
+            },
+            "scenarios": results,
+            "failures": failures,
+        }
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"results written to {args.output}")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
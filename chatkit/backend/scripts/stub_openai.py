@@ -0,0 +1,251 @@
+"""A local stand-in for the OpenAI API, for load tests that must not call it.
+
+Serves what the backends use:
+
+- POST /v1/responses: a streamed (or plain) Responses API reply of
+  ``--tokens`` tokens, the first after ``--ttft-ms`` and the rest at
+  ``--tokens-per-second``, as the Agents SDK expects them;
+- POST /v1/chatkit/sessions: a ChatKit session after ``--session-ms``;
+- POST /v1/traces/ingest: accepted and dropped;
+- GET /stats: requests served so far.
+
+Point a backend at it with ``OPENAI_BASE_URL=http://127.0.0.1:8790/v1`` (the
+chatkit backend) or ``CHATKIT_API_BASE=http://127.0.0.1:8790`` (the
+managed-chatkit backend) and any API key.
+
+Run from chatkit/backend: python scripts/stub_openai.py [--port 8790]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from collections import Counter
+from collections.abc import AsyncIterator
+from typing import Any
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+class StubSettings:
+    def __init__(
+        self,
+        ttft: float = 0.3,
+        tokens: int = 60,
+        tokens_per_second: float = 80.0,
+        session_latency: float = 0.05,
+    ) -> None:
+        self.ttft = ttft
+        self.tokens = tokens
+        self.tokens_per_second = tokens_per_second
+        self.session_latency = session_latency
+
+
+def _event(event: dict[str, Any]) -> bytes:
+    return (
+        f"event: {event['type']}\ndata: "
+        f"{json.dumps(event, separators=(',', ':'))}\n\n".encode()
+    )
+
+
+def _response(
+    response_id: str, model: str, status: str, output: list[Any], tokens: int = 0
+) -> dict[str, Any]:
+    return {
+        "id": response_id,
+        "object": "response",
+        "created_at": int(time.time()),
+        "model": model,
+        "status": status,
+        "output": output,
+        "parallel_tool_calls": True,
+        "tool_choice": "auto",
+        "tools": [],
+        "usage": {
+            "input_tokens": 100,
+            "input_tokens_details": {"cached_tokens": 0},
+            "output_tokens": tokens,
+            "output_tokens_details": {"reasoning_tokens": 0},
+            "total_tokens": 100 + tokens,
+        },
+    }
+
+
+def _message(item_id: str, text: str | None) -> dict[str, Any]:
+    return {
+        "id": item_id,
+        "type": "message",
+        "role": "assistant",
+        "status": "in_progress" if text is None else "completed",
+        "content": []
+        if text is None
+        else [{"type": "output_text", "text": text, "annotations": []}],
+    }
+
+
+def _words(count: int) -> list[str]:
+    return [f"word{index % 50} " for index in range(count)]
+
+
+async def stream_reply(settings: StubSettings, model: str) -> AsyncIterator[bytes]:
+    """The Responses API events for one assistant message, paced like a model."""
+    response_id = f"resp_{uuid.uuid4().hex}"
+    item_id = f"msg_{uuid.uuid4().hex}"
+    sequence = iter(range(1_000_000))
+    part = {"type": "output_text", "text": "", "annotations": []}
+    yield _event(
+        {
+            "type": "response.created",
+            "sequence_number": next(sequence),
+            "response": _response(response_id, model, "in_progress", []),
+        }
+    )
+    await asyncio.sleep(settings.ttft)
+    yield _event(
+        {
+            "type": "response.output_item.added",
+            "sequence_number": next(sequence),
+            "output_index": 0,
+            "item": _message(item_id, None),
+        }
+    )
+    yield _event(
+        {
+            "type": "response.content_part.added",
+            "sequence_number": next(sequence),
+            "item_id": item_id,
+            "output_index": 0,
+            "content_index": 0,
+            "part": part,
+        }
+    )
+    words = _words(settings.tokens)
+    interval = 1 / settings.tokens_per_second if settings.tokens_per_second else 0.0
+    for index, word in enumerate(words):
+        if index and interval:
+            await asyncio.sleep(interval)
+        yield _event(
+            {
+                "type": "response.output_text.delta",
+                "sequence_number": next(sequence),
+                "item_id": item_id,
+                "output_index": 0,
+                "content_index": 0,
+                "delta": word,
+                "logprobs": [],
+            }
+        )
+    text = "".join(words)
+    yield _event(
+        {
+            "type": "response.output_text.done",
+            "sequence_number": next(sequence),
+            "item_id": item_id,
+            "output_index": 0,
+            "content_index": 0,
+            "text": text,
+            "logprobs": [],
+        }
+    )
+    yield _event(
+        {
+            "type": "response.content_part.done",
+            "sequence_number": next(sequence),
+            "item_id": item_id,
+            "output_index": 0,
+            "content_index": 0,
+            "part": {**part, "text": text},
+        }
+    )
+    message = _message(item_id, text)
+    yield _event(
+        {
+            "type": "response.output_item.done",
+            "sequence_number": next(sequence),
+            "output_index": 0,
+            "item": message,
+        }
+    )
+    yield _event(
+        {
+            "type": "response.completed",
+            "sequence_number": next(sequence),
+            "response": _response(
+                response_id, model, "completed", [message], len(words)
+            ),
+        }
+    )
+
+
+def create_app(settings: StubSettings) -> FastAPI:
+    app = FastAPI(title="OpenAI API stub")
+    counts: Counter[str] = Counter()
+
+    @app.post("/v1/responses")
+    async def responses(request: Request) -> Response:
+        body = await request.json()
+        counts["responses"] += 1
+        model = body.get("model") or "stub"
+        if body.get("stream"):
+            return StreamingResponse(
+                stream_reply(settings, model), media_type="text/event-stream"
+            )
+        await asyncio.sleep(settings.ttft)
+        text = "".join(_words(settings.tokens))
+        return JSONResponse(
+            _response(
+                f"resp_{uuid.uuid4().hex}",
+                model,
+                "completed",
+                [_message(f"msg_{uuid.uuid4().hex}", text)],
+                settings.tokens,
+            )
+        )
+
+    @app.post("/v1/chatkit/sessions")
+    async def sessions() -> dict[str, Any]:
+        counts["sessions"] += 1
+        await asyncio.sleep(settings.session_latency)
+        return {
+            "id": f"cksess_{uuid.uuid4().hex}",
+            "client_secret": f"ek_{uuid.uuid4().hex}",
+            "expires_after": {"anchor": "created_at", "seconds": 600},
+        }
+
+    @app.post("/v1/traces/ingest")
+    async def traces() -> Response:
+        counts["traces"] += 1
+        return Response(status_code=204)
+
+    @app.get("/stats")
+    async def stats() -> dict[str, int]:
+        return dict(counts)
+
+    return app
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--ttft-ms", type=float, default=300.0)
+    parser.add_argument("--tokens", type=int, default=60)
+    parser.add_argument("--tokens-per-second", type=float, default=80.0)
+    parser.add_argument("--session-ms", type=float, default=50.0)
+    args = parser.parse_args()
+    settings = StubSettings(
+        ttft=args.ttft_ms / 1000,
+        tokens=args.tokens,
+        tokens_per_second=args.tokens_per_second,
+        session_latency=args.session_ms / 1000,
+    )
+    uvicorn.run(create_app(settings), port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,21 +2,107 @@
 
 from __future__ import annotations
 
+import asyncio
 import json
+import math
 import os
+import time
 import uuid
-from typing import Any, Mapping
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Mapping
 
 import httpx
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 
+from .session_cache import SessionSecretCache
+from .throttle import (
+    KeyedBuckets,
+    SingleFlight,
+    TokenBucket,
+    backoff_delay,
+    retry_after_seconds,
+)
+
 DEFAULT_CHATKIT_BASE = "https://api.openai.com"
 SESSION_COOKIE_NAME = "chatkit_session_id"
 SESSION_COOKIE_MAX_AGE_SECONDS = 60 * 60 * 24 * 30  # 30 days
 
-app = FastAPI(title="Managed ChatKit Session API")
+# One client, and its pool of kept-alive connections, serves every request, so
+# only the first request to the ChatKit API pays for DNS, TCP and TLS setup.
+UPSTREAM_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+UPSTREAM_LIMITS = httpx.Limits(
+    max_connections=int(os.getenv("CHATKIT_UPSTREAM_MAX_CONNECTIONS", "100")),
+    max_keepalive_connections=int(os.getenv("CHATKIT_UPSTREAM_MAX_KEEPALIVE", "20")),
+    keepalive_expiry=float(os.getenv("CHATKIT_UPSTREAM_KEEPALIVE_SECONDS", "60")),
+)
+# Multiplexes concurrent requests over one connection (over TLS only).
+UPSTREAM_HTTP2 = os.getenv("CHATKIT_UPSTREAM_HTTP2", "1") != "0"
+
+session_cache = SessionSecretCache(
+    ttl=float(os.getenv("CHATKIT_SESSION_CACHE_SECONDS", "0")),
+    min_remaining=float(os.getenv("CHATKIT_SESSION_CACHE_MIN_REMAINING", "60")),
+    maxsize=int(os.getenv("CHATKIT_SESSION_CACHE_SIZE", "1024")),
+)
+
+# Failed calls are retried this many times, after a jittered backoff or the
+# Retry-After the API sends, as long as the whole exchange fits the deadline.
+UPSTREAM_RETRIES = int(os.getenv("CHATKIT_UPSTREAM_RETRIES", "2"))
+UPSTREAM_DEADLINE_SECONDS = float(os.getenv("CHATKIT_UPSTREAM_DEADLINE_SECONDS", "20"))
+RETRY_BASE_SECONDS = 0.25
+RETRY_CAP_SECONDS = 4.0
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Sessions per second and burst, per user and for the whole app (0 = no limit).
+# A request over the global rate waits up to GLOBAL_MAX_WAIT_SECONDS for a slot.
+user_limits: KeyedBuckets[str] = KeyedBuckets(
+    rate=float(os.getenv("CHATKIT_USER_RATE", "0.2")),
+    burst=float(os.getenv("CHATKIT_USER_BURST", "10")),
+)
+global_limit = TokenBucket(
+    rate=float(os.getenv("CHATKIT_GLOBAL_RATE", "20")),
+    burst=float(os.getenv("CHATKIT_GLOBAL_BURST", "40")),
+)
+GLOBAL_MAX_WAIT_SECONDS = float(os.getenv("CHATKIT_GLOBAL_MAX_WAIT_SECONDS", "2"))
+
+
+@dataclass(frozen=True)
+class SessionResult:
+    status_code: int
+    body: Mapping[str, Any]
+    headers: Mapping[str, str] = field(default_factory=dict)
+
+
+# Concurrent requests for the same (API base, workflow, user) share one call.
+session_flights: SingleFlight[tuple[str, str, str], SessionResult] = SingleFlight()
+session_counters = dict.fromkeys(
+    ("upstream_calls", "retries", "throttled_user", "throttled_global", "queued"), 0
+)
+
+_upstream: httpx.AsyncClient | None = None
+
+
+def upstream_client() -> httpx.AsyncClient:
+    """The shared client for ChatKit API calls, open for the app's lifetime."""
+    global _upstream
+    if _upstream is None or _upstream.is_closed:
+        _upstream = httpx.AsyncClient(
+            timeout=UPSTREAM_TIMEOUT, limits=UPSTREAM_LIMITS, http2=UPSTREAM_HTTP2
+        )
+    return _upstream
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    upstream_client()
+    yield
+    if _upstream is not None:
+        await _upstream.aclose()
+
+
+app = FastAPI(title="Managed ChatKit Session API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -32,6 +118,19 @@ async def health() -> Mapping[str, str]:
     return {"status": "ok"}
 
 
+@app.get("/api/create-session/stats")
+async def create_session_stats() -> Mapping[str, Any]:
+    """Report session coalescing, throttling, retry and cache counters."""
+    return {
+        "sessions": {
+            "in_flight": session_flights.in_flight,
+            "coalesced": session_flights.coalesced,
+            **session_counters,
+        },
+        "session_cache": session_cache.stats(),
+    }
+
+
 @app.post("/api/create-session")
 async def create_session(request: Request) -> JSONResponse:
     """Exchange a workflow id for a ChatKit client secret."""
@@ -46,11 +145,40 @@ async def create_session(request: Request) -> JSONResponse:
 
     user_id, cookie_value = resolve_user(request.cookies)
     api_base = chatkit_api_base()
+    cache_key = (api_base, workflow_id, user_id)
+    cached = session_cache.get(cache_key)
+    if cached is not None:
+        return respond(cached, 200, cookie_value)
 
-    try:
-        async with httpx.AsyncClient(base_url=api_base, timeout=10.0) as client:
-            upstream = await client.post(
-                "/v1/chatkit/sessions",
+    result = await session_flights.run(
+        cache_key, lambda: new_session(api_key, cache_key)
+    )
+    return respond(result.body, result.status_code, cookie_value, result.headers)
+
+
+async def new_session(api_key: str, cache_key: tuple[str, str, str]) -> SessionResult:
+    """Create a session upstream, within the rate limits and with retries."""
+    api_base, workflow_id, user_id = cache_key
+    wait = user_limits.take(user_id)
+    if wait:
+        session_counters["throttled_user"] += 1
+        return throttled(wait)
+    wait = global_limit.take()
+    if wait:
+        session_counters["queued"] += 1
+    while wait:
+        if wait > GLOBAL_MAX_WAIT_SECONDS:
+            session_counters["throttled_global"] += 1
+            return throttled(wait)
+        await asyncio.sleep(wait)
+        wait = global_limit.take()
+
+    started = time.monotonic()
+    for attempt in range(UPSTREAM_RETRIES + 1):
+        session_counters["upstream_calls"] += 1
+        try:
+            upstream = await upstream_client().post(
+                f"{api_base.rstrip('/')}/v1/chatkit/sessions",
                 headers={
                     "Authorization": f"Bearer {api_key}",
                     "OpenAI-Beta": "chatkit_beta=v1",
@@ -58,20 +186,42 @@ async def create_session(request: Request) -> JSONResponse:
                 },
                 json={"workflow": {"id": workflow_id}, "user": user_id},
             )
-    except httpx.RequestError as error:
-        return respond(
-            {"error": f"Failed to reach ChatKit API: {error}"},
-            502,
-            cookie_value,
-        )
+        except httpx.RequestError as error:
+            failure = SessionResult(
+                502, {"error": f"Failed to reach ChatKit API: {error}"}
+            )
+            delay = backoff_delay(attempt, RETRY_BASE_SECONDS, RETRY_CAP_SECONDS)
+        else:
+            if upstream.status_code not in RETRY_STATUSES:
+                return session_result(upstream, cache_key)
+            failure = session_result(upstream, cache_key)
+            retry_after = retry_after_seconds(upstream.headers.get("Retry-After"))
+            delay = (
+                retry_after
+                if retry_after is not None
+                else backoff_delay(attempt, RETRY_BASE_SECONDS, RETRY_CAP_SECONDS)
+            )
+        elapsed = time.monotonic() - started
+        if attempt == UPSTREAM_RETRIES or elapsed + delay > UPSTREAM_DEADLINE_SECONDS:
+            break
+        session_counters["retries"] += 1
+        await asyncio.sleep(delay)
+    return failure
 
+
+def session_result(
+    upstream: httpx.Response, cache_key: tuple[str, str, str]
+) -> SessionResult:
     payload = parse_json(upstream)
     if not upstream.is_success:
         message = None
         if isinstance(payload, Mapping):
             message = payload.get("error")
         message = message or upstream.reason_phrase or "Failed to create session"
-        return respond({"error": message}, upstream.status_code, cookie_value)
+        headers = {}
+        if "Retry-After" in upstream.headers:
+            headers["Retry-After"] = upstream.headers["Retry-After"]
+        return SessionResult(upstream.status_code, {"error": message}, headers)
 
     client_secret = None
     expires_after = None
@@ -80,23 +230,28 @@ async def create_session(request: Request) -> JSONResponse:
         expires_after = payload.get("expires_after")
 
     if not client_secret:
-        return respond(
-            {"error": "Missing client secret in response"},
-            502,
-            cookie_value,
-        )
+        return SessionResult(502, {"error": "Missing client secret in response"})
+
+    body = {"client_secret": client_secret, "expires_after": expires_after}
+    session_cache.put(cache_key, body, payload)
+    return SessionResult(200, body)
+
 
-    return respond(
-        {"client_secret": client_secret, "expires_after": expires_after},
-        200,
-        cookie_value,
+def throttled(wait: float) -> SessionResult:
+    return SessionResult(
+        429,
+        {"error": "Too many session requests; try again shortly"},
+        {"Retry-After": str(math.ceil(wait))},
     )
 
 
 def respond(
-    payload: Mapping[str, Any], status_code: int, cookie_value: str | None = None
+    payload: Mapping[str, Any],
+    status_code: int,
+    cookie_value: str | None = None,
+    headers: Mapping[str, str] | None = None,
 ) -> JSONResponse:
-    response = JSONResponse(payload, status_code=status_code)
+    response = JSONResponse(payload, status_code=status_code, headers=headers)
     if cookie_value:
         response.set_cookie(
             key=SESSION_COOKIE_NAME,
@@ -0,0 +1,114 @@
+"""Short-lived cache of ChatKit client secrets per (API base, workflow, user).
+
+A page reload asks for a new session; while the secret handed out last time
+still has a while to live, the same user gets it again instead of another
+round trip to the ChatKit API.
+"""
+
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Mapping
+
+
+@dataclass(frozen=True)
+class CachedSecret:
+    body: Mapping[str, Any]
+    # Wall-clock time (seconds since the epoch) after which it is not reused.
+    reuse_until: float
+
+
+def secret_expiry(payload: Mapping[str, Any], now: float) -> float | None:
+    """When the secret in a sessions response expires, if the response says.
+
+    ``expires_at`` is a Unix timestamp; ``expires_after`` is a number of
+    seconds, or an object with ``seconds``, counted from creation (``now``).
+    """
+    expires_at = _number(payload.get("expires_at"))
+    if expires_at is not None:
+        return expires_at
+    expires_after = payload.get("expires_after")
+    if isinstance(expires_after, Mapping):
+        expires_after = expires_after.get("seconds")
+    seconds = _number(expires_after)
+    return None if seconds is None else now + seconds
+
+
+def _number(value: Any) -> float | None:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return None
+
+
+class SessionSecretCache:
+    """LRU of client secrets, each reused for at most ``ttl`` seconds.
+
+    A secret is never handed out with less than ``min_remaining`` seconds left
+    before it expires, and is not cached at all when its expiry is unknown.
+    A ``ttl`` of 0 disables the cache.
+    """
+
+    def __init__(
+        self, ttl: float = 0.0, min_remaining: float = 60.0, maxsize: int = 1024
+    ) -> None:
+        self.ttl = ttl
+        self.min_remaining = min_remaining
+        self.maxsize = maxsize
+        self._entries: OrderedDict[tuple[str, str, str], CachedSecret] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.maxsize > 0
+
+    def get(self, key: tuple[str, str, str]) -> Mapping[str, Any] | None:
+        if not self.enabled:
+            return None
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if time.time() >= entry.reuse_until:
+            del self._entries[key]
+            self.expired += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.body
+
+    def put(
+        self,
+        key: tuple[str, str, str],
+        body: Mapping[str, Any],
+        upstream: Mapping[str, Any],
+    ) -> None:
+        """Cache ``body`` for ``key``, with its expiry read from ``upstream``."""
+        if not self.enabled:
+            return
+        now = time.time()
+        expiry = secret_expiry(upstream, now)
+        if expiry is None:
+            return
+        reuse_until = min(now + self.ttl, expiry - self.min_remaining)
+        if reuse_until <= now:
+            return
+        self._entries[key] = CachedSecret(body, reuse_until)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
@@ -0,0 +1,250 @@
+"""Measure create-session latency and connection reuse against a local stub.
+
+A stub of the ChatKit sessions API listens on localhost, counting the
+connections it accepts and waiting ``--connect-ms`` on each new one, in place
+of the DNS, TCP and TLS setup a real call pays. ``--requests`` sessions are
+created ``--concurrency`` at a time:
+
+- with a new ``httpx.AsyncClient`` per request, as create_session used to;
+- with the shared, kept-alive client the app now uses;
+- through POST /api/create-session by ``--users`` users reloading the page,
+  with the client-secret cache off and on;
+- by users whose page load asks twice at once, coalesced into one call;
+- while the stub answers every ``--reject-every``-th call with 429 and a
+  Retry-After, and with the per-user and global rate limits on.
+
+Run from managed-chatkit/backend: python scripts/bench_sessions.py
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+class StubSessionsApi:
+    """Minimal HTTP/1.1 keep-alive server answering POST /v1/chatkit/sessions."""
+
+    def __init__(self, connect_delay: float, latency: float) -> None:
+        self.connect_delay = connect_delay
+        self.latency = latency
+        self.connections = 0
+        self.requests = 0
+        # Every n-th request is answered 429 when set.
+        self.reject_every = 0
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.connections += 1
+        # Stands in for the handshakes of a new connection.
+        await asyncio.sleep(self.connect_delay)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.decode("latin-1").split("\r\n")[1:]:
+                    name, _, value = line.partition(":")
+                    if name.strip().lower() == "content-length":
+                        length = int(value)
+                await reader.readexactly(length)
+                self.requests += 1
+                await asyncio.sleep(self.latency)
+                if self.reject_every and self.requests % self.reject_every == 0:
+                    writer.write(
+                        b"HTTP/1.1 429 Too Many Requests\r\nRetry-After: 0.05\r\n"
+                        b"Content-Length: 0\r\n\r\n"
+                    )
+                    await writer.drain()
+                    continue
+                body = json.dumps(
+                    {
+                        "id": f"cksess_{uuid.uuid4().hex}",
+                        "client_secret": f"ek_{uuid.uuid4().hex}",
+                        "expires_after": {"anchor": "created_at", "seconds": 600},
+                    }
+                ).encode()
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: %d\r\n\r\n%s" % (len(body), body)
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def _reference_post(api_base: str, workflow_id: str, user_id: str) -> None:
+    """The previous create_session call: a new client for every request."""
+    async with httpx.AsyncClient(base_url=api_base, timeout=10.0) as client:
+        response = await client.post(
+            "/v1/chatkit/sessions",
+            headers={"Authorization": "Bearer sk-test"},
+            json={"workflow": {"id": workflow_id}, "user": user_id},
+        )
+        response.raise_for_status()
+
+
+async def _timed(
+    calls: list[Callable[[], Awaitable[None]]], concurrency: int
+) -> tuple[list[float], float]:
+    """Latency of each call and the wall time, ``concurrency`` at a time."""
+    slots = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+
+    async def run(call: Callable[[], Awaitable[None]]) -> None:
+        async with slots:
+            start = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run(call) for call in calls))
+    return latencies, time.perf_counter() - start
+
+
+def _report(
+    label: str, latencies: list[float], wall: float, stub: StubSessionsApi
+) -> None:
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(
+        f"{label:<32} p50 {statistics.median(ordered) * 1000:6.2f}ms "
+        f"p95 {p95 * 1000:6.2f}ms {len(latencies) / wall:7.0f} req/s "
+        f"{stub.requests:5d} upstream calls {stub.connections:5d} connections"
+    )
+    stub.connections = stub.requests = 0
+
+
+async def _bench(args: argparse.Namespace) -> None:
+    stub = StubSessionsApi(args.connect_ms / 1000, args.latency_ms / 1000)
+    server = await asyncio.start_server(stub.handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    api_base = f"http://127.0.0.1:{port}"
+    os.environ.update(
+        CHATKIT_API_BASE=api_base,
+        OPENAI_API_KEY="sk-test",
+        CHATKIT_WORKFLOW_ID="wf_bench",
+        # Off until the last run, which measures them.
+        CHATKIT_USER_RATE="0",
+        CHATKIT_GLOBAL_RATE="0",
+    )
+    from app import main
+    from app.session_cache import SessionSecretCache
+    from app.throttle import KeyedBuckets, TokenBucket
+
+    print(
+        f"{args.requests} sessions, {args.concurrency} at a time; stub: "
+        f"{args.connect_ms}ms per new connection, {args.latency_ms}ms per request"
+    )
+    calls: list[Callable[[], Awaitable[None]]] = [
+        lambda: _reference_post(api_base, "wf_bench", uuid.uuid4().hex)
+        for _ in range(args.requests)
+    ]
+    _report("client per request", *await _timed(calls, args.concurrency), stub)
+
+    async def pooled() -> None:
+        response = await main.upstream_client().post(
+            f"{api_base}/v1/chatkit/sessions",
+            json={"workflow": {"id": "wf_bench"}, "user": uuid.uuid4().hex},
+        )
+        response.raise_for_status()
+
+    _report(
+        "shared client",
+        *await _timed([pooled] * args.requests, args.concurrency),
+        stub,
+    )
+
+    # Each user loads the page, then reloads it; the cookie keeps the user id.
+    reloads = max(1, args.requests // args.users)
+    transport = httpx.ASGITransport(app=main.app)
+    for ttl, label in ((0.0, "endpoint, cache off"), (300.0, "endpoint, cache on")):
+        main.session_cache = SessionSecretCache(ttl=ttl)
+        clients = [
+            httpx.AsyncClient(transport=transport, base_url="http://app")
+            for _ in range(args.users)
+        ]
+
+        def reload(client: httpx.AsyncClient) -> Callable[[], Awaitable[None]]:
+            async def call() -> None:
+                response = await client.post("/api/create-session", json={})
+                response.raise_for_status()
+
+            return call
+
+        await _timed([reload(client) for client in clients], args.concurrency)
+        stub.connections = stub.requests = 0
+        _report(
+            f"{label} ({reloads} reloads)",
+            *await _timed(
+                [reload(client) for _ in range(reloads) for client in clients],
+                args.concurrency,
+            ),
+            stub,
+        )
+        for client in clients:
+            await client.aclose()
+    print(f"cache: {main.session_cache.stats()}")
+
+    main.session_cache = SessionSecretCache()
+    clients = [
+        httpx.AsyncClient(transport=transport, base_url="http://app")
+        for _ in range(args.users)
+    ]
+    await _timed([reload(client) for client in clients], args.concurrency)
+    stub.connections = stub.requests = 0
+    _report(
+        "page load asks twice",
+        *await _timed(
+            [reload(client) for client in clients for _ in range(2)],
+            args.users * 2,
+        ),
+        stub,
+    )
+
+    stub.reject_every = args.reject_every
+    main.user_limits = KeyedBuckets(rate=0.2, burst=10)
+    main.global_limit = TokenBucket(rate=args.global_rate, burst=args.global_rate)
+    latencies, wall = await _timed(
+        [reload(client) for _ in range(reloads) for client in clients],
+        args.concurrency,
+    )
+    _report(f"429s and limits ({args.global_rate:g}/s)", latencies, wall, stub)
+    for client in clients:
+        await client.aclose()
+    print(f"counters: {(await main.create_session_stats())['sessions']}")
+
+    await main.upstream_client().aclose()
+    server.close()
+    await server.wait_closed()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--connect-ms", type=float, default=20.0)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument("--reject-every", type=int, default=10)
+    parser.add_argument("--global-rate", type=float, default=200.0)
+    args = parser.parse_args()
+    asyncio.run(_bench(args))
+
+
+if __name__ == "__main__":
+    main()